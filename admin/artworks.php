@@ -75,6 +75,11 @@ try {
                                     return htmlspecialchars($cat['name'] ?? 'Uncategorized'); 
                                 }, $artwork['categories'] ?? [])) ?></p>
                                 <p class="status">Status: <?= htmlspecialchars($artwork['status'] ?? 'unknown') ?></p>
+                                <?php if (!empty($artwork['duplicates'])): ?>
+                                    <p class="duplicates">Possible duplicates: <?= implode(', ', array_map(function($id) {
+                                        return '#' . (int)$id;
+                                    }, $artwork['duplicates'])) ?></p>
+                                <?php endif; ?>
                                 <p class="date">Created: <?= isset($artwork['created_at']) ? date('Y-m-d', strtotime($artwork['created_at'])) : 'Unknown' ?></p>
                             </div>
                             <div class="artwork-actions">
@@ -0,0 +1,139 @@
+"""Per-user activity feed.
+
+Engagement on an artwork (likes, comments, discoveries, unlocks) is fanned
+out on write into the artist's feed. Each recipient keeps at most
+ACTIVITY_FEED_MAX_ITEMS events, ordered by id, so reading a page of the feed
+is a single range scan over (recipient_id, id).
+"""
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import delete, event, func, insert, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+from .cache import TTLCache
+from .config import settings
+from .invalidation import bus
+
+unread_counts = TTLCache("activity_unread", ttl=settings.ACTIVITY_UNREAD_CACHE_TTL)
+bus.register_cache(unread_counts)
+
+_PENDING_KEY = "activity_recipients"
+
+
+async def fan_out(db: AsyncSession, actor: models.User, verb: str, *artwork_ids: int):
+    """Add an event to the feed of each artwork's artist.
+
+    Runs as part of the caller's transaction; nothing is written for
+    artworks that do not exist or that belong to the actor.
+    """
+    source = (
+        select(
+            models.Artwork.artist_id,
+            literal(actor.id),
+            literal(actor.username),
+            literal(verb),
+            models.Artwork.id,
+            models.Artwork.title,
+            literal(datetime.utcnow())
+        )
+        .where(
+            models.Artwork.id.in_(artwork_ids),
+            models.Artwork.artist_id != actor.id
+        )
+    )
+    result = await db.execute(
+        insert(models.ActivityEvent)
+        .from_select(
+            ["recipient_id", "actor_id", "actor_name", "verb",
+             "artwork_id", "artwork_title", "created_at"],
+            source
+        )
+        .returning(models.ActivityEvent.recipient_id)
+    )
+    recipients = set(result.scalars().all())
+
+    for recipient_id in recipients:
+        await _trim(db, recipient_id)
+
+    # Unread counts are invalidated once the transaction commits
+    db.sync_session.info.setdefault(_PENDING_KEY, set()).update(recipients)
+
+
+async def _trim(db: AsyncSession, recipient_id: int):
+    oldest_kept = (
+        select(models.ActivityEvent.id)
+        .where(models.ActivityEvent.recipient_id == recipient_id)
+        .order_by(models.ActivityEvent.id.desc())
+        .offset(settings.ACTIVITY_FEED_MAX_ITEMS - 1)
+        .limit(1)
+        .scalar_subquery()
+    )
+    await db.execute(
+        delete(models.ActivityEvent).where(
+            models.ActivityEvent.recipient_id == recipient_id,
+            models.ActivityEvent.id < oldest_kept
+        )
+    )
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_unread_counts(session):
+    for recipient_id in session.info.pop(_PENDING_KEY, ()):
+        bus.invalidate(unread_counts, recipient_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+async def get_feed(db: AsyncSession, user_id: int, before: Optional[int], limit: int):
+    """Return up to limit events older than the cursor, newest first"""
+    query = select(models.ActivityEvent).where(models.ActivityEvent.recipient_id == user_id)
+    if before is not None:
+        query = query.where(models.ActivityEvent.id < before)
+    result = await db.execute(query.order_by(models.ActivityEvent.id.desc()).limit(limit + 1))
+    events = result.scalars().all()
+
+    next_cursor = events[limit - 1].id if len(events) > limit else None
+    return events[:limit], next_cursor
+
+
+async def _last_read_id(db: AsyncSession, user_id: int) -> int:
+    last_read = await db.scalar(
+        select(models.ActivityRead.last_read_id).where(models.ActivityRead.user_id == user_id)
+    )
+    return last_read or 0
+
+
+async def get_unread_count(db: AsyncSession, user_id: int) -> int:
+    count = unread_counts.get(user_id)
+    if count is None:
+        last_read = await _last_read_id(db, user_id)
+        count = await db.scalar(
+            select(func.count(models.ActivityEvent.id)).where(
+                models.ActivityEvent.recipient_id == user_id,
+                models.ActivityEvent.id > last_read
+            )
+        )
+        unread_counts.set(user_id, count)
+    return count
+
+
+async def mark_read(db: AsyncSession, user_id: int, up_to: Optional[int] = None):
+    if up_to is None:
+        up_to = await db.scalar(
+            select(func.max(models.ActivityEvent.id))
+            .where(models.ActivityEvent.recipient_id == user_id)
+        ) or 0
+
+    state = await db.get(models.ActivityRead, user_id)
+    if state is None:
+        db.add(models.ActivityRead(user_id=user_id, last_read_id=up_to))
+    elif up_to > state.last_read_id:
+        state.last_read_id = up_to
+    db.sync_session.info.setdefault(_PENDING_KEY, set()).add(user_id)
+    await db.commit()
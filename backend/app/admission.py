@@ -0,0 +1,196 @@
+"""Admission control and rate limiting.
+
+Expensive route classes (nearby search, admin listings, login) each get a
+concurrency limit with a bounded wait queue. When the queue is full the
+request is rejected immediately with 503 and Retry-After instead of piling
+onto the event loop and the database. Separately, every client gets a token
+bucket per route class so one hot endpoint cannot starve the others.
+"""
+import asyncio
+import json
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+from jose import JWTError, jwt
+
+from .auth.auth import ALGORITHM, SECRET_KEY
+from .cache import TTLCache
+from .config import settings
+from .metrics import Gauge, registry
+
+
+class RouteClass:
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, queue_timeout: float,
+                 rate: float, burst: int):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.rate = rate  # Tokens per second per client
+        self.burst = burst
+        self.active = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def acquire(self) -> bool:
+        """Take a slot, waiting in the bounded queue; False if rejected"""
+        if self.active < self.max_concurrency and not self.waiting:
+            await self._semaphore.acquire()
+            self.active += 1
+            return True
+        if self.waiting >= self.max_queue:
+            return False
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        return True
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, capacity: float):
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, rate: float, capacity: float) -> float:
+        """Consume a token; returns 0 on success or seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(capacity, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / rate
+
+    def refill_time(self, rate: float, capacity: float) -> float:
+        """Seconds until full again, when the bucket is as good as a new one"""
+        return (capacity - self.tokens) / rate
+
+
+# (name, path pattern, methods); the first match wins
+ROUTE_CLASSES: List[Tuple[str, "re.Pattern", Optional[set]]] = [
+    ("login", re.compile(r"^/(auth/token|admin/login)$"), {"POST"}),
+    ("nearby", re.compile(r"^/artworks/(nearby|walk|unlock/sweep)$"), None),
+    ("admin", re.compile(r"^/admin/"), None),
+    ("write", re.compile(r"^/"), {"POST", "PUT", "DELETE", "PATCH"}),
+]
+
+
+# Route classes of the running middleware, exposed for metrics
+route_classes: Dict[str, RouteClass] = {}
+
+rejections = registry.counter(
+    "admission_rejections_total", "Requests rejected by admission control", ("route_class", "reason")
+)
+
+
+def build_route_classes() -> Dict[str, RouteClass]:
+    limits = settings.ADMISSION_LIMITS
+    route_classes.clear()
+    route_classes.update(
+        (name, RouteClass(name, **limits[name])) for name, _, _ in ROUTE_CLASSES if name in limits
+    )
+    return route_classes
+
+
+@registry.add_collector
+def _admission_metrics():
+    active = Gauge("admission_active", "Requests holding a slot", ("route_class",))
+    waiting = Gauge("admission_waiting", "Requests waiting for a slot", ("route_class",))
+    for route_class in route_classes.values():
+        active.set(route_class.name, value=route_class.active)
+        waiting.set(route_class.name, value=route_class.waiting)
+    return [active, waiting]
+
+
+def classify(method: str, path: str) -> Optional[str]:
+    for name, pattern, methods in ROUTE_CLASSES:
+        if (methods is None or method in methods) and pattern.match(path):
+            return name
+    return None
+
+
+def client_key(scope, route_class: str) -> str:
+    """Identify the caller by verified token subject, falling back to the client address
+
+    The Authorization header alone is not a key: a client could send a new one
+    with every request and get a fresh bucket each time. Login is always keyed
+    by address, since its callers have no token yet.
+    """
+    if route_class != "login":
+        for name, value in scope.get("headers", ()):
+            if name == b"authorization":
+                subject = _token_subject(value)
+                if subject is not None:
+                    return f"user:{subject}"
+                break
+    client = scope.get("client")
+    return client[0] if client else "anonymous"
+
+
+def _token_subject(authorization: bytes) -> Optional[str]:
+    if not authorization.lower().startswith(b"bearer "):
+        return None
+    try:
+        payload = jwt.decode(authorization[7:].decode(), SECRET_KEY, algorithms=[ALGORITHM])
+    except (JWTError, UnicodeDecodeError):
+        return None
+    return payload.get("sub")
+
+
+class AdmissionControlMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self.route_classes = build_route_classes()
+        self.buckets = TTLCache("rate_limit_buckets", ttl=0, maxsize=100000)  # TTL set per bucket
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        route_class = self.route_classes.get(classify(scope["method"], scope["path"]))
+        if route_class is None:
+            return await self.app(scope, receive, send)
+
+        key = (route_class.name, client_key(scope, route_class.name))
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(route_class.burst)
+        wait = bucket.take(route_class.rate, route_class.burst)
+        # Kept until it has refilled; dropping it any earlier would hand out a new burst
+        self.buckets.set(key, bucket, ttl=bucket.refill_time(route_class.rate, route_class.burst))
+        if wait:
+            rejections.inc(route_class.name, "rate_limited")
+            return await self._reject(send, 429, "Rate limit exceeded", wait)
+
+        if not await route_class.acquire():
+            rejections.inc(route_class.name, "overloaded")
+            return await self._reject(send, 503, "Server busy, please retry", settings.ADMISSION_RETRY_AFTER)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route_class.release()
+
+    async def _reject(self, send, status_code: int, detail: str, retry_after: float):
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, round(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
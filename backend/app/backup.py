@@ -0,0 +1,246 @@
+"""Online database backups.
+
+SQLite databases are copied with the online backup API in small page steps,
+sleeping between steps so writers can get the lock back. The backup API
+writes to a database, so the copy lands in an uncompressed temporary file in
+BACKUP_DIR and is gzipped from there: a backup needs free space for about
+twice the database, which is checked before it starts, and the temporary
+file is removed however the backup ends. Restores likewise decompress to a
+temporary copy first. Other engines are streamed from their native dump tool
+straight into gzip. All blocking work runs on a worker thread so the event
+loop keeps serving requests.
+"""
+import asyncio
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.engine import make_url
+
+from . import models
+from .config import settings
+from .database import AsyncSessionLocal, engine
+from .invalidation import bus
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+# Keep references to running backup tasks so they are not garbage collected
+_running_tasks = set()
+
+
+class BackupError(Exception):
+    pass
+
+
+def backup_dir() -> str:
+    path = os.path.abspath(settings.BACKUP_DIR)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def backup_path(filename: str) -> str:
+    return os.path.join(backup_dir(), os.path.basename(filename))
+
+
+def _sqlite_path(url) -> str:
+    if not url.database or url.database == ":memory:":
+        raise BackupError("In-memory databases cannot be backed up")
+    return os.path.abspath(url.database)
+
+
+def _compress(src_path: str, dest_path: str):
+    with open(src_path, "rb") as src, gzip.open(dest_path, "wb", compresslevel=6) as dest:
+        shutil.copyfileobj(src, dest, CHUNK_SIZE)
+
+
+def _decompress(src_path: str, dest_path: str):
+    with gzip.open(src_path, "rb") as src, open(dest_path, "wb") as dest:
+        shutil.copyfileobj(src, dest, CHUNK_SIZE)
+
+
+def _ensure_space(directory: str, needed: int):
+    free = shutil.disk_usage(directory).free
+    if free < needed:
+        raise BackupError(
+            f"Backup needs about {needed // 2**20} MiB free in {directory}, {free // 2**20} MiB available"
+        )
+
+
+def _sqlite_copy(source: sqlite3.Connection, target: sqlite3.Connection):
+    source.backup(
+        target,
+        pages=settings.BACKUP_PAGES_PER_STEP,
+        sleep=settings.BACKUP_STEP_SLEEP
+    )
+
+
+def _backup_sqlite(url, dest_path: str):
+    path = _sqlite_path(url)
+    wal_path = f"{path}-wal"
+    size = os.path.getsize(path) + (os.path.getsize(wal_path) if os.path.exists(wal_path) else 0)
+    # The uncompressed copy, plus at most as much again for the gzip written from it
+    _ensure_space(backup_dir(), 2 * size)
+
+    fd, tmp_path = tempfile.mkstemp(suffix=".db", dir=backup_dir())
+    os.close(fd)
+    try:
+        source = sqlite3.connect(path)
+        target = sqlite3.connect(tmp_path)
+        try:
+            _sqlite_copy(source, target)
+        finally:
+            target.close()
+            source.close()
+        _compress(tmp_path, dest_path)
+    finally:
+        os.remove(tmp_path)
+
+
+def _restore_sqlite(url, src_path: str):
+    fd, tmp_path = tempfile.mkstemp(suffix=".db", dir=backup_dir())
+    os.close(fd)
+    try:
+        _decompress(src_path, tmp_path)
+        source = sqlite3.connect(tmp_path)
+        target = sqlite3.connect(_sqlite_path(url), timeout=30)
+        try:
+            _sqlite_copy(source, target)
+        finally:
+            target.close()
+            source.close()
+    finally:
+        os.remove(tmp_path)
+
+
+def _pg_command(tool: str, url) -> tuple:
+    sync_url = url.set(drivername="postgresql")
+    env = dict(os.environ)
+    if sync_url.password:
+        env["PGPASSWORD"] = sync_url.password
+    return [tool, "--dbname", sync_url.set(password=None).render_as_string()], env
+
+
+def _backup_postgres(url, dest_path: str):
+    cmd, env = _pg_command("pg_dump", url)
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE, env=env) as proc:
+        with gzip.open(dest_path, "wb", compresslevel=6) as dest:
+            shutil.copyfileobj(proc.stdout, dest, CHUNK_SIZE)
+    if proc.returncode != 0:
+        raise BackupError(f"pg_dump exited with status {proc.returncode}")
+
+
+def _restore_postgres(url, src_path: str):
+    cmd, env = _pg_command("psql", url)
+    with subprocess.Popen(cmd + ["--quiet"], stdin=subprocess.PIPE, env=env) as proc:
+        with gzip.open(src_path, "rb") as src:
+            shutil.copyfileobj(src, proc.stdin, CHUNK_SIZE)
+        proc.stdin.close()
+    if proc.returncode != 0:
+        raise BackupError(f"psql exited with status {proc.returncode}")
+
+
+def run_backup(database_url: str, dest_path: str):
+    """Write a compressed copy of the database to dest_path (blocking)"""
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite":
+        _backup_sqlite(url, dest_path)
+    elif url.get_backend_name() == "postgresql":
+        _backup_postgres(url, dest_path)
+    else:
+        raise BackupError(f"Backups are not supported for {url.get_backend_name()}")
+
+
+def run_restore(database_url: str, src_path: str):
+    """Replace the database contents with a compressed backup (blocking)"""
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite":
+        _restore_sqlite(url, src_path)
+    elif url.get_backend_name() == "postgresql":
+        _restore_postgres(url, src_path)
+    else:
+        raise BackupError(f"Restores are not supported for {url.get_backend_name()}")
+
+
+def _database_url() -> str:
+    return engine.url.render_as_string(hide_password=False)
+
+
+async def _perform_backup(backup_id: int):
+    async with AsyncSessionLocal() as db:
+        backup = await db.get(models.Backup, backup_id)
+        dest_path = backup_path(backup.filename)
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(run_backup, _database_url(), dest_path)
+            backup.status = "completed"
+            backup.size = os.path.getsize(dest_path)
+        except Exception as e:
+            logger.exception("Backup failed", extra={"backup_id": backup_id})
+            backup.status = "failed"
+            backup.error = str(e)
+            if os.path.exists(dest_path):
+                os.remove(dest_path)
+        backup.duration = time.perf_counter() - started
+        backup.completed_at = datetime.utcnow()
+        await db.commit()
+
+
+async def start_backup(db) -> models.Backup:
+    """Record a new backup and run it in the background"""
+    filename = f"backup_{datetime.utcnow().strftime('%Y%m%d_%H%M%S_%f')}.gz"
+    backup = models.Backup(filename=filename, type="full", status="running")
+    db.add(backup)
+    await db.commit()
+    await db.refresh(backup)
+
+    task = asyncio.create_task(_perform_backup(backup.id))
+    _running_tasks.add(task)
+    task.add_done_callback(_running_tasks.discard)
+    return backup
+
+
+async def _backup_history(db) -> list:
+    result = await db.execute(select(models.Backup.__table__))
+    return [dict(row) for row in result.mappings()]
+
+
+async def restore_backup(db, backup: models.Backup):
+    """Restore a completed backup and reset pooled connections"""
+    if backup.status != "completed":
+        raise BackupError("Only completed backups can be restored")
+    src_path = backup_path(backup.filename)
+    if not os.path.exists(src_path):
+        raise BackupError("Backup file is missing")
+
+    # The restored file carries the history as it was when the backup was
+    # taken, so keep the current history and write it back afterwards
+    history = await _backup_history(db)
+    await db.close()
+
+    await asyncio.to_thread(run_restore, _database_url(), src_path)
+    # Drop pooled connections so nothing keeps serving pre-restore pages
+    await engine.dispose()
+
+    for row in history:
+        if row["id"] == backup.id:
+            row["restored_at"] = datetime.utcnow()
+    async with engine.begin() as conn:
+        await conn.run_sync(models.Backup.__table__.create, checkfirst=True)
+    async with AsyncSessionLocal() as session:
+        await session.execute(delete(models.Backup.__table__))
+        if history:
+            await session.execute(insert(models.Backup.__table__), history)
+        await session.commit()
+        restored = await session.get(models.Backup, backup.id)
+    # Caches, the event sequence and in-memory indexes all describe the old data
+    await bus.restored()
+    return restored
@@ -0,0 +1,65 @@
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from .metrics import Counter, Gauge, registry
+
+_caches = weakref.WeakSet()
+
+
+class TTLCache:
+    """Small in-process cache with per-entry expiry and LRU eviction"""
+
+    def __init__(self, name: str, ttl: float, maxsize: int = 10000):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        _caches.add(self)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            self._data.pop(key, None)
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        self._data[key] = (value, time.monotonic() + (ttl if ttl is not None else self.ttl))
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+@registry.add_collector
+def _cache_metrics():
+    hits = Counter("cache_hits_total", "Cache lookups that found a live entry", ("cache",))
+    misses = Counter("cache_misses_total", "Cache lookups that missed or found an expired entry", ("cache",))
+    ratio = Gauge("cache_hit_ratio", "Hits over lookups since start", ("cache",))
+    entries = Gauge("cache_entries", "Entries currently held", ("cache",))
+    for cache in list(_caches):
+        hits.inc(cache.name, amount=cache.hits)
+        misses.inc(cache.name, amount=cache.misses)
+        lookups = cache.hits + cache.misses
+        ratio.set(cache.name, value=cache.hits / lookups if lookups else 0)
+        entries.set(cache.name, value=len(cache))
+    return [hits, misses, ratio, entries]
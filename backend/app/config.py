@@ -1,4 +1,5 @@
 from pydantic_settings import BaseSettings
+from typing import Dict, Optional
 
 class Settings(BaseSettings):
     DATABASE_URL: str = "sqlite+aiosqlite:///./sql_app.db"
@@ -12,6 +13,124 @@ class Settings(BaseSettings):
     AWS_BUCKET_NAME: str = ""
     AWS_REGION: str = ""
 
+    # Database backups
+    BACKUP_DIR: str = "backups"
+    BACKUP_PAGES_PER_STEP: int = 256  # SQLite pages copied per backup step
+    BACKUP_STEP_SLEEP: float = 0.005  # Seconds to yield to writers between steps
+
+    # Activity feed
+    ACTIVITY_FEED_MAX_ITEMS: int = 200  # Events kept per recipient
+    ACTIVITY_UNREAD_CACHE_TTL: int = 60  # Seconds
+
+    # Live artwork updates (SSE/WebSocket)
+    LIVE_QUEUE_SIZE: int = 100  # Pending events per client
+    LIVE_DROP_POLICY: str = "drop_oldest"  # "drop_oldest", "drop_newest" or "disconnect"
+    LIVE_HEARTBEAT_SECONDS: float = 15.0
+
+    # Nearby search (app/nearby.py)
+    NEARBY_MAX_RADIUS_KM: float = 50.0  # Expansion stops here
+    NEARBY_EXPANSION_FACTOR: float = 4.0
+    NEARBY_MAX_CANDIDATES: int = 5000  # Nearest candidates ranked by the blended order
+    NEARBY_DISTANCE_SCALE_KM: float = 2.0  # Proximity is exp(-distance / scale)
+    NEARBY_RANK_WEIGHTS: Dict[str, float] = {"distance": 1.0, "popularity": 0.3, "unlocked": -0.5}
+
+    # Art walks (app/walk.py)
+    WALK_DEFAULT_KM: float = 3.0
+    WALK_MAX_KM: float = 20.0
+    WALK_SPEED_KMH: float = 4.5
+    WALK_STOP_MINUTES: float = 3.0  # Time spent at each artwork
+    WALK_DETOUR_FACTOR: float = 1.3  # Street distance over straight-line distance
+    WALK_MAX_CANDIDATES: int = 200  # Nearest artworks the planner chooses from
+    WALK_CPU_BUDGET_MS: float = 50.0  # Planning stops here with the best route so far
+    WALK_CELL_DEGREES: float = 0.001  # Routes are planned and cached per start cell (~100 m)
+    WALK_CACHE_TTL: int = 300
+
+    # Near-duplicate images (app/duplicates.py)
+    DUPLICATE_MAX_DISTANCE: int = 6  # Differing bits of 64 for a likely duplicate
+
+    # Unlocking
+    UNLOCK_RADIUS_KM: float = 0.1
+
+    # Delta sync
+    SYNC_OVERLAP_SECONDS: int = 2  # Re-send changes this close to the token to cover in-flight commits
+    SYNC_TOMBSTONE_RETENTION_DAYS: int = 30  # Purged by the job workers' sweep; older tokens get a full sync
+
+    # Read/write routing: read-only endpoints use the replica (a read-only pool on SQLite)
+    READ_ROUTING_ENABLED: bool = True
+    DATABASE_REPLICA_URL: Optional[str] = None  # e.g. a Postgres hot standby
+    READ_YOUR_WRITES_SECONDS: float = 5.0  # Clients stay on the primary this long after a commit
+    REPLICA_MAX_LAG_SECONDS: float = 2.0  # Above this, all reads go to the primary
+    REPLICA_LAG_CHECK_INTERVAL: float = 5.0
+    SQLITE_WAL: bool = True  # Readers no longer wait for writers
+
+    # Recommendations (app/recommendations.py)
+    RECOMMENDATIONS_ENABLED: bool = True
+    RECOMMENDATIONS_TOP_K: int = 20  # Neighbours stored per artwork
+    RECOMMENDATIONS_REFRESH_INTERVAL: int = 60  # Seconds between incremental refreshes
+    RECOMMENDATIONS_REBUILD_HOURS: int = 24
+
+    # Trending (app/trending.py)
+    TRENDING_HALF_LIFE_HOURS: float = 24.0
+    TRENDING_TOP_K: int = 100  # Artworks kept in memory globally and per region
+    TRENDING_REGION_DEGREES: float = 1.0  # Region grid cell size
+
+    # Background jobs (app/jobs.py)
+    JOBS_WORKER_PROCESSES: int = 2
+    JOBS_POLL_INTERVAL: float = 1.0  # Seconds an idle worker waits between polls
+    JOBS_VISIBILITY_TIMEOUT: float = 300.0  # Default; handlers may set their own
+    JOBS_MAX_ATTEMPTS: int = 5
+    JOBS_BACKOFF_SECONDS: float = 10.0  # First retry delay; doubles per attempt
+    JOBS_BACKOFF_MAX_SECONDS: float = 3600.0
+    JOBS_SWEEP_INTERVAL: float = 30.0  # Requeue expired claims, purge old jobs and sync tombstones
+    JOBS_RETENTION_HOURS: int = 168  # Finished jobs are kept this long
+    JOBS_METRICS_INTERVAL: float = 15.0
+
+    # Cross-worker invalidation (app/invalidation.py): caches and live events reach the other workers
+    INVALIDATION_ENABLED: bool = True
+    INVALIDATION_POLL_INTERVAL: float = 0.1  # Seconds between polls when nothing is published locally
+    INVALIDATION_RETENTION_SECONDS: int = 60
+    INVALIDATION_BATCH_SIZE: int = 500
+
+    # Startup: warm connections, indexes and caches in the background before reporting ready
+    STARTUP_WARMUP: bool = True
+
+    # Logging
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"  # "json" or "text"
+    LOG_QUEUE_SIZE: int = 10000  # Records beyond this are dropped rather than blocking
+    LOG_DEBUG_SAMPLE_RATE: float = 0.01  # Share of requests whose DEBUG lines are kept
+
+    # Metrics
+    METRICS_ENABLED: bool = True
+
+    # Slow query log: statements over the threshold are grouped by shape with plans and samples
+    SLOW_QUERY_ENABLED: bool = True
+    SLOW_QUERY_THRESHOLD_MS: float = 100.0
+    SLOW_QUERY_MAX_SHAPES: int = 200
+    SLOW_QUERY_SAMPLES: int = 5  # Recent executions kept per shape, with parameters
+    SLOW_QUERY_EXPLAIN: bool = True
+
+    # On-demand profiling: admins send X-Profile (or "X-Profile: memory"), or a sample of requests
+    PROFILING_ENABLED: bool = False
+    PROFILE_SAMPLE_RATE: float = 0.0
+    PROFILE_TRACEMALLOC: bool = False  # Include a memory diff in sampled profiles
+    PROFILE_INTERVAL: float = 0.005  # Seconds between stack samples
+    PROFILE_DIR: str = "profiles"
+    PROFILE_MAX_FILES: int = 50
+
+    # Per-route SQL statement budgets (app/query_budget.py): "off", "warn" or "raise"
+    QUERY_BUDGET_MODE: str = "off"
+
+    # Admission control: concurrency slots, wait queue and per-client token bucket per route class
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_RETRY_AFTER: int = 1  # Seconds suggested to clients rejected for load
+    ADMISSION_LIMITS: Dict[str, dict] = {
+        "login": {"max_concurrency": 4, "max_queue": 16, "queue_timeout": 2.0, "rate": 0.5, "burst": 5},
+        "nearby": {"max_concurrency": 8, "max_queue": 32, "queue_timeout": 1.0, "rate": 2.0, "burst": 10},
+        "admin": {"max_concurrency": 4, "max_queue": 8, "queue_timeout": 5.0, "rate": 5.0, "burst": 20},
+        "write": {"max_concurrency": 32, "max_queue": 128, "queue_timeout": 2.0, "rate": 5.0, "burst": 30},
+    }
+
     class Config:
         env_file = ".env"
 
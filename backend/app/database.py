@@ -1,21 +1,182 @@
+import asyncio
+import hashlib
+import logging
+from typing import Optional
+
+from fastapi.requests import HTTPConnection
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+from .cache import TTLCache
+from .geo import register_sqlite_functions
+from .metrics import Gauge, instrument_engine, registry
+from .slow_queries import install_slow_query_log
+from .config import settings
+
+logger = logging.getLogger(__name__)
 
 SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./sql_app.db"
 
-engine = create_async_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+def configure_engine(async_engine, wal: bool = False):
+    """Install SQL functions and instrumentation on a new engine"""
+    if async_engine.dialect.name == "sqlite":
+        @event.listens_for(async_engine.sync_engine, "connect")
+        def _on_connect(dbapi_connection, connection_record):
+            register_sqlite_functions(dbapi_connection)
+            if wal:
+                # Lets the read-only pool read while a write is in progress
+                cursor = dbapi_connection.cursor()
+                cursor.execute("PRAGMA journal_mode=WAL")
+                cursor.close()
+
+    instrument_engine(async_engine.sync_engine)
+    if settings.SLOW_QUERY_ENABLED:
+        install_slow_query_log(async_engine.sync_engine)
+    return async_engine
+
+def _engine_kwargs(url: str) -> dict:
+    return {"connect_args": {"check_same_thread": False}} if url.startswith("sqlite") else {}
+
+def read_only_url(url: str) -> Optional[str]:
+    """The same SQLite file opened read-only, so reads get a pool of their own"""
+    url = make_url(url)
+    if not url.drivername.startswith("sqlite") or url.database in (None, "", ":memory:"):
+        return None
+    return f"{url.drivername}:///file:{url.database}?mode=ro&uri=true"
+
+engine = configure_engine(
+    create_async_engine(SQLALCHEMY_DATABASE_URL, **_engine_kwargs(SQLALCHEMY_DATABASE_URL)),
+    wal=settings.SQLITE_WAL
 )
+
+# Reads go to the replica when one is configured; with SQLite that is a
+# read-only pool on the primary file, which never lags
+REPLICA_DATABASE_URL = settings.DATABASE_REPLICA_URL or read_only_url(SQLALCHEMY_DATABASE_URL)
+if settings.READ_ROUTING_ENABLED and REPLICA_DATABASE_URL:
+    read_engine = configure_engine(
+        create_async_engine(REPLICA_DATABASE_URL, **_engine_kwargs(REPLICA_DATABASE_URL))
+    )
+else:
+    read_engine = engine
+
 AsyncSessionLocal = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
+ReadSessionLocal = sessionmaker(
+    read_engine, class_=AsyncSession, expire_on_commit=False
+)
 
 Base = declarative_base()
 
-async def get_db():
+
+class ReadRouter:
+    """Decides per request whether a read session may use the replica.
+
+    A client that has just committed a write is pinned to the primary for
+    READ_YOUR_WRITES_SECONDS so it sees its own changes, and every client
+    falls back to the primary while replica lag exceeds REPLICA_MAX_LAG_SECONDS.
+    Pins can be relayed to the other workers like live events.
+    """
+
+    def __init__(self):
+        self.pins = TTLCache("read_your_writes", ttl=settings.READ_YOUR_WRITES_SECONDS, maxsize=100000)
+        self.lag: Optional[float] = None
+        self.relay = None
+
+    def pin(self, client: str):
+        self.pins.set(client, True)
+        if self.relay is not None:
+            self.relay(client)
+
+    def choose(self, client: str) -> str:
+        """Return the reason for the routing decision; "replica" means use it"""
+        if read_engine is engine:
+            return "no_replica"
+        if self.pins.get(client):
+            return "pinned"
+        if self.lag is not None and self.lag > settings.REPLICA_MAX_LAG_SECONDS:
+            return "lag"
+        return "replica"
+
+
+read_router = ReadRouter()
+
+routed_sessions = registry.counter(
+    "db_sessions_total", "Sessions opened, by requested role, engine used and reason", ("role", "engine", "reason")
+)
+
+
+@registry.add_collector
+def _replica_metrics():
+    lag = Gauge("db_replica_lag_seconds", "Replica lag at the last check")
+    if read_router.lag is not None:
+        lag.set(value=read_router.lag)
+    pinned = Gauge("db_read_your_writes_pins", "Clients currently pinned to the primary")
+    pinned.set(value=len(read_router.pins))
+    return [lag, pinned]
+
+
+def client_key(connection: HTTPConnection) -> str:
+    """Identify the client for read-your-writes: its credentials, else its address"""
+    authorization = connection.headers.get("authorization")
+    if authorization:
+        return "auth:" + hashlib.sha1(authorization.encode()).hexdigest()[:16]
+    return f"ip:{connection.client.host if connection.client else '-'}"
+
+
+@event.listens_for(Session, "after_commit")
+def _pin_writer(session):
+    client = session.info.get("client")
+    if client is not None:
+        read_router.pin(client)
+
+
+async def get_write_db(connection: HTTPConnection):
+    """Session on the primary, for handlers that write"""
+    routed_sessions.inc("write", "primary", "write")
     async with AsyncSessionLocal() as session:
+        session.sync_session.info["client"] = client_key(connection)
+        yield session
+
+# Existing handlers and the auth dependency use the primary
+get_db = get_write_db
+
+async def get_read_db(connection: HTTPConnection):
+    """Session for read-only handlers; on the replica unless the client must read its writes"""
+    reason = read_router.choose(client_key(connection))
+    if reason == "replica":
+        routed_sessions.inc("read", "replica", reason)
+        session_factory = ReadSessionLocal
+    else:
+        routed_sessions.inc("read", "primary", reason)
+        session_factory = AsyncSessionLocal
+    async with session_factory() as session:
         yield session
 
+
+async def measure_replica_lag() -> float:
+    if read_engine.dialect.name == "postgresql":
+        async with read_engine.connect() as conn:
+            lag = await conn.scalar(text(
+                "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+            ))
+        return float(lag)
+    # A read-only pool on the primary SQLite file sees every commit
+    return 0.0
+
+
+async def monitor_replica_lag():
+    while True:
+        try:
+            read_router.lag = await measure_replica_lag()
+        except Exception:
+            # Unknown lag is treated as too much
+            read_router.lag = float("inf")
+            logger.exception("Replica lag check failed")
+        await asyncio.sleep(settings.REPLICA_LAG_CHECK_INTERVAL)
+
 # Create tables
 async def init_db():
     async with engine.begin() as conn:
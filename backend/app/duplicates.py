@@ -0,0 +1,169 @@
+"""Near-duplicate artwork images by perceptual hash.
+
+Uploads of the same mural hash to 64-bit dHashes a few bits apart (see
+app/images.py). Every worker indexes all hashes in memory for Hamming-
+distance search using multi-index hashing: each hash is split into CHUNKS
+16-bit chunks, each with its own table. Two hashes within distance d must
+agree to within d // CHUNKS bits on at least one chunk, so a search probes
+every chunk value that close in each table and checks the few artworks it
+finds. Up to d = 7 that is 17 lookups per table, regardless of how many
+images there are.
+
+The index is loaded at warm-up, updated as uploads and deletions commit and
+kept in step across workers by the invalidation bus.
+"""
+from functools import lru_cache
+from itertools import combinations
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .config import settings
+from .database import engine
+from .invalidation import bus
+from .startup import warmup
+
+CHUNKS = 4
+CHUNK_BITS = 64 // CHUNKS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+DUPLICATES_CHANNEL = "image_hashes"
+
+
+@lru_cache(maxsize=None)
+def _flips(radius: int) -> Tuple[int, ...]:
+    """Every CHUNK_BITS-bit mask with at most radius bits set"""
+    return tuple(
+        sum(1 << bit for bit in bits)
+        for count in range(radius + 1)
+        for bits in combinations(range(CHUNK_BITS), count)
+    )
+
+
+def _chunks(value: int) -> List[int]:
+    return [(value >> (CHUNK_BITS * i)) & CHUNK_MASK for i in range(CHUNKS)]
+
+
+class HashIndex:
+    def __init__(self):
+        self.hashes: Dict[int, int] = {}
+        self.tables: List[Dict[int, Set[int]]] = [{} for _ in range(CHUNKS)]
+
+    def add(self, artwork_id: int, value: int):
+        self.discard(artwork_id)
+        self.hashes[artwork_id] = value
+        for table, chunk in zip(self.tables, _chunks(value)):
+            table.setdefault(chunk, set()).add(artwork_id)
+
+    def discard(self, artwork_id: int):
+        value = self.hashes.pop(artwork_id, None)
+        if value is None:
+            return
+        for table, chunk in zip(self.tables, _chunks(value)):
+            bucket = table[chunk]
+            bucket.discard(artwork_id)
+            if not bucket:
+                del table[chunk]
+
+    def search(self, value: int, max_distance: int) -> List[Tuple[int, int]]:
+        """(artwork id, distance) within max_distance bits, closest first"""
+        flips = _flips(max_distance // CHUNKS)
+        seen: Set[int] = set()
+        for table, chunk in zip(self.tables, _chunks(value)):
+            for flip in flips:
+                seen.update(table.get(chunk ^ flip, ()))
+        matches = []
+        for artwork_id in seen:
+            distance = (self.hashes[artwork_id] ^ value).bit_count()
+            if distance <= max_distance:
+                matches.append((artwork_id, distance))
+        return sorted(matches, key=lambda match: (match[1], match[0]))
+
+    def __len__(self):
+        return len(self.hashes)
+
+
+index = HashIndex()
+
+
+def _apply(artwork_id: int, image_hash: Optional[str]):
+    if image_hash is None:
+        index.discard(artwork_id)
+    else:
+        index.add(artwork_id, int(image_hash, 16))
+
+
+def added(artwork_id: int, image_hash: Optional[str]):
+    """Index a committed artwork's hash here and on the other workers.
+
+    An artwork whose new image could not be hashed is dropped instead, so its
+    old hash does not keep matching.
+    """
+    _apply(artwork_id, image_hash)
+    bus.publish(DUPLICATES_CHANNEL, [artwork_id, image_hash])
+
+
+def removed(artwork_id: int):
+    """Drop a deleted artwork from the index here and on the other workers"""
+    added(artwork_id, None)
+
+
+bus.subscribe(DUPLICATES_CHANNEL, lambda payload: _apply(*payload))
+
+
+def similar_ids(artwork_id: int, max_distance: Optional[int] = None) -> List[int]:
+    """Indexed artworks that look like this one, closest first"""
+    value = index.hashes.get(artwork_id)
+    if value is None:
+        return []
+    max_distance = settings.DUPLICATE_MAX_DISTANCE if max_distance is None else max_distance
+    return [match for match, _ in index.search(value, max_distance) if match != artwork_id]
+
+
+async def find(db: AsyncSession, image_hash: Optional[str], exclude: Optional[int] = None,
+               max_distance: Optional[int] = None, limit: int = 20) -> List[dict]:
+    """Artworks whose image is within max_distance bits of image_hash, closest first"""
+    if image_hash is None:
+        return []
+    max_distance = settings.DUPLICATE_MAX_DISTANCE if max_distance is None else max_distance
+    matches = [match for match in index.search(int(image_hash, 16), max_distance) if match[0] != exclude]
+    if not matches:
+        return []
+
+    distances = dict(matches[:limit])
+    result = await db.execute(
+        select(models.Artwork, models.User.username)
+        .join(models.User, models.Artwork.artist_id == models.User.id)
+        .where(models.Artwork.id.in_(distances))
+    )
+    found = [
+        {
+            "id": artwork.id,
+            "title": artwork.title,
+            "image_url": artwork.image_url,
+            "image_width": artwork.image_width,
+            "image_height": artwork.image_height,
+            "blurhash": artwork.blurhash,
+            "artist_id": artwork.artist_id,
+            "artist_name": artist_name,
+            "status": artwork.status,
+            "distance": distances[artwork.id],
+        }
+        for artwork, artist_name in result.all()
+    ]
+    return sorted(found, key=lambda match: (match["distance"], match["id"]))
+
+
+@warmup("duplicates")
+async def load():
+    """Index every stored image hash, replacing whatever is indexed"""
+    loaded = HashIndex()
+    async with engine.connect() as conn:
+        result = await conn.stream(
+            select(models.Artwork.id, models.Artwork.image_hash).where(models.Artwork.image_hash.is_not(None))
+        )
+        async for artwork_id, image_hash in result:
+            loaded.add(artwork_id, int(image_hash, 16))
+    index.hashes, index.tables = loaded.hashes, loaded.tables
@@ -0,0 +1,48 @@
+from math import asin, cos, degrees, exp, log1p, radians, sin, sqrt
+from typing import Optional, Tuple
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in kilometers"""
+    lat1, lon1, lat2, lon2 = map(radians, (lat1, lon1, lat2, lon2))
+    a = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * asin(min(1.0, sqrt(a)))
+
+
+def bounding_box(latitude: float, longitude: float, radius_km: float) -> Tuple[float, float, Optional[float], Optional[float]]:
+    """Return (min_lat, max_lat, min_lon, max_lon) enclosing a radius.
+
+    The longitude bounds are None when the box reaches a pole or crosses the
+    antimeridian, in which case callers should only filter on latitude.
+    """
+    delta_lat = degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = latitude - delta_lat, latitude + delta_lat
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), min(max_lat, 90.0), None, None
+
+    delta_lon = degrees(asin(min(1.0, sin(radians(delta_lat)) / cos(radians(latitude)))))
+    min_lon, max_lon = longitude - delta_lon, longitude + delta_lon
+    if min_lon < -180 or max_lon > 180:
+        return min_lat, max_lat, None, None
+    return min_lat, max_lat, min_lon, max_lon
+
+
+def _sql_haversine_km(lat1, lon1, lat2, lon2):
+    if None in (lat1, lon1, lat2, lon2):
+        return None
+    return haversine_km(lat1, lon1, lat2, lon2)
+
+
+def logaddexp(a: Optional[float], b: Optional[float]) -> Optional[float]:
+    """log(exp(a) + exp(b)) without overflow, for decayed scores kept as logarithms"""
+    if a is None or b is None:
+        return b if a is None else a
+    return max(a, b) + log1p(exp(-abs(a - b)))
+
+
+def register_sqlite_functions(dbapi_connection):
+    """Expose haversine_km() and logaddexp() to SQL on a SQLite connection"""
+    dbapi_connection.create_function("haversine_km", 4, _sql_haversine_km, deterministic=True)
+    dbapi_connection.create_function("logaddexp", 2, logaddexp, deterministic=True)
@@ -0,0 +1,240 @@
+"""Upload image pipeline.
+
+Whatever is derived from an image's pixels is computed once, when the upload
+is saved, and stored on the artwork, so no request ever decodes an image:
+
+    image_hash   64-bit difference hash (dHash) as 16 hex digits; near-
+                 duplicate images differ in a few bits (see app/duplicates.py)
+    image_width, image_height
+                 pixel size as displayed, after EXIF rotation
+    blurhash     ~30 character BlurHash (https://blurha.sh) of the image
+
+The size and BlurHash are part of every artwork response, so clients can
+lay out grids and map pins and paint a blurred placeholder at once, then
+fetch images only as they scroll into view.
+
+Decoding runs in a worker thread. A file that is not a readable image leaves
+the fields empty rather than failing the upload. Uploads larger than
+MAX_IMAGE_SIDE are shrunk and re-encoded afterwards by an optimize_image
+job (see app/jobs.py).
+
+Artworks saved before a field existed are filled in with:
+
+    python -m app.images backfill
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from typing import NamedTuple, Optional
+
+import numpy as np
+from PIL import Image, ImageOps
+from sqlalchemy import or_, select, update
+
+from . import jobs, models
+
+logger = logging.getLogger(__name__)
+
+# Where the URLs returned by the upload helpers point, relative to the working directory
+URL_DIRECTORIES = {"/uploads/": "uploads", "/images/": os.path.join("static", "images")}
+
+MAX_IMAGE_SIDE = 1920  # Pixels; larger uploads are shrunk to fit
+
+HASH_SIZE = 8  # An 8x8 grid of brightness gradients; 64 bits
+
+BLURHASH_COMPONENTS = 4  # Along the longer side; 3 along the shorter
+BLURHASH_SAMPLE = 32  # Pixels along the longer side the BlurHash is computed from
+BASE83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+ORIENTATION = 0x0112  # EXIF tag
+# Orientations that turn the image a quarter turn
+ROTATED = {5, 6, 7, 8}
+
+
+class ImageInfo(NamedTuple):
+    image_hash: Optional[str] = None
+    image_width: Optional[int] = None
+    image_height: Optional[int] = None
+    blurhash: Optional[str] = None
+
+
+def dhash(image: Image.Image) -> int:
+    """Difference hash: whether each pixel is brighter than its right neighbour"""
+    grey = image.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS)
+    pixels = np.asarray(grey, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def format_hash(value: int) -> str:
+    return f"{value:016x}"
+
+
+def _base83(value: int, length: int) -> str:
+    return "".join(BASE83[value // 83 ** (length - 1 - i) % 83] for i in range(length))
+
+
+def _srgb_to_linear(values: np.ndarray) -> np.ndarray:
+    values = values / 255
+    return np.where(values <= 0.04045, values / 12.92, ((values + 0.055) / 1.055) ** 2.4)
+
+
+def _linear_to_srgb(value: float) -> int:
+    value = min(max(value, 0.0), 1.0)
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def blurhash(image: Image.Image) -> str:
+    """BlurHash of the image: its average colour plus the lowest cosine components"""
+    width, height = image.size
+    x_components, y_components = (
+        (BLURHASH_COMPONENTS, BLURHASH_COMPONENTS - 1) if width >= height
+        else (BLURHASH_COMPONENTS - 1, BLURHASH_COMPONENTS)
+    )
+    scale = BLURHASH_SAMPLE / max(width, height)
+    sample = image.convert("RGB").resize(
+        (max(1, round(width * scale)), max(1, round(height * scale))), Image.BILINEAR
+    )
+    pixels = _srgb_to_linear(np.asarray(sample, dtype=np.float64))
+    rows, columns = pixels.shape[:2]
+
+    # factors[j, i]: mean colour weighted by the basis cos(pi i x / w) cos(pi j y / h)
+    basis_x = np.cos(np.pi * np.outer(np.arange(x_components), np.arange(columns)) / columns)
+    basis_y = np.cos(np.pi * np.outer(np.arange(y_components), np.arange(rows)) / rows)
+    factors = np.einsum("jy,ix,yxc->jic", basis_y, basis_x, pixels) / (rows * columns)
+    factors[1:] *= 2
+    factors[0, 1:] *= 2
+    dc, ac = factors[0, 0], factors.reshape(-1, 3)[1:]
+
+    result = _base83((x_components - 1) + (y_components - 1) * 9, 1)
+    maximum = float(np.abs(ac).max())
+    quantised_maximum = max(0, min(82, int(maximum * 166 - 0.5)))
+    result += _base83(quantised_maximum, 1)
+    maximum = (quantised_maximum + 1) / 166
+
+    r, g, b = (_linear_to_srgb(channel) for channel in dc)
+    result += _base83((r << 16) + (g << 8) + b, 4)
+    quantised = np.clip(np.floor(np.sign(ac) * np.sqrt(np.abs(ac / maximum)) * 9 + 9.5), 0, 18).astype(int)
+    for r, g, b in quantised:
+        result += _base83(r * 19 * 19 + g * 19 + b, 2)
+    return result
+
+
+def local_path(image_url: Optional[str]) -> Optional[str]:
+    for prefix, directory in URL_DIRECTORIES.items():
+        if image_url and image_url.startswith(prefix):
+            return os.path.join(os.getcwd(), directory, image_url[len(prefix):])
+    return None
+
+
+def analyse(path: str) -> ImageInfo:
+    with Image.open(path) as image:
+        width, height = image.size
+        if image.getexif().get(ORIENTATION) in ROTATED:
+            width, height = height, width
+        # JPEGs decode at a fraction of full size; neither hash needs many pixels
+        image.draft("RGB", (64, 64))
+        image = ImageOps.exif_transpose(image)
+        return ImageInfo(
+            image_hash=format_hash(dhash(image)),
+            image_width=width,
+            image_height=height,
+            blurhash=blurhash(image)
+        )
+
+
+async def analyse_upload(image_url: Optional[str]) -> ImageInfo:
+    """Fingerprint a saved upload; empty fields if it cannot be read"""
+    path = local_path(image_url)
+    if path is None:
+        return ImageInfo()
+    try:
+        return await asyncio.to_thread(analyse, path)
+    except Exception:
+        logger.warning("Could not analyse image", extra={"image_url": image_url}, exc_info=True)
+        return ImageInfo()
+
+
+def oversized(info: ImageInfo) -> bool:
+    return info.image_width is not None and max(info.image_width, info.image_height) > MAX_IMAGE_SIDE
+
+
+@jobs.handler("optimize_image", timeout=120)
+def optimize_image(engine, artwork_id: int):
+    """Shrink an oversized upload to MAX_IMAGE_SIDE and re-encode it in place"""
+    with engine.connect() as conn:
+        image_url = conn.scalar(select(models.Artwork.image_url).where(models.Artwork.id == artwork_id))
+    path = local_path(image_url)
+    if path is None or not os.path.exists(path):
+        return  # Deleted or replaced since
+
+    with Image.open(path) as image:
+        if max(image.size) <= MAX_IMAGE_SIDE or getattr(image, "is_animated", False):
+            return  # Already done by an earlier attempt, or not ours to flatten
+        image_format = image.format
+        # Bake in the EXIF rotation, which the re-encoded file does not keep
+        resized = ImageOps.exif_transpose(image)
+        resized.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE))
+    # Write aside and swap, so a crash never leaves a truncated image
+    temporary = f"{path}.tmp"
+    resized.save(temporary, format=image_format, optimize=True, quality=85)
+    os.replace(temporary, path)
+
+    with engine.begin() as conn:
+        conn.execute(
+            update(models.Artwork)
+            .where(models.Artwork.id == artwork_id)
+            .values(image_width=resized.width, image_height=resized.height)
+        )
+
+
+def backfill(engine) -> int:
+    """Analyse stored images of artworks missing any derived field; returns how many were updated"""
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(models.Artwork.id, models.Artwork.image_url)
+            .where(models.Artwork.image_url.is_not(None), or_(
+                *(getattr(models.Artwork, field).is_(None) for field in ImageInfo._fields)
+            ))
+        ).all()
+
+    updated = 0
+    for artwork_id, image_url in rows:
+        path = local_path(image_url)
+        if path is None or not os.path.exists(path):
+            continue
+        try:
+            info = analyse(path)
+        except Exception as e:
+            logger.warning("Could not analyse image", extra={"image_url": image_url, "error": str(e)})
+            continue
+        with engine.begin() as conn:
+            conn.execute(update(models.Artwork).where(models.Artwork.id == artwork_id).values(**info._asdict()))
+        updated += 1
+    return updated
+
+
+def main():
+    from .manage import sync_engine
+    from .database import SQLALCHEMY_DATABASE_URL
+
+    parser = argparse.ArgumentParser(prog="python -m app.images", description="Upload image pipeline")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--database-url", default=SQLALCHEMY_DATABASE_URL)
+    args = parser.parse_args()
+
+    engine = sync_engine(args.database_url)
+    started = time.perf_counter()
+    try:
+        count = backfill(engine)
+    finally:
+        engine.dispose()
+    print(f"{count} artworks in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
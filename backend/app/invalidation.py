@@ -0,0 +1,260 @@
+"""Cross-worker invalidation bus.
+
+With several uvicorn workers each process has its own caches, live broker and
+read-your-writes pins, so a write handled by one worker must reach the others. Events are
+rows in the invalidation_events table: publishing applies the event locally
+at once and queues the row, and every worker runs a poller that inserts its
+queued rows and reads rows written by the other workers since the last id it
+saw. The database is already shared by every worker, so no extra service or
+socket is needed, and a worker that restarts only has to skip to the newest id.
+
+Propagation latency (publish on one worker to apply on another) is recorded
+in invalidation_propagation_seconds. Rows older than
+INVALIDATION_RETENTION_SECONDS are pruned; a worker that could not poll for
+that long clears every registered cache rather than risk missed events.
+
+Restoring a backup rolls the table and its ids back. A worker that finds the
+newest id below the last one it saw, or receives a reset from the worker that
+restored, starts again from the newest id, clears every registered cache and
+runs the reset handlers, which reload in-memory state from the database.
+
+    unread_counts = TTLCache("activity_unread", ttl=60)
+    bus.register_cache(unread_counts)
+    ...
+    bus.invalidate(unread_counts, user_id)  # here and in every other worker
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from sqlalchemy import delete, func, insert, select
+
+from . import models
+from .cache import TTLCache
+from .config import settings
+from .database import engine, read_router
+from .metrics import registry
+from .realtime import broker
+
+logger = logging.getLogger(__name__)
+
+PROPAGATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+propagation_seconds = registry.histogram(
+    "invalidation_propagation_seconds", "Time from publish in one worker to apply in another",
+    ("channel",), buckets=PROPAGATION_BUCKETS
+)
+published_events = registry.counter("invalidation_events_published_total", "Events published", ("channel",))
+received_events = registry.counter(
+    "invalidation_events_received_total", "Events applied from other workers", ("channel",)
+)
+poll_errors = registry.counter("invalidation_poll_errors_total", "Failed polls of the invalidation table")
+
+LIVE_CHANNEL = "live"
+PIN_CHANNEL = "read_your_writes"
+RESET_CHANNEL = "reset"
+_CLEAR = "__all__"
+
+
+def _cache_channel(cache: TTLCache) -> str:
+    return f"cache:{cache.name}"
+
+
+def _decode_key(key: Any) -> Hashable:
+    # JSON turns tuple keys into lists
+    return tuple(_decode_key(part) for part in key) if isinstance(key, list) else key
+
+
+class InvalidationBus:
+    def __init__(self):
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.handlers: Dict[str, List[Callable[[Any], None]]] = {}
+        self.caches: Dict[str, TTLCache] = {}
+        self.reset_handlers: List[Callable[[], Awaitable]] = []
+        self.last_id = 0
+        self._outbox: deque = deque()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._last_poll = 0.0
+        self._last_prune = 0.0
+
+    def subscribe(self, channel: str, handler: Callable[[Any], None]):
+        """Call handler(payload) for events published by other workers"""
+        self.handlers.setdefault(channel, []).append(handler)
+
+    def publish(self, channel: str, payload: Any):
+        """Queue an event for the other workers; the caller has already applied it locally"""
+        published_events.inc(channel)
+        if self._task is None:
+            return
+        self._outbox.append({
+            "channel": channel,
+            "payload": json.dumps(payload, default=str),
+            "origin": self.worker_id,
+            "created_at": time.time(),
+        })
+        self._wake.set()
+
+    def on_reset(self, handler: Callable[[], Awaitable]):
+        """Await handler() whenever the database has been replaced under this worker"""
+        self.reset_handlers.append(handler)
+
+    def register_cache(self, cache: TTLCache):
+        self.caches[cache.name] = cache
+
+        def apply(key):
+            if key == _CLEAR:
+                cache.clear()
+            else:
+                cache.invalidate(_decode_key(key))
+        self.subscribe(_cache_channel(cache), apply)
+
+    def invalidate(self, cache: TTLCache, key: Hashable):
+        cache.invalidate(key)
+        self.publish(_cache_channel(cache), key)
+
+    def clear(self, cache: TTLCache):
+        cache.clear()
+        self.publish(_cache_channel(cache), _CLEAR)
+
+    def _dispatch(self, event, now: float):
+        propagation_seconds.observe(max(0.0, now - event.created_at), event.channel)
+        received_events.inc(event.channel)
+        payload = json.loads(event.payload)
+        for handler in self.handlers.get(event.channel, ()):
+            try:
+                handler(payload)
+            except Exception:
+                logger.exception("Invalidation handler failed", extra={"channel": event.channel})
+
+    async def poll(self):
+        """Write queued events, then apply events from other workers"""
+        outgoing = []
+        while self._outbox:
+            outgoing.append(self._outbox.popleft())
+
+        try:
+            async with engine.begin() as conn:
+                if outgoing:
+                    await conn.execute(insert(models.InvalidationEvent), outgoing)
+                result = await conn.execute(
+                    select(models.InvalidationEvent)
+                    .where(models.InvalidationEvent.id > self.last_id)
+                    .order_by(models.InvalidationEvent.id)
+                    .limit(settings.INVALIDATION_BATCH_SIZE)
+                )
+                events = result.all()
+                # A restore takes the ids back below what we have seen
+                regressed = not events and self.last_id > (
+                    await conn.scalar(select(func.max(models.InvalidationEvent.id))) or 0
+                )
+
+                now = time.time()
+                if now - self._last_prune > settings.INVALIDATION_RETENTION_SECONDS / 4:
+                    await conn.execute(delete(models.InvalidationEvent).where(
+                        models.InvalidationEvent.created_at < now - settings.INVALIDATION_RETENTION_SECONDS
+                    ))
+                    self._last_prune = now
+        except Exception:
+            # Nothing was committed; send them with the next poll
+            self._outbox.extendleft(reversed(outgoing))
+            raise
+
+        if now - self._last_poll > settings.INVALIDATION_RETENTION_SECONDS and self._last_poll:
+            # Events may have been pruned before we read them
+            logger.warning("Invalidation poller fell behind; clearing caches",
+                           extra={"seconds": round(now - self._last_poll, 1)})
+            for cache in self.caches.values():
+                cache.clear()
+        self._last_poll = now
+
+        if regressed:
+            logger.warning("Invalidation events went back in time; resetting", extra={"last_id": self.last_id})
+            return await self.reset()
+        for event in events:
+            self.last_id = event.id
+            if event.origin == self.worker_id:
+                continue
+            if event.channel == RESET_CHANNEL:
+                received_events.inc(event.channel)
+                return await self.reset()
+            self._dispatch(event, now)
+        if len(events) == settings.INVALIDATION_BATCH_SIZE:
+            self._wake.set()  # More are waiting
+
+    async def reset(self):
+        """Skip to the newest event and reload everything this worker holds in memory"""
+        async with engine.connect() as conn:
+            self.last_id = await conn.scalar(select(func.max(models.InvalidationEvent.id))) or 0
+        for cache in self.caches.values():
+            cache.clear()
+        for handler in self.reset_handlers:
+            try:
+                await handler()
+            except Exception:
+                logger.exception("Reset handler failed")
+
+    async def restored(self):
+        """Reset this worker and tell the others to, after the database was replaced"""
+        await self.reset()
+        self.publish(RESET_CHANNEL, self.worker_id)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                poll_errors.inc()
+                logger.exception("Invalidation poll failed")
+            try:
+                await asyncio.wait_for(self._wake.wait(), settings.INVALIDATION_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def start(self):
+        # Only events published from now on concern this worker
+        async with engine.connect() as conn:
+            self.last_id = await conn.scalar(select(func.max(models.InvalidationEvent.id))) or 0
+        self._last_poll = time.time()
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        if self._outbox:
+            # Hand the last events to the other workers before exiting
+            await self.poll()
+
+
+bus = InvalidationBus()
+
+
+def _relay_live_event(topic: str, event: dict):
+    bus.publish(LIVE_CHANNEL, {"topic": topic, "event": event})
+
+
+def _deliver_live_event(payload: dict):
+    broker.deliver(payload["topic"], payload["event"])
+
+
+broker.relay = _relay_live_event
+bus.subscribe(LIVE_CHANNEL, _deliver_live_event)
+
+# A client's next read may land on another worker
+read_router.relay = lambda client: bus.publish(PIN_CHANNEL, client)
+bus.subscribe(PIN_CHANNEL, lambda client: read_router.pins.set(client, True))
@@ -0,0 +1,399 @@
+"""Durable background jobs in the application database.
+
+Work that should outlive the request, and a restart, is a row in the jobs
+table. enqueue() adds it in the caller's transaction, so a job exists only
+if the change that asked for it committed:
+
+    await jobs.enqueue(db, "optimize_image", {"artwork_id": artwork.id})
+    await db.commit()
+
+Worker processes claim one runnable job at a time: the lowest priority
+value first, then the earliest run_at. A claim is a single UPDATE ...
+RETURNING, with SKIP LOCKED on PostgreSQL, so workers never run the same
+job twice at once. It holds the job for the kind's visibility timeout. A
+worker that dies mid-job loses it when the timeout passes, and any worker
+then requeues it. A failed job is retried after an exponential backoff with
+jitter until max_attempts, then stays failed until an admin retries it.
+Handlers should therefore be idempotent.
+
+Handlers are plain functions registered by kind. They get a blocking engine
+and the payload as keyword arguments:
+
+    @jobs.handler("optimize_image", timeout=120)
+    def optimize_image(engine, artwork_id: int): ...
+
+Run a pool of worker processes next to the app:
+
+    python -m app.jobs worker --processes 4
+    python -m app.jobs enqueue optimize_image '{"artwork_id": 1}'
+
+Every app worker samples queue depth and the oldest runnable job's age, and
+records how long jobs finished since its last sample waited and ran, every
+JOBS_METRICS_INTERVAL seconds (jobs_* on /metrics).
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import time
+import traceback
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, sync
+from .config import settings
+from .metrics import Gauge, registry
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+JOB_LATENCY_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+wait_seconds = registry.histogram(
+    "jobs_wait_seconds", "Time from runnable to claimed", ("kind",), buckets=JOB_LATENCY_BUCKETS
+)
+run_seconds = registry.histogram(
+    "jobs_run_seconds", "Time from claimed to finished", ("kind",), buckets=JOB_LATENCY_BUCKETS
+)
+finished_jobs = registry.counter("jobs_finished_total", "Jobs that finished, by outcome", ("kind", "status"))
+
+
+class Handler(NamedTuple):
+    func: Callable[..., Any]
+    timeout: float
+    max_attempts: int
+
+
+HANDLERS: Dict[str, Handler] = {}
+
+# Imported by worker processes so that their handlers are registered
+HANDLER_MODULES = ["app.images"]
+
+
+def handler(kind: str, timeout: Optional[float] = None, max_attempts: Optional[int] = None):
+    """Register func(engine, **payload) to run jobs of this kind"""
+    def register(func):
+        HANDLERS[kind] = Handler(
+            func,
+            timeout if timeout is not None else settings.JOBS_VISIBILITY_TIMEOUT,
+            max_attempts if max_attempts is not None else settings.JOBS_MAX_ATTEMPTS
+        )
+        return func
+    return register
+
+
+def load_handlers():
+    for module in HANDLER_MODULES:
+        importlib.import_module(module)
+
+
+def _job_values(kind: str, payload: Optional[dict], priority: int, delay: float) -> dict:
+    spec = HANDLERS.get(kind)
+    now = time.time()
+    return {
+        "kind": kind,
+        "payload": json.dumps(payload or {}),
+        "priority": priority,
+        "status": QUEUED,
+        "attempts": 0,
+        "max_attempts": spec.max_attempts if spec else settings.JOBS_MAX_ATTEMPTS,
+        "timeout": spec.timeout if spec else settings.JOBS_VISIBILITY_TIMEOUT,
+        "run_at": now + delay,
+        "created_at": now,
+    }
+
+
+async def enqueue(db: AsyncSession, kind: str, payload: Optional[dict] = None, priority: int = 0,
+                  delay: float = 0.0) -> models.Job:
+    """Add a job to the caller's transaction; lower priority values run first"""
+    job = models.Job(**_job_values(kind, payload, priority, delay))
+    db.add(job)
+    return job
+
+
+def enqueue_now(conn, kind: str, payload: Optional[dict] = None, priority: int = 0, delay: float = 0.0) -> int:
+    """enqueue() for a blocking connection; returns the job id"""
+    result = conn.execute(models.Job.__table__.insert().values(_job_values(kind, payload, priority, delay)))
+    return result.inserted_primary_key[0]
+
+
+def backoff(attempts: int) -> float:
+    """Seconds before retrying after the given number of failed attempts"""
+    ceiling = min(settings.JOBS_BACKOFF_MAX_SECONDS, settings.JOBS_BACKOFF_SECONDS * 2 ** (attempts - 1))
+    return ceiling * random.uniform(0.5, 1.0)
+
+
+class Claim(NamedTuple):
+    id: int
+    kind: str
+    payload: str
+    attempts: int
+    max_attempts: int
+
+
+class Worker:
+    def __init__(self, engine, name: Optional[str] = None):
+        self.engine = engine
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self._last_sweep = 0.0
+
+    def claim(self) -> Optional[Claim]:
+        now = time.time()
+        next_job = (
+            select(models.Job.id)
+            .where(models.Job.status == QUEUED, models.Job.run_at <= now)
+            .order_by(models.Job.priority, models.Job.run_at, models.Job.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        with self.engine.begin() as conn:
+            row = conn.execute(
+                update(models.Job)
+                .where(models.Job.id == next_job, models.Job.status == QUEUED)
+                .values(
+                    status=RUNNING,
+                    attempts=models.Job.attempts + 1,
+                    locked_by=self.name,
+                    locked_until=now + models.Job.timeout,
+                    started_at=now
+                )
+                .returning(models.Job.id, models.Job.kind, models.Job.payload,
+                           models.Job.attempts, models.Job.max_attempts)
+            ).first()
+        return Claim(*row) if row else None
+
+    def _finish(self, claim: Claim, **values) -> bool:
+        """Record the outcome unless the claim expired and the job moved on"""
+        with self.engine.begin() as conn:
+            result = conn.execute(
+                update(models.Job)
+                .where(models.Job.id == claim.id, models.Job.status == RUNNING,
+                       models.Job.locked_by == self.name, models.Job.attempts == claim.attempts)
+                .values(locked_by=None, locked_until=None, **values)
+            )
+        if result.rowcount == 0:
+            logger.warning("Job claim expired before it finished", extra={"job_id": claim.id, "kind": claim.kind})
+        return result.rowcount == 1
+
+    def run(self, claim: Claim):
+        spec = HANDLERS.get(claim.kind)
+        started = time.perf_counter()
+        try:
+            if spec is None:
+                raise LookupError(f"No handler for job kind {claim.kind!r}")
+            spec.func(self.engine, **json.loads(claim.payload))
+        except Exception:
+            error = traceback.format_exc()
+            retry = spec is not None and claim.attempts < claim.max_attempts
+            if retry:
+                self._finish(claim, status=QUEUED, run_at=time.time() + backoff(claim.attempts), last_error=error)
+            else:
+                self._finish(claim, status=FAILED, finished_at=time.time(), last_error=error)
+            logger.exception("Job failed", extra={
+                "job_id": claim.id, "kind": claim.kind, "attempt": claim.attempts, "retry": retry
+            })
+            return
+        self._finish(claim, status=DONE, finished_at=time.time())
+        logger.info("Job done", extra={
+            "job_id": claim.id, "kind": claim.kind, "duration": time.perf_counter() - started
+        })
+
+    def sweep(self):
+        """Requeue or fail jobs whose claim expired, and purge old finished jobs and sync tombstones"""
+        now = time.time()
+        expired = (models.Job.status == RUNNING, models.Job.locked_until < now)
+        with self.engine.begin() as conn:
+            conn.execute(
+                update(models.Job)
+                .where(*expired, models.Job.attempts < models.Job.max_attempts)
+                .values(status=QUEUED, run_at=now, locked_by=None, locked_until=None,
+                        last_error="Visibility timeout expired")
+            )
+            conn.execute(
+                update(models.Job)
+                .where(*expired)
+                .values(status=FAILED, finished_at=now, locked_by=None, locked_until=None,
+                        last_error="Visibility timeout expired")
+            )
+            conn.execute(
+                delete(models.Job)
+                .where(models.Job.finished_at < now - settings.JOBS_RETENTION_HOURS * 3600)
+            )
+            sync.purge_tombstones(conn)
+        self._last_sweep = now
+
+    def run_until(self, stopping: Callable[[], bool]):
+        while not stopping():
+            try:
+                if time.time() - self._last_sweep > settings.JOBS_SWEEP_INTERVAL:
+                    self.sweep()
+                claim = self.claim()
+            except Exception:
+                logger.exception("Job queue poll failed")
+                claim = None
+            if claim is None:
+                time.sleep(settings.JOBS_POLL_INTERVAL)
+                continue
+            self.run(claim)
+
+
+def _worker_process(database_url: str, stop):
+    from .log import setup_logging
+    from .manage import sync_engine
+
+    # The parent turns Ctrl-C into stop; the current job finishes first
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    setup_logging()
+    load_handlers()
+    engine = sync_engine(database_url)
+    try:
+        Worker(engine).run_until(stop.is_set)
+    finally:
+        engine.dispose()
+
+
+def run_pool(database_url: str, processes: int):
+    # Spawned, not forked: each worker starts its own engine and log thread
+    context = multiprocessing.get_context("spawn")
+    stop = context.Event()
+    workers = [
+        context.Process(target=_worker_process, args=(database_url, stop), name=f"job-worker-{i}")
+        for i in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+
+    # Only a flag: setting the Event here could deadlock on its own lock
+    signals = []
+    signal.signal(signal.SIGINT, lambda signum, frame: signals.append(signum))
+    signal.signal(signal.SIGTERM, lambda signum, frame: signals.append(signum))
+
+    # Restart workers that crash until asked to stop
+    while not signals:
+        for i, worker in enumerate(workers):
+            if not worker.is_alive():
+                logger.error("Job worker exited; restarting", extra={"exitcode": worker.exitcode})
+                workers[i] = context.Process(
+                    target=_worker_process, args=(database_url, stop), name=worker.name
+                )
+                workers[i].start()
+        time.sleep(1.0)
+    logger.info("Stopping job workers")
+    stop.set()
+    for worker in workers:
+        worker.join()
+
+
+# Metrics, sampled by the app
+
+class QueueSample:
+    def __init__(self):
+        self.depth: List[Tuple[str, str, int]] = []
+        self.oldest: List[Tuple[str, float]] = []
+
+
+sample = QueueSample()
+
+
+@registry.add_collector
+def _queue_metrics():
+    depth = Gauge("jobs_queue_depth", "Queued, running and failed jobs by kind", ("kind", "status"))
+    for kind, status, count in sample.depth:
+        depth.set(kind, status, value=count)
+    oldest = Gauge("jobs_oldest_runnable_seconds", "How long the oldest runnable job has waited", ("kind",))
+    for kind, age in sample.oldest:
+        oldest.set(kind, value=age)
+    return [depth, oldest]
+
+
+async def sample_metrics(db_engine, since: float) -> float:
+    """Refresh the jobs_* metrics; returns the watermark for the next sample"""
+    now = time.time()
+    async with db_engine.connect() as conn:
+        depth = await conn.execute(
+            select(models.Job.kind, models.Job.status, func.count())
+            .where(models.Job.status.in_([QUEUED, RUNNING, FAILED]))
+            .group_by(models.Job.kind, models.Job.status)
+        )
+        oldest = await conn.execute(
+            select(models.Job.kind, func.min(models.Job.run_at))
+            .where(models.Job.status == QUEUED, models.Job.run_at <= now)
+            .group_by(models.Job.kind)
+        )
+        finished = await conn.execute(
+            select(models.Job.kind, models.Job.status, models.Job.run_at,
+                   models.Job.started_at, models.Job.finished_at)
+            .where(models.Job.finished_at > since, models.Job.finished_at <= now)
+        )
+        sample.depth = [tuple(row) for row in depth.all()]
+        sample.oldest = [(kind, now - run_at) for kind, run_at in oldest.all()]
+        finished = finished.all()
+
+    for kind, status, run_at, started_at, finished_at in finished:
+        finished_jobs.inc(kind, status)
+        if started_at is not None:
+            wait_seconds.observe(max(0.0, started_at - run_at), kind)
+            run_seconds.observe(finished_at - started_at, kind)
+    return now
+
+
+async def monitor_queue():
+    from .database import engine
+
+    since = time.time()
+    while True:
+        try:
+            since = await sample_metrics(engine, since)
+        except Exception:
+            logger.exception("Job queue metrics failed")
+        await asyncio.sleep(settings.JOBS_METRICS_INTERVAL)
+
+
+def main():
+    from .manage import sync_engine
+    from .database import SQLALCHEMY_DATABASE_URL
+
+    parser = argparse.ArgumentParser(prog="python -m app.jobs", description="Durable background jobs")
+    parser.add_argument("--database-url", default=SQLALCHEMY_DATABASE_URL)
+    commands = parser.add_subparsers(dest="command", required=True)
+    worker = commands.add_parser("worker", help="Run a pool of worker processes")
+    worker.add_argument("--processes", type=int, default=settings.JOBS_WORKER_PROCESSES)
+    add = commands.add_parser("enqueue", help="Queue a job")
+    add.add_argument("kind")
+    add.add_argument("payload", nargs="?", default="{}", help="JSON keyword arguments for the handler")
+    add.add_argument("--priority", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        from .log import setup_logging
+        setup_logging()
+        run_pool(args.database_url, args.processes)
+    elif args.command == "enqueue":
+        load_handlers()
+        engine = sync_engine(args.database_url)
+        try:
+            with engine.begin() as conn:
+                job_id = enqueue_now(conn, args.kind, json.loads(args.payload), args.priority)
+        finally:
+            engine.dispose()
+        print(f"Queued job {job_id}")
+
+
+if __name__ == "__main__":
+    # Run the package's copy of this module: handlers register with it, and
+    # spawned workers import it by name
+    from app.jobs import main as package_main
+    package_main()
@@ -4,17 +4,29 @@ from fastapi import FastAPI, Depends, HTTPException
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.ext.asyncio import AsyncSession
-import asyncio
-from . import models
-from .database import engine, get_db, Base
-from .routers import users, auth, artworks, social, discoveries, categories, admin, profiles
+from . import startup
+from .database import get_db
+from .routers import users, auth, artworks, social, discoveries, categories, admin, profiles, activity, live, sync, metrics, health
 import os
-from sqlalchemy import select
-from .routers.artworks import PREDEFINED_CATEGORIES
+from .admission import AdmissionControlMiddleware
+from .metrics import MetricsMiddleware
+from .query_budget import QueryBudgetMiddleware
+from .profiling import ProfilingMiddleware
+from .config import settings
+from .log import RequestIdMiddleware, setup_logging, shutdown_logging
 
 # Initialize FastAPI app
 app = FastAPI(title="Artevia API")
 
+# Innermost, so an over-budget response can still be replaced before it is sent
+if settings.QUERY_BUDGET_MODE != "off":
+    app.add_middleware(QueryBudgetMiddleware)
+
+# Shed load on expensive routes before it reaches the event loop and database
+# (added first so CORS headers are still applied to rejections)
+if settings.ADMISSION_ENABLED:
+    app.add_middleware(AdmissionControlMiddleware)
+
 # Update CORS middleware configuration
 app.add_middleware(
     CORSMiddleware,
@@ -29,18 +41,22 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
-# Create both static and uploads directories
-static_dir = os.path.join(os.getcwd(), "static")
-uploads_dir = os.path.join(os.getcwd(), "uploads")
-os.makedirs(static_dir, exist_ok=True)
-os.makedirs(uploads_dir, exist_ok=True)
+# Only installed when enabled so unprofiled deployments pay nothing
+if settings.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
 
-# Mount both directories
-app.mount("/static", StaticFiles(directory=static_dir), name="static")
-app.mount("/uploads", StaticFiles(directory=uploads_dir), name="uploads")
+# Outermost, so latency includes time spent queued by admission control
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
 
-print(f"Static directory: {static_dir}")
-print(f"Uploads directory: {uploads_dir}")
+# Wraps everything so every log line of a request carries its id
+app.add_middleware(RequestIdMiddleware)
+
+# Directories are created at startup, so don't check them at import
+static_dir = os.path.join(os.getcwd(), "static")
+uploads_dir = os.path.join(os.getcwd(), "uploads")
+app.mount("/static", StaticFiles(directory=static_dir, check_dir=False), name="static")
+app.mount("/uploads", StaticFiles(directory=uploads_dir, check_dir=False), name="uploads")
 
 # Include routers
 app.include_router(users.router)
@@ -51,35 +67,22 @@ app.include_router(discoveries.router)
 app.include_router(categories.router)
 app.include_router(admin.router)
 app.include_router(profiles.router)
+app.include_router(activity.router)
+app.include_router(live.router)
+app.include_router(sync.router)
+app.include_router(metrics.router)
+app.include_router(health.router)
 
-# Create async function to create tables
-async def create_tables():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-
-# Create startup event to create tables
+# Migrations run before serving; warm-up continues in the background until /health/ready
 @app.on_event("startup")
 async def startup_event():
-    await create_tables()
-
-# Create async function to create predefined categories
-async def create_predefined_categories():
-    async with AsyncSession(engine) as db:
-        # Check if categories exist
-        result = await db.execute(select(models.Category))
-        existing = result.scalars().all()
-        
-        if not existing:
-            # Create predefined categories
-            for name in PREDEFINED_CATEGORIES:
-                category = models.Category(name=name)
-                db.add(category)
-            await db.commit()
+    setup_logging()
+    await startup.startup()
 
-# Create startup event to create predefined categories
-@app.on_event("startup")
-async def startup_event():
-    await create_predefined_categories()
+@app.on_event("shutdown")
+async def shutdown_event():
+    await startup.shutdown()
+    shutdown_logging()
 
 # Basic test route
 @app.get("/")
@@ -0,0 +1,206 @@
+"""Database management commands.
+
+    python -m app.manage reset                      # drop, recreate, add admin and categories
+    python -m app.manage seed --scale small         # reset, then load a synthetic dataset
+    python -m app.manage load fixtures.json         # insert rows from a JSON fixture
+
+Bulk loads run in a single transaction of batched Core inserts. On SQLite the
+journal moves to memory and fsync is off for the load, and secondary indexes
+are built once at the end, so millions of rows take seconds. Bcrypt is slow by
+design, so each distinct password is hashed once and reused.
+
+A fixture maps table names to lists of rows; user rows may give a plain
+"password", which is hashed on the way in:
+
+    {"users": [{"email": "a@example.com", "username": "a", "password": "secret"}],
+     "categories": [{"name": "Mural"}]}
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+from functools import lru_cache
+from itertools import groupby
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from sqlalchemy import DateTime, create_engine
+from sqlalchemy.engine import make_url
+
+from . import models
+from .auth.auth import get_password_hash
+from .database import SQLALCHEMY_DATABASE_URL, Base
+from .migrations import stamp
+from .routers.artworks import PREDEFINED_CATEGORIES
+
+BATCH_SIZE = 10000
+
+# Applied for the duration of a bulk load on SQLite. Crash safety does not
+# matter for a database we can regenerate; the in-memory journal still lets
+# a failed load roll back.
+BULK_LOAD_PRAGMAS = {
+    "journal_mode": "MEMORY",
+    "synchronous": "OFF",
+    "temp_store": "MEMORY",
+    "cache_size": "-262144",  # 256 MiB
+}
+
+
+@lru_cache(maxsize=None)
+def hash_password(password: str) -> str:
+    """Bcrypt hash, computed once per distinct password"""
+    return get_password_hash(password)
+
+
+def sync_engine(url: str = SQLALCHEMY_DATABASE_URL):
+    """Blocking engine on the same database as the app's async engine"""
+    url = make_url(url)
+    driver = {"sqlite+aiosqlite": "sqlite", "postgresql+asyncpg": "postgresql+psycopg2"}.get(url.drivername)
+    return create_engine(url.set(drivername=driver or url.drivername))
+
+
+def batched(rows: Iterable[dict], size: int = BATCH_SIZE) -> Iterator[List[dict]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def reset_schema(engine):
+    Base.metadata.drop_all(engine)
+    with engine.begin() as conn:
+        Base.metadata.create_all(conn)
+        stamp(conn)
+
+
+def bulk_load(engine, tables: Iterable[Tuple[str, Iterable[dict]]], batch_size: int = BATCH_SIZE) -> Dict[str, int]:
+    """Insert (table name, rows) pairs in one transaction; returns row counts per table"""
+    sqlite = engine.dialect.name == "sqlite"
+    counts = {}
+    with engine.connect() as conn:
+        previous = {}
+        if sqlite:
+            for name, value in BULK_LOAD_PRAGMAS.items():
+                previous[name] = conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+                conn.exec_driver_sql(f"PRAGMA {name} = {value}")
+            conn.commit()
+        try:
+            with conn.begin():
+                deferred = []
+                for name, rows in tables:
+                    table = Base.metadata.tables[name]
+                    if sqlite:
+                        # Build secondary indexes once at the end instead of per row
+                        for index in table.indexes:
+                            if not index.unique:
+                                index.drop(conn, checkfirst=True)
+                                deferred.append(index)
+
+                    started = time.perf_counter()
+                    count = 0
+                    for batch in batched(rows, batch_size):
+                        # executemany needs the same keys in every row; fixtures may omit columns
+                        for _, group in groupby(batch, key=lambda row: row.keys()):
+                            conn.execute(table.insert(), list(group))
+                        count += len(batch)
+                    counts[name] = counts.get(name, 0) + count
+                    print(f"{name}: {count} rows in {time.perf_counter() - started:.1f}s")
+
+                started = time.perf_counter()
+                for index in deferred:
+                    index.create(conn, checkfirst=True)
+                if deferred:
+                    print(f"indexes: {len(deferred)} built in {time.perf_counter() - started:.1f}s")
+        finally:
+            for name, value in previous.items():
+                conn.exec_driver_sql(f"PRAGMA {name} = {value}")
+            if previous:
+                conn.commit()
+    return counts
+
+
+def default_rows(admin_email: str, admin_password: str) -> List[Tuple[str, List[dict]]]:
+    return [
+        ("users", [{
+            "email": admin_email,
+            "username": "admin",
+            "password": hash_password(admin_password),
+            "role": "admin",
+            "is_active": True,
+            "status": "active",
+        }]),
+        ("categories", [{"name": name} for name in PREDEFINED_CATEGORIES]),
+    ]
+
+
+def _fixture_rows(table_name: str, rows: List[dict]) -> Iterator[dict]:
+    table = Base.metadata.tables[table_name]
+    datetime_columns = [column.name for column in table.columns if isinstance(column.type, DateTime)]
+    for row in rows:
+        row = dict(row)
+        if table_name == "users" and "password" in row and not row["password"].startswith("$2"):
+            row["password"] = hash_password(row["password"])
+        for name in datetime_columns:
+            if isinstance(row.get(name), str):
+                row[name] = datetime.fromisoformat(row[name])
+        yield row
+
+
+def load_fixture(engine, path: str) -> Dict[str, int]:
+    with open(path) as f:
+        fixture = json.load(f)
+    # Insert in foreign key order whatever order the file uses
+    order = [table.name for table in Base.metadata.sorted_tables if table.name in fixture]
+    unknown = set(fixture) - set(order)
+    if unknown:
+        raise ValueError(f"Unknown tables in fixture: {', '.join(sorted(unknown))}")
+    return bulk_load(engine, ((name, _fixture_rows(name, fixture[name])) for name in order))
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m app.manage", description="Manage the Artevia database")
+    parser.add_argument("--database-url", default=SQLALCHEMY_DATABASE_URL)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    reset = commands.add_parser("reset", help="Drop and recreate all tables with an admin and categories")
+    reset.add_argument("--admin-email", default="admin@artevia.com")
+    reset.add_argument("--admin-password", default="admin123")
+
+    seed = commands.add_parser("seed", help="Reset, then load a synthetic dataset")
+    seed.add_argument("--scale", default="small", help="tiny, small or large (see benchmarks.datagen)")
+    seed.add_argument("--seed", type=int, default=42)
+
+    load = commands.add_parser("load", help="Insert rows from a JSON fixture")
+    load.add_argument("fixture")
+    load.add_argument("--reset", action="store_true", help="Reset the schema first")
+
+    args = parser.parse_args()
+    engine = sync_engine(args.database_url)
+    started = time.perf_counter()
+    try:
+        if args.command == "reset":
+            reset_schema(engine)
+            bulk_load(engine, default_rows(args.admin_email, args.admin_password))
+        elif args.command == "seed":
+            from benchmarks.datagen import PASSWORD, SCALES, Dataset
+
+            from .trending import backfill
+
+            reset_schema(engine)
+            bulk_load(engine, Dataset(SCALES[args.scale], args.seed, hash_password(PASSWORD)).tables())
+            with engine.begin() as conn:
+                backfill(conn)
+        elif args.command == "load":
+            if args.reset:
+                reset_schema(engine)
+            load_fixture(engine, args.fixture)
+    finally:
+        engine.dispose()
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Versioned schema migrations.
+
+The schema_version table holds one row with the version the database is at.
+Startup compares it with the newest migration below and does nothing else
+when they match, so a warm boot costs one query instead of reflecting every
+table. Migrations run in order inside one transaction; the version row is
+locked first so that workers starting together run them only once.
+
+To change the schema, update models.py and append a migration:
+
+    @migration(2, "Add artworks.view_count")
+    def _add_view_count(conn):
+        add_column(conn, models.Artwork.__table__.c.view_count)
+"""
+import logging
+import time
+from typing import Callable, List, Tuple
+
+from sqlalchemy import inspect, text
+
+from . import models
+from .database import Base
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS: List[Tuple[int, str, Callable]] = []
+
+
+def migration(version: int, description: str):
+    def register(func):
+        if MIGRATIONS and version <= MIGRATIONS[-1][0]:
+            raise ValueError(f"Migration {version} is out of order")
+        MIGRATIONS.append((version, description, func))
+        return func
+    return register
+
+
+def latest_version() -> int:
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def add_column(conn, column):
+    """ALTER TABLE ADD COLUMN for a column defined on a model
+
+    A new database already has it: the baseline creates tables from the models.
+    """
+    if column.name in {existing["name"] for existing in inspect(conn).get_columns(column.table.name)}:
+        return
+    column_type = column.type.compile(dialect=conn.dialect)
+    conn.exec_driver_sql(f"ALTER TABLE {column.table.name} ADD COLUMN {column.name} {column_type}")
+
+
+def create_table(conn, model):
+    model.__table__.create(conn, checkfirst=True)
+
+
+def create_index(conn, index):
+    index.create(conn, checkfirst=True)
+
+
+@migration(1, "Baseline schema and default categories")
+def _baseline(conn):
+    # Databases created before versioning may predate some tables, columns or
+    # indexes; bring them up to the current models
+    Base.metadata.create_all(conn)
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                add_column(conn, column)
+        for index in table.indexes:
+            create_index(conn, index)
+
+    from .routers.artworks import PREDEFINED_CATEGORIES
+    if conn.execute(text("SELECT 1 FROM categories LIMIT 1")).first() is None:
+        conn.execute(models.Category.__table__.insert(), [{"name": name} for name in PREDEFINED_CATEGORIES])
+
+
+@migration(2, "Add invalidation_events for cross-worker cache invalidation")
+def _invalidation_events(conn):
+    create_table(conn, models.InvalidationEvent)
+
+
+@migration(3, "Add artwork_similarities and recommendation_state")
+def _recommendations(conn):
+    create_table(conn, models.ArtworkSimilarity)
+    create_table(conn, models.RecommendationState)
+
+
+@migration(4, "Add artwork_trending")
+def _trending(conn):
+    create_table(conn, models.ArtworkTrending)
+    from .trending import backfill
+    backfill(conn)
+
+
+@migration(5, "Add artworks.image_hash")
+def _image_hash(conn):
+    add_column(conn, models.Artwork.__table__.c.image_hash)
+
+
+@migration(6, "Add artworks.image_width, image_height and blurhash")
+def _image_placeholders(conn):
+    table = models.Artwork.__table__
+    for column in (table.c.image_width, table.c.image_height, table.c.blurhash):
+        add_column(conn, column)
+
+
+@migration(7, "Add jobs")
+def _jobs(conn):
+    create_table(conn, models.Job)
+
+
+def _current_version(conn) -> int:
+    row = conn.execute(text("SELECT version FROM schema_version")).first()
+    return row[0] if row else 0
+
+
+def migrate(conn) -> int:
+    """Bring the database up to latest_version(); returns the number of migrations applied"""
+    conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+    if _current_version(conn) >= latest_version():
+        return 0
+
+    # Take the write lock before re-reading, so concurrent workers queue here
+    if conn.execute(text("UPDATE schema_version SET version = version")).rowcount == 0:
+        conn.execute(text("INSERT INTO schema_version (version) VALUES (0)"))
+    version = _current_version(conn)
+
+    applied = 0
+    for number, description, func in MIGRATIONS:
+        if number <= version:
+            continue
+        started = time.perf_counter()
+        func(conn)
+        conn.execute(text("UPDATE schema_version SET version = :version"), {"version": number})
+        applied += 1
+        logger.info("Applied migration", extra={
+            "version": number, "description": description, "duration": time.perf_counter() - started
+        })
+    return applied
+
+
+def stamp(conn, version: int = None):
+    """Record the schema as current without running migrations, for freshly created tables"""
+    conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+    conn.execute(text("DELETE FROM schema_version"))
+    conn.execute(
+        text("INSERT INTO schema_version (version) VALUES (:version)"),
+        {"version": latest_version() if version is None else version}
+    )
+
+
+async def run_migrations(engine) -> int:
+    async with engine.begin() as conn:
+        return await conn.run_sync(migrate)
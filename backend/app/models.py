@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime, Text, Table, JSON
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime, Text, Table, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from datetime import datetime
@@ -68,7 +68,13 @@ class Artwork(Base):
     status = Column(String, default="active")
     is_featured = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     artist_id = Column(Integer, ForeignKey("users.id"))
+    # Computed from the upload (app/images.py)
+    image_hash = Column(String(16), nullable=True)
+    image_width = Column(Integer, nullable=True)
+    image_height = Column(Integer, nullable=True)
+    blurhash = Column(String(64), nullable=True)
 
     # Relationships
     artist = relationship("User", back_populates="artworks")
@@ -80,6 +86,10 @@ class Artwork(Base):
     # Add to Artwork model
     moderation_reason = Column(String, nullable=True)
 
+    __table_args__ = (
+        Index("ix_artworks_latitude_longitude", "latitude", "longitude"),
+    )
+
 class Category(Base):
     __tablename__ = "categories"
 
@@ -157,3 +167,115 @@ class UnlockedArtwork(Base):
     # Relationships
     user = relationship("User", backref="unlocked_artworks")
     artwork = relationship("Artwork", backref="unlocked_by")
+
+class Backup(Base):
+    __tablename__ = "backups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    filename = Column(String)
+    type = Column(String, default="full")
+    status = Column(String, default="running")  # "running", "completed", "failed"
+    size = Column(Integer, default=0)  # Compressed size in bytes
+    duration = Column(Float, nullable=True)  # Seconds
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    completed_at = Column(DateTime, nullable=True)
+    restored_at = Column(DateTime, nullable=True)
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    # Durable background work, see app/jobs.py. Times are Unix seconds
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    payload = Column(Text)  # JSON keyword arguments for the handler
+    priority = Column(Integer, default=0)  # Lower runs first
+    status = Column(String, default="queued")  # "queued", "running", "done", "failed"
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer)
+    timeout = Column(Float)  # Visibility timeout: how long a claim holds the job
+    run_at = Column(Float)  # Runnable from; pushed back between retries
+    created_at = Column(Float)
+    started_at = Column(Float, nullable=True)  # Latest claim
+    finished_at = Column(Float, nullable=True)
+    locked_by = Column(String, nullable=True)  # Claiming worker
+    locked_until = Column(Float, nullable=True)
+    last_error = Column(Text, nullable=True)
+
+    __table_args__ = (
+        Index("ix_jobs_status_priority_run_at", "status", "priority", "run_at"),
+        Index("ix_jobs_finished_at", "finished_at"),
+    )
+
+class ActivityEvent(Base):
+    __tablename__ = "activity_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    recipient_id = Column(Integer, ForeignKey("users.id"))
+    actor_id = Column(Integer, ForeignKey("users.id"))
+    actor_name = Column(String)  # Denormalized so the feed is a single range read
+    verb = Column(String)  # "like", "comment", "discovery", "unlock"
+    artwork_id = Column(Integer, ForeignKey("artworks.id"))
+    artwork_title = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_activity_events_recipient_id_id", "recipient_id", "id"),
+    )
+
+class ActivityRead(Base):
+    __tablename__ = "activity_reads"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    last_read_id = Column(Integer, default=0)
+
+class SyncTombstone(Base):
+    __tablename__ = "sync_tombstones"
+
+    id = Column(Integer, primary_key=True, index=True)
+    entity_type = Column(String)  # "artwork", "like", "unlock"
+    artwork_id = Column(Integer)
+    user_id = Column(Integer, nullable=True)  # Set for per-user likes and unlocks
+    deleted_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class InvalidationEvent(Base):
+    __tablename__ = "invalidation_events"
+
+    id = Column(Integer, primary_key=True)
+    channel = Column(String)  # "cache:<name>" or "live"
+    payload = Column(Text)  # JSON
+    origin = Column(String)  # Publishing worker, which skips its own events
+    created_at = Column(Float)  # Unix time, for propagation latency
+
+    # Ids must never be reused after old rows are pruned, or workers would skip events
+    __table_args__ = {"sqlite_autoincrement": True}
+
+class ArtworkSimilarity(Base):
+    __tablename__ = "artwork_similarities"
+
+    # Top RECOMMENDATIONS_TOP_K neighbours per artwork, from app/recommendations.py
+    artwork_id = Column(Integer, ForeignKey("artworks.id"), primary_key=True)
+    similar_id = Column(Integer, ForeignKey("artworks.id"), primary_key=True)
+    score = Column(Float)
+
+class RecommendationState(Base):
+    __tablename__ = "recommendation_state"
+
+    id = Column(Integer, primary_key=True)  # Single row
+    like_watermark = Column(Integer, default=0)  # Highest likes.id included
+    unlock_watermark = Column(Integer, default=0)  # Highest unlocked_artworks.id included
+    refreshed_at = Column(DateTime, nullable=True)
+    rebuilt_at = Column(DateTime, nullable=True)  # Last full rebuild
+    lease_until = Column(Float, default=0)  # Unix time; one worker refreshes at a time
+
+class ArtworkTrending(Base):
+    __tablename__ = "artwork_trending"
+
+    artwork_id = Column(Integer, ForeignKey("artworks.id"), primary_key=True)
+    region = Column(String)  # Grid cell, see app/trending.py
+    # log of the forward-decayed engagement score, so it never overflows
+    log_score = Column(Float)
+
+    __table_args__ = (
+        Index("ix_artwork_trending_region_log_score", "region", "log_score"),
+    )
@@ -0,0 +1,176 @@
+"""Nearby search: k nearest artworks with progressive radius expansion.
+
+A page is found in two steps. First, lightweight candidate rows (id,
+distance, trending score, unlocked) are read inside a bounding box around
+the point, which the latitude/longitude index answers. If the radius yields
+fewer than `limit` results, it grows by NEARBY_EXPANSION_FACTOR up to
+NEARBY_MAX_RADIUS_KM. Second, only the artworks on the page are loaded in
+full.
+
+Two orders are supported:
+
+    distance   (distance, id) ascending; the database returns the page
+    blended    proximity, popularity and unlocked state weighted by
+               NEARBY_RANK_WEIGHTS; heapq picks the page from at most
+               NEARBY_MAX_CANDIDATES nearest candidates without sorting them
+
+Pages are chained with an opaque cursor holding the last (key, id), the
+radius the search reached and the time blended scores were computed at, so
+later pages search the same area and score it the same way. A distance
+listing keeps widening on later pages, since a wider ring only adds artworks
+further away than any already shown. A blended listing does not: the ring
+could hold artworks ranked above the cursor, so it ends when its area does.
+"""
+import heapq
+import math
+import time
+from typing import List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import and_, exists, false, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .config import settings
+from .geo import bounding_box
+from .trending import current_score
+
+DISTANCE = "distance"
+BLENDED = "blended"
+
+
+class Cursor(NamedTuple):
+    key: float  # Distance, or the negated blended score
+    id: int
+    radius: float
+    scored_at: float  # Unix time blended scores are decayed to
+
+    def encode(self) -> str:
+        return f"{self.key!r}:{self.id}:{self.radius!r}:{self.scored_at!r}"
+
+    @classmethod
+    def decode(cls, value: str) -> "Cursor":
+        """Raises ValueError for a malformed cursor"""
+        key, artwork_id, radius, scored_at = value.split(":")
+        cursor = cls(float(key), int(artwork_id), float(radius), float(scored_at))
+        # Cursors come from clients; an infinite radius would scan everything
+        if not (math.isfinite(cursor.key) and math.isfinite(cursor.radius) and cursor.radius > 0
+                and math.isfinite(cursor.scored_at)):
+            raise ValueError("Cursor fields must be finite")
+        return cursor
+
+
+class Candidate(NamedTuple):
+    id: int
+    distance: float
+    log_score: Optional[float]
+    is_unlocked: bool
+
+
+def blended_score(candidate: Candidate, now: float) -> float:
+    weights = settings.NEARBY_RANK_WEIGHTS
+    proximity = math.exp(-candidate.distance / settings.NEARBY_DISTANCE_SCALE_KM)
+    popularity = math.log1p(current_score(candidate.log_score, now)) if candidate.log_score is not None else 0.0
+    return (weights["distance"] * proximity
+            + weights["popularity"] * popularity
+            + weights["unlocked"] * candidate.is_unlocked)
+
+
+def _distance(latitude: float, longitude: float):
+    return func.haversine_km(latitude, longitude, models.Artwork.latitude, models.Artwork.longitude)
+
+
+def _in_radius(query, latitude: float, longitude: float, radius: float):
+    """Active artworks within radius km; the bounding box lets the index do the work"""
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius)
+    query = query.where(
+        models.Artwork.status == "active",
+        models.Artwork.latitude.between(min_lat, max_lat),
+        _distance(latitude, longitude) <= radius
+    )
+    if min_lon is not None:
+        query = query.where(models.Artwork.longitude.between(min_lon, max_lon))
+    return query
+
+
+def _candidate_query(latitude: float, longitude: float, radius: float, user_id: Optional[int]):
+    distance = _distance(latitude, longitude)
+    if user_id is not None:
+        is_unlocked = exists().where(
+            models.UnlockedArtwork.user_id == user_id,
+            models.UnlockedArtwork.artwork_id == models.Artwork.id
+        )
+    else:
+        is_unlocked = false()
+    query = (
+        select(
+            models.Artwork.id,
+            distance.label("distance"),
+            models.ArtworkTrending.log_score,
+            is_unlocked.label("is_unlocked")
+        )
+        .outerjoin(models.ArtworkTrending, models.ArtworkTrending.artwork_id == models.Artwork.id)
+    )
+    return _in_radius(query, latitude, longitude, radius), distance
+
+
+async def nearest(db: AsyncSession, latitude: float, longitude: float, radius: float,
+                  limit: int) -> List[Tuple[int, float, float]]:
+    """(id, latitude, longitude) of up to limit active artworks within radius, nearest first"""
+    query = select(models.Artwork.id, models.Artwork.latitude, models.Artwork.longitude)
+    query = _in_radius(query, latitude, longitude, radius)
+    result = await db.execute(query.order_by(_distance(latitude, longitude), models.Artwork.id).limit(limit))
+    return [tuple(row) for row in result.all()]
+
+
+async def _distance_page(db, latitude, longitude, radius, user_id, after: Optional[Cursor], limit, now):
+    query, distance = _candidate_query(latitude, longitude, radius, user_id)
+    if after is not None:
+        query = query.where(or_(
+            distance > after.key,
+            and_(distance == after.key, models.Artwork.id > after.id)
+        ))
+    result = await db.execute(query.order_by(distance, models.Artwork.id).limit(limit + 1))
+    return [(row.distance, Candidate(*row)) for row in result.all()]
+
+
+async def _blended_page(db, latitude, longitude, radius, user_id, after: Optional[Cursor], limit, now):
+    query, distance = _candidate_query(latitude, longitude, radius, user_id)
+    result = await db.execute(query.order_by(distance).limit(settings.NEARBY_MAX_CANDIDATES))
+    keyed = (
+        (-blended_score(candidate, now), candidate)
+        for candidate in (Candidate(*row) for row in result.all())
+    )
+    if after is not None:
+        keyed = ((key, candidate) for key, candidate in keyed if (key, candidate.id) > (after.key, after.id))
+    return heapq.nsmallest(limit + 1, keyed, key=lambda item: (item[0], item[1].id))
+
+
+async def search(
+    db: AsyncSession,
+    latitude: float,
+    longitude: float,
+    radius: float,
+    limit: int,
+    order: str = DISTANCE,
+    user_id: Optional[int] = None,
+    cursor: Optional[Cursor] = None
+) -> Tuple[List[Tuple[float, Candidate]], Optional[Cursor], float]:
+    """Return ((key, candidate) page, next cursor, radius searched)"""
+    page_query = _blended_page if order == BLENDED else _distance_page
+    max_radius = settings.NEARBY_MAX_RADIUS_KM
+    radius = min(cursor.radius if cursor is not None else radius, max_radius)
+    now = cursor.scored_at if cursor is not None else time.time()
+    # Later blended pages stay in the area the first page ranked
+    expand = order != BLENDED or cursor is None
+    while True:
+        page = await page_query(db, latitude, longitude, radius, user_id, cursor, limit, now)
+        if len(page) > limit or radius >= max_radius or not expand:
+            break
+        radius = min(radius * settings.NEARBY_EXPANSION_FACTOR, max_radius)
+
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        key, last = page[-1]
+        next_cursor = Cursor(key, last.id, radius, now)
+    return page, next_cursor, radius
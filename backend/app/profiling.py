@@ -0,0 +1,239 @@
+"""On-demand request profiling.
+
+A request is profiled when it carries the X-Profile header together with an
+admin token (one issued by /admin/login, which carries the role claim), or
+when it is picked by PROFILE_SAMPLE_RATE. While it runs, a sampler thread
+walks sys._current_frames() every PROFILE_INTERVAL seconds and counts
+collapsed stacks, the format flamegraph.pl and speedscope read. Sending
+"X-Profile: memory" also diffs tracemalloc snapshots taken around the request.
+
+Because handlers share the event loop, samples from the loop thread include
+whatever else it ran meanwhile; profile under light traffic for clean results.
+
+Profiles are written to PROFILE_DIR, which keeps only the newest
+PROFILE_MAX_FILES. The middleware is not installed unless PROFILING_ENABLED
+is set, so there is no cost when it is off.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import List, Optional
+
+from jose import JWTError, jwt
+
+from .auth.auth import ALGORITHM, SECRET_KEY
+from .config import settings
+from .metrics import route_template
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+# Memory profiles in progress; tracemalloc is stopped when the last one ends
+_tracing = 0
+_PROFILE_ID = re.compile(r"^[0-9A-Za-z_-]+$")
+
+
+class StackSampler:
+    """Counts collapsed stacks of every other thread until stopped"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                if thread_id not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                frames.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(frames))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _header(scope, name: bytes) -> Optional[bytes]:
+    for key, value in scope.get("headers", ()):
+        if key == name:
+            return value
+    return None
+
+
+def is_admin_request(scope) -> bool:
+    """True when the bearer token is valid and carries the admin role claim"""
+    authorization = _header(scope, b"authorization")
+    if not authorization or not authorization.lower().startswith(b"bearer "):
+        return False
+    try:
+        payload = jwt.decode(authorization[7:].decode(), SECRET_KEY, algorithms=[ALGORITHM])
+    except (JWTError, UnicodeDecodeError):
+        return False
+    return payload.get("role") == "admin"
+
+
+def profile_mode(scope) -> Optional[str]:
+    """"cpu", "memory" or None for requests that should not be profiled"""
+    requested = _header(scope, PROFILE_HEADER)
+    if requested and is_admin_request(scope):
+        return "memory" if requested.strip().lower() == b"memory" else "cpu"
+    if settings.PROFILE_SAMPLE_RATE and random.random() < settings.PROFILE_SAMPLE_RATE:
+        return "memory" if settings.PROFILE_TRACEMALLOC else "cpu"
+    return None
+
+
+def profile_dir() -> str:
+    return os.path.join(os.getcwd(), settings.PROFILE_DIR)
+
+
+def profile_path(profile_id: str) -> str:
+    if not _PROFILE_ID.match(profile_id):
+        raise ValueError("Invalid profile id")
+    return os.path.join(profile_dir(), f"{profile_id}.json")
+
+
+def save_profile(profile: dict):
+    """Write a profile and drop the oldest ones beyond PROFILE_MAX_FILES"""
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    path = profile_path(profile["id"])
+    with open(path + ".tmp", "w") as f:
+        json.dump(profile, f, default=str)
+    os.replace(path + ".tmp", path)
+
+    files = sorted(name for name in os.listdir(directory) if name.endswith(".json"))
+    for name in files[:max(0, len(files) - settings.PROFILE_MAX_FILES)]:
+        os.remove(os.path.join(directory, name))
+
+
+def list_profiles() -> List[dict]:
+    """Metadata of stored profiles, newest first"""
+    directory = profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                profile = json.load(f)
+        except (OSError, ValueError):
+            continue
+        profiles.append({key: value for key, value in profile.items() if key not in ("stacks", "memory")})
+    return profiles
+
+
+def load_profile(profile_id: str) -> Optional[dict]:
+    try:
+        with open(profile_path(profile_id)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _memory_diff(before, after, limit: int = 25) -> List[dict]:
+    return [
+        {
+            "location": str(stat.traceback),
+            "size_diff": stat.size_diff,
+            "count_diff": stat.count_diff
+        }
+        for stat in after.compare_to(before, "lineno")[:limit]
+    ]
+
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global _tracing
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        mode = profile_mode(scope)
+        if mode is None:
+            return await self.app(scope, receive, send)
+
+        status_code = 500
+        # Named by start time so the directory listing is chronological
+        profile_id = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}"
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", profile_id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        before = None
+        if mode == "memory":
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            _tracing += 1
+            before = tracemalloc.take_snapshot()
+
+        sampler = StackSampler(settings.PROFILE_INTERVAL)
+        sampler.start()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            sampler.stop()
+            memory = None
+            if before is not None:
+                memory = _memory_diff(before, tracemalloc.take_snapshot())
+                _tracing -= 1
+                if not _tracing:
+                    tracemalloc.stop()
+
+            profile = {
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": route_template(scope),
+                "status": status_code,
+                "mode": mode,
+                "duration": elapsed,
+                "samples": sampler.samples,
+                "interval": sampler.interval,
+                "created_at": datetime.utcnow(),
+                "stacks": sampler.collapsed(),
+                "memory": memory
+            }
+            try:
+                await asyncio.to_thread(save_profile, profile)
+            except OSError:
+                logger.exception("Error saving profile")
@@ -0,0 +1,495 @@
+"""Query-count budgets to catch N+1 regressions.
+
+Every route declares how many SQL statements one request may execute. With
+QUERY_BUDGET_MODE set to "warn" the middleware logs offenders and adds an
+X-Query-Count header; with "raise" it replaces the response of an offending
+request with a 500 so debug sessions fail loudly.
+
+Running the module checks every route against an in-memory SQLite database
+seeded with a handful of rows:
+
+    python -m app.query_budget
+
+Budgets carry no headroom on purpose. Each is the most the route has been
+measured to need, which can exceed what its check uses where a cache or an
+earlier check saves a query. Any extra statement fails the check, and a change
+that needs one raises the budget alongside it. Routes the check cannot call
+are listed in UNCHECKED.
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+from contextlib import asynccontextmanager
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from .config import settings
+from .metrics import RequestStats, current_request, route_template
+
+logger = logging.getLogger(__name__)
+
+# (method, route template) -> maximum statements per request, including the
+# current-user lookup done by authenticated routes
+QUERY_BUDGETS = {
+    # users
+    ("POST", "/users/"): 3,
+    ("GET", "/users/"): 2,
+    ("GET", "/users/me"): 1,
+    ("GET", "/users/me/recommendations"): 4,
+    ("GET", "/users/{user_id}"): 1,
+    ("PUT", "/users/{user_id}"): 4,
+    ("DELETE", "/users/{user_id}"): 9,
+    ("PUT", "/users/me/role/artist"): 4,
+    # auth
+    ("POST", "/auth/token"): 1,
+    # artworks
+    ("GET", "/artworks/categories"): 1,
+    ("GET", "/artworks/"): 3,
+    ("POST", "/artworks/"): 5,
+    ("PUT", "/artworks/{artwork_id}"): 5,
+    ("DELETE", "/artworks/{artwork_id}"): 10,
+    ("GET", "/artworks/{artwork_id}"): 3,
+    ("GET", "/artworks/{artwork_id}/similar"): 2,
+    ("POST", "/artworks/{artwork_id}/categories"): 4,
+    ("GET", "/artworks/featured"): 2,
+    ("GET", "/artworks/trending"): 2,
+    ("GET", "/artworks/nearby"): 6,
+    ("GET", "/artworks/walk"): 3,
+    ("POST", "/artworks/unlock"): 8,
+    ("POST", "/artworks/unlock/sweep"): 6,
+    ("GET", "/artworks/user/unlocked"): 2,
+    # social
+    ("POST", "/artworks/{artwork_id}/like"): 7,
+    ("DELETE", "/artworks/{artwork_id}/like"): 4,
+    ("POST", "/artworks/{artwork_id}/comments"): 7,
+    ("GET", "/artworks/{artwork_id}/comments"): 1,
+    ("GET", "/likes"): 3,
+    ("GET", "/artworks/{artwork_id}/likes/count"): 1,
+    # discoveries
+    ("POST", "/discoveries/{artwork_id}"): 8,
+    ("GET", "/discoveries/my"): 3,
+    # categories
+    ("POST", "/categories/"): 2,
+    ("GET", "/categories/"): 1,
+    ("GET", "/categories/{category_id}/artworks"): 3,
+    # profiles
+    ("GET", "/profiles/me"): 1,
+    ("PUT", "/profiles/me"): 2,
+    ("GET", "/profiles/{username}"): 1,
+    ("GET", "/profiles/{user_id}/artworks"): 3,
+    # admin
+    ("GET", "/admin/users"): 2,
+    ("PUT", "/admin/users/{user_id}/ban"): 5,
+    ("PUT", "/admin/users/{user_id}/unban"): 5,
+    ("DELETE", "/admin/users/{user_id}"): 9,
+    ("PUT", "/admin/artworks/{artwork_id}/feature"): 3,
+    ("PUT", "/admin/artworks/{artwork_id}/moderate"): 5,
+    ("PUT", "/admin/comments/{comment_id}/moderate"): 3,
+    ("GET", "/admin/stats"): 7,
+    ("GET", "/admin/stats/detailed"): 2,
+    ("GET", "/admin/moderation-logs"): 2,
+    ("GET", "/admin/moderation-logs/search"): 2,
+    ("POST", "/admin/login"): 1,
+    ("GET", "/admin/artworks"): 2,
+    ("GET", "/admin/artworks/{artwork_id}/duplicates"): 3,
+    ("GET", "/admin/categories"): 2,
+    ("POST", "/admin/categories"): 3,
+    ("GET", "/admin/categories/{category_id}"): 2,
+    ("PUT", "/admin/categories/{category_id}"): 4,
+    ("DELETE", "/admin/categories/{category_id}"): 5,
+    ("DELETE", "/admin/artworks/{artwork_id}"): 12,
+    ("GET", "/admin/backups"): 2,
+    ("GET", "/admin/jobs"): 2,
+    ("POST", "/admin/jobs/{job_id}/retry"): 3,
+    ("POST", "/admin/backups"): 3,
+    ("GET", "/admin/backups/{backup_id}/download"): 2,
+    ("POST", "/admin/backups/{backup_id}/restore"): 6,
+    ("DELETE", "/admin/backups/{backup_id}"): 4,
+    ("GET", "/admin/slow-queries"): 1,
+    ("DELETE", "/admin/slow-queries"): 1,
+    ("GET", "/admin/profiles"): 1,
+    ("GET", "/admin/profiles/{profile_id}/download"): 1,
+    # activity
+    ("GET", "/activity/"): 4,
+    ("GET", "/activity/unread-count"): 3,
+    ("POST", "/activity/read"): 4,
+    # sync
+    ("GET", "/sync"): 8,
+    # misc
+    ("GET", "/artworks/{artwork_id}/events"): 0,
+    ("GET", "/metrics"): 0,
+    ("GET", "/health/live"): 0,
+    ("GET", "/health/ready"): 0,
+    ("GET", "/"): 0,
+    ("GET", "/test-db"): 1,
+}
+
+
+# Budgeted routes the check does not call, and why
+UNCHECKED = {
+    ("GET", "/artworks/{artwork_id}/events"): "event stream never ends",
+    ("POST", "/admin/backups"): "background backup runs against the configured database",
+    ("POST", "/admin/backups/{backup_id}/restore"): "would replace the configured database",
+}
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def budget_for(method: str, route: str):
+    return QUERY_BUDGETS.get((method, route))
+
+
+class QueryBudgetMiddleware:
+    """Counts statements per request and enforces QUERY_BUDGETS"""
+
+    def __init__(self, app, mode: str = None):
+        self.app = app
+        self.mode = mode or settings.QUERY_BUDGET_MODE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.mode == "off":
+            return await self.app(scope, receive, send)
+
+        stats = current_request.get()
+        token = None
+        if stats is None:
+            stats = RequestStats(scope)
+            token = current_request.set(stats)
+
+        held = []
+        streaming = False
+
+        def over_budget():
+            budget = budget_for(scope["method"], route_template(scope))
+            return budget is not None and stats.queries > budget, budget
+
+        async def send_wrapper(message):
+            nonlocal streaming
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                streaming = (b"content-type", b"text/event-stream") in headers or any(
+                    name == b"content-type" and value.startswith(b"text/event-stream")
+                    for name, value in headers
+                )
+                headers.append((b"x-query-count", str(stats.queries).encode()))
+                message = {**message, "headers": headers}
+            if self.mode == "raise" and not streaming:
+                # Hold the response until we know whether the budget held
+                held.append(message)
+                return
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if token is not None:
+                current_request.reset(token)
+
+        exceeded, budget = over_budget()
+        if exceeded:
+            logger.warning("Query budget exceeded", extra={
+                "method": scope["method"],
+                "route": route_template(scope),
+                "queries": stats.queries,
+                "budget": budget
+            })
+        if not held:
+            return
+        if exceeded:
+            body = json.dumps({
+                "detail": "Query budget exceeded",
+                "route": route_template(scope),
+                "queries": stats.queries,
+                "budget": budget
+            }).encode()
+            held = [
+                {
+                    "type": "http.response.start",
+                    "status": 500,
+                    "headers": [
+                        (b"content-type", b"application/json"),
+                        (b"content-length", str(len(body)).encode()),
+                        (b"x-query-count", str(stats.queries).encode()),
+                    ],
+                },
+                {"type": "http.response.body", "body": body},
+            ]
+        for message in held:
+            await send(message)
+
+
+@asynccontextmanager
+async def memory_database():
+    """Yield a session factory bound to a fresh in-memory SQLite database"""
+    from .database import Base, configure_engine
+    from . import models  # noqa: F401 - register tables on Base
+
+    memory_engine = configure_engine(create_async_engine(
+        "sqlite+aiosqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    ))
+    async with memory_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    try:
+        yield sessionmaker(memory_engine, class_=AsyncSession, expire_on_commit=False)
+    finally:
+        await memory_engine.dispose()
+
+
+def use_database(app, session_factory):
+    """Point the app's session dependencies at session_factory"""
+    from .database import get_read_db, get_write_db
+
+    async def override_get_db():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_write_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+
+
+async def seed(session_factory) -> dict:
+    """Insert a small, connected dataset and return the ids the checks need"""
+    from . import models
+    from .auth.auth import get_password_hash
+
+    password = get_password_hash("password")
+    async with session_factory() as db:
+        admin = models.User(email="admin@example.com", username="admin", password=password, role="admin")
+        artist = models.User(email="artist@example.com", username="artist", password=password, role="artist")
+        fan = models.User(email="fan@example.com", username="fan", password=password)
+        spare = models.User(email="spare@example.com", username="spare", password=password)
+        leaving = models.User(email="leaving@example.com", username="leaving", password=password)
+        mural = models.Category(name="Mural", description="Walls")
+        spare_category = models.Category(name="Spare", description="Deleted by the checks")
+        db.add_all([admin, artist, fan, spare, leaving, mural, spare_category])
+        await db.flush()
+
+        artworks = [
+            models.Artwork(
+                title=f"Artwork {i}", description="Seeded", latitude=10.0 + i * 0.0003,
+                longitude=20.0, artist_id=artist.id, status="active", is_featured=i == 0,
+                categories=[mural]
+            )
+            for i in range(4)
+        ]
+        db.add_all(artworks)
+        await db.flush()
+
+        comment = models.Comment(text="Nice", user_id=fan.id, artwork_id=artworks[0].id)
+        failed_job = models.Job(kind="optimize_image", payload="{}", priority=0, status="failed", attempts=5,
+                                max_attempts=5, timeout=60, run_at=0, created_at=0, finished_at=0)
+        backup = models.Backup(filename="check.gz", status="completed")
+        db.add_all([
+            failed_job,
+            backup,
+            comment,
+            models.Like(user_id=fan.id, artwork_id=artworks[0].id),
+            models.Like(user_id=fan.id, artwork_id=artworks[1].id),
+            models.UnlockedArtwork(user_id=fan.id, artwork_id=artworks[0].id),
+            models.Discovery(user_id=fan.id, artwork_id=artworks[0].id),
+            models.ModerationLog(admin_id=admin.id, action="hide_artwork", target_type="artwork",
+                                 target_id=artworks[0].id, reason="Seeded"),
+            models.ActivityEvent(recipient_id=artist.id, actor_id=fan.id, actor_name="fan", verb="like",
+                                 artwork_id=artworks[0].id, artwork_title=artworks[0].title),
+        ])
+        await db.commit()
+        return {
+            "admin": admin, "artist": artist, "fan": fan, "spare": spare, "leaving": leaving,
+            "category": mural.id, "spare_category": spare_category.id,
+            "artworks": [artwork.id for artwork in artworks], "comment": comment.id,
+            "job": failed_job.id, "backup": backup.id,
+        }
+
+
+def _checks(ids: dict):
+    """(method, route template, concrete path, request kwargs, auth user[, expectation])
+
+    An expectation is a predicate on the response, for behaviour a status code
+    alone would not show.
+    """
+    from . import sync
+
+    a0, a1, a2, a3 = ids["artworks"]
+    # Cut before the like and unlike below, so the delta sync must report the unlike
+    since = sync.encode_token(sync.next_cut())
+    image = {"image": ("check.png", _tiny_png(), "image/png")}
+    return [
+        ("GET", "/", "/", {}, None),
+        ("GET", "/metrics", "/metrics", {}, None),
+        ("GET", "/health/live", "/health/live", {}, None),
+        # Startup does not run here, so readiness answers 503 "starting"
+        ("GET", "/health/ready", "/health/ready", {}, None, lambda response: response.status_code == 503),
+        ("GET", "/test-db", "/test-db", {}, None),
+        ("POST", "/users/", "/users/", {"json": {"email": "new@example.com", "username": "new", "password": "pw"}}, None),
+        ("GET", "/users/", "/users/", {}, "fan"),
+        ("GET", "/users/me", "/users/me", {}, "fan"),
+        ("GET", "/users/me/recommendations", "/users/me/recommendations", {}, "fan"),
+        ("GET", "/users/{user_id}", f"/users/{ids['fan'].id}", {}, None),
+        ("PUT", "/users/{user_id}", f"/users/{ids['fan'].id}",
+         {"json": {"email": "fan@example.com", "username": "fan", "bio": "Hi"}}, "fan"),
+        ("POST", "/auth/token", "/auth/token", {"data": {"username": "fan@example.com", "password": "password"}}, None),
+        ("GET", "/artworks/categories", "/artworks/categories", {}, None),
+        ("GET", "/artworks/", "/artworks/", {}, "fan"),
+        ("POST", "/artworks/", "/artworks/",
+         {"data": {"title": "New", "description": "d", "latitude": 1, "longitude": 1, "category_id": "Mural"},
+          "files": image}, "artist"),
+        ("GET", "/artworks/{artwork_id}", f"/artworks/{a0}", {}, "fan"),
+        ("GET", "/artworks/{artwork_id}/similar", f"/artworks/{a0}/similar", {}, None),
+        ("PUT", "/artworks/{artwork_id}", f"/artworks/{a1}?title=Renamed", {}, "artist"),
+        ("POST", "/artworks/{artwork_id}/categories", f"/artworks/{a1}/categories",
+         {"json": [ids["category"], ids["spare_category"]]}, "artist"),
+        ("GET", "/artworks/featured", "/artworks/featured", {}, None),
+        ("GET", "/artworks/trending", "/artworks/trending", {}, None),
+        ("GET", "/artworks/nearby", "/artworks/nearby?latitude=10&longitude=20", {}, "fan"),
+        ("GET", "/artworks/walk", "/artworks/walk?latitude=10&longitude=20&minutes=60", {}, None),
+        ("POST", "/artworks/unlock", "/artworks/unlock", {"json": {"artwork_id": a1}}, "fan"),
+        ("POST", "/artworks/unlock/sweep", "/artworks/unlock/sweep", {"json": {"latitude": 10, "longitude": 20}}, "fan"),
+        ("GET", "/artworks/user/unlocked", "/artworks/user/unlocked", {}, "fan"),
+        ("POST", "/artworks/{artwork_id}/like", f"/artworks/{a2}/like", {}, "fan"),
+        ("DELETE", "/artworks/{artwork_id}/like", f"/artworks/{a2}/like", {}, "fan"),
+        ("POST", "/artworks/{artwork_id}/comments", f"/artworks/{a0}/comments", {"json": {"text": "Hi"}}, "fan"),
+        ("GET", "/artworks/{artwork_id}/comments", f"/artworks/{a0}/comments", {}, None),
+        ("GET", "/likes", "/likes", {}, "fan"),
+        ("GET", "/artworks/{artwork_id}/likes/count", f"/artworks/{a0}/likes/count", {}, None),
+        ("POST", "/discoveries/{artwork_id}", f"/discoveries/{a1}", {}, "fan"),
+        ("GET", "/discoveries/my", "/discoveries/my", {}, "fan"),
+        ("POST", "/categories/", "/categories/", {"json": {"name": "Checked"}}, "artist"),
+        ("GET", "/categories/", "/categories/", {}, None),
+        ("GET", "/categories/{category_id}/artworks", f"/categories/{ids['category']}/artworks", {}, "fan"),
+        ("GET", "/profiles/me", "/profiles/me", {}, "fan"),
+        ("PUT", "/profiles/me", "/profiles/me", {"data": {"bio": "Updated"}}, "fan"),
+        ("GET", "/profiles/{username}", "/profiles/artist", {}, None),
+        ("GET", "/profiles/{user_id}/artworks", f"/profiles/{ids['artist'].id}/artworks", {}, "fan"),
+        ("GET", "/activity/", "/activity/", {}, "artist"),
+        ("GET", "/activity/unread-count", "/activity/unread-count", {}, "artist"),
+        ("POST", "/activity/read", "/activity/read", {}, "artist"),
+        ("GET", "/sync", f"/sync?since={since}", {}, "fan",
+         lambda response: a2 in response.json()["likes"]["removed"]),
+        ("GET", "/admin/users", "/admin/users", {}, "admin"),
+        ("PUT", "/admin/users/{user_id}/ban", f"/admin/users/{ids['spare'].id}/ban", {"json": {"reason": "x"}}, "admin"),
+        ("PUT", "/admin/users/{user_id}/unban", f"/admin/users/{ids['spare'].id}/unban", {}, "admin"),
+        ("PUT", "/admin/artworks/{artwork_id}/feature", f"/admin/artworks/{a1}/feature?featured=true", {}, "admin"),
+        ("PUT", "/admin/artworks/{artwork_id}/moderate", f"/admin/artworks/{a1}/moderate?action=hide&reason=x", {}, "admin"),
+        ("PUT", "/admin/comments/{comment_id}/moderate",
+         f"/admin/comments/{ids['comment']}/moderate?action=hide&reason=x", {}, "admin"),
+        ("GET", "/admin/stats", "/admin/stats", {}, "admin"),
+        ("GET", "/admin/stats/detailed", "/admin/stats/detailed", {}, "admin"),
+        ("GET", "/admin/moderation-logs", "/admin/moderation-logs", {}, "admin"),
+        ("GET", "/admin/moderation-logs/search", "/admin/moderation-logs/search?action=hide_artwork", {}, "admin"),
+        ("POST", "/admin/login", "/admin/login", {"data": {"username": "admin@example.com", "password": "password"}}, None),
+        ("GET", "/admin/artworks", "/admin/artworks", {}, "admin"),
+        ("GET", "/admin/artworks/{artwork_id}/duplicates", f"/admin/artworks/{a1}/duplicates", {}, "admin"),
+        ("GET", "/admin/categories", "/admin/categories", {}, "admin"),
+        ("POST", "/admin/categories", "/admin/categories", {"data": {"name": "Added", "description": "d"}}, "admin"),
+        ("GET", "/admin/categories/{category_id}", f"/admin/categories/{ids['category']}", {}, "admin"),
+        ("PUT", "/admin/categories/{category_id}", f"/admin/categories/{ids['category']}",
+         {"json": {"name": "Mural", "description": "Walls"}}, "admin"),
+        ("DELETE", "/admin/categories/{category_id}", f"/admin/categories/{ids['spare_category']}", {}, "admin"),
+        ("GET", "/admin/backups", "/admin/backups", {}, "admin"),
+        ("GET", "/admin/jobs", "/admin/jobs?status=failed", {}, "admin"),
+        ("POST", "/admin/jobs/{job_id}/retry", f"/admin/jobs/{ids['job']}/retry", {}, "admin"),
+        ("GET", "/admin/slow-queries", "/admin/slow-queries", {}, "admin"),
+        ("DELETE", "/admin/slow-queries", "/admin/slow-queries", {}, "admin"),
+        ("GET", "/admin/profiles", "/admin/profiles", {}, "admin"),
+        ("GET", "/admin/profiles/{profile_id}/download", "/admin/profiles/check/download", {}, "admin"),
+        ("GET", "/admin/backups/{backup_id}/download", f"/admin/backups/{ids['backup']}/download", {}, "admin"),
+        ("DELETE", "/admin/backups/{backup_id}", f"/admin/backups/{ids['backup']}", {}, "admin"),
+        ("DELETE", "/artworks/{artwork_id}", f"/artworks/{a3}", {}, "artist"),
+        ("DELETE", "/admin/artworks/{artwork_id}", f"/admin/artworks/{a2}", {}, "admin"),
+        ("PUT", "/users/me/role/artist", "/users/me/role/artist", {}, "spare"),
+        ("DELETE", "/admin/users/{user_id}", f"/admin/users/{ids['spare'].id}", {}, "admin"),
+        ("DELETE", "/users/{user_id}", f"/users/{ids['leaving'].id}", {}, "leaving"),
+    ]
+
+
+def _tiny_png() -> bytes:
+    import io
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), (120, 60, 30)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def _write_files(directory: str):
+    """The backup and profile the download checks fetch"""
+    import gzip
+    from . import profiling
+
+    with gzip.open(os.path.join(directory, "check.gz"), "wb") as f:
+        f.write(b"check")
+    profiling.save_profile({"id": "check", "stacks": ""})
+
+
+async def check_budgets(app=None) -> list:
+    """Call every checked route once and compare its statement count to its budget"""
+    import httpx
+    from .auth.auth import create_access_token
+
+    if app is None:
+        # Rate limits would turn the later admin checks into 429s
+        settings.ADMISSION_ENABLED = False
+        from .main import app
+
+    results = []
+    files = tempfile.TemporaryDirectory()
+    directories = settings.BACKUP_DIR, settings.PROFILE_DIR
+    settings.BACKUP_DIR = settings.PROFILE_DIR = files.name
+    async with memory_database() as session_factory:
+        use_database(app, session_factory)
+        try:
+            ids = await seed(session_factory)
+            _write_files(files.name)
+            # Several handlers still fail outright; report them rather than abort the run
+            transport = httpx.ASGITransport(app=QueryBudgetMiddleware(app, mode="warn"), raise_app_exceptions=False)
+            async with httpx.AsyncClient(transport=transport, base_url="http://budget") as client:
+                for method, route, path, kwargs, user, *expectation in _checks(ids):
+                    headers = {}
+                    if user:
+                        token = create_access_token({"sub": ids[user].email, "role": ids[user].role})
+                        headers["Authorization"] = f"Bearer {token}"
+                    response = await client.request(method, path, headers=headers, **kwargs)
+                    queries = int(response.headers.get("x-query-count", -1))
+                    budget = budget_for(method, route)
+                    expected = all(check(response) for check in expectation)
+                    results.append({
+                        "method": method, "route": route, "status": response.status_code,
+                        "queries": queries, "budget": budget, "expected": expected,
+                        # A 5xx the check asked for is the answer, not a failure
+                        "error": response.status_code >= 500 and not (expectation and expected),
+                        "ok": budget is not None and queries <= budget and expected
+                    })
+        finally:
+            app.dependency_overrides.clear()
+            settings.BACKUP_DIR, settings.PROFILE_DIR = directories
+            files.cleanup()
+    return results
+
+
+def main() -> int:
+    results = asyncio.run(check_budgets())
+    failed = [r for r in results if not r["ok"]]
+    for r in results:
+        # Handlers that error out are reported but only overruns fail the run
+        flag = "FAIL" if not r["ok"] else "err " if r["error"] else "ok  "
+        note = "" if r["expected"] else " unexpected response"
+        print(f"{flag} {r['method']:6} {r['route']:45} status={r['status']} queries={r['queries']} budget={r['budget']}{note}")
+    unchecked = sorted(set(QUERY_BUDGETS) - {(r["method"], r["route"]) for r in results})
+    for method, route in unchecked:
+        print(f"skip {method:6} {route:45} {UNCHECKED.get((method, route), 'no check')}")
+    errors = sum(1 for r in results if r["error"])
+    print(f"{len(results) - len(failed)}/{len(results)} routes within budget, {errors} returned errors")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
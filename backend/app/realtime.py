@@ -0,0 +1,124 @@
+"""In-process pub/sub for live artwork updates.
+
+Handlers publish small events (new comments, like deltas, moderation hides)
+to a per-artwork topic after their transaction commits. Each SSE/WebSocket
+client holds a bounded queue; when a slow client falls behind, the queue's
+drop policy decides what is lost so publishers never block.
+
+A relay can be attached to fan events out to other worker processes; events
+arriving from the relay are delivered locally only. app/invalidation.py
+attaches one that goes through the invalidation bus.
+"""
+import asyncio
+from typing import Any, Callable, Dict, Optional, Set
+
+from .config import settings
+from .metrics import Gauge, registry
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+DISCONNECT = "disconnect"
+
+
+class Subscription:
+    def __init__(self, broker: "Broker", topic: str, maxsize: int, policy: str):
+        self.broker = broker
+        self.topic = topic
+        self.policy = policy
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self.closed = False
+
+    def offer(self, event: dict):
+        if self.closed:
+            return
+        if self.queue.full():
+            self.dropped += 1
+            dropped_events.inc(self.policy)
+            if self.policy == DROP_NEWEST:
+                return
+            if self.policy == DISCONNECT:
+                self.close()
+                return
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """Wait for the next event; None on timeout or once closed"""
+        if self.closed and self.queue.empty():
+            return None
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.broker._unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Broker:
+    def __init__(self):
+        self._topics: Dict[str, Set[Subscription]] = {}
+        self.relay: Optional[Callable[[str, dict], Any]] = None
+
+    def subscribe(self, topic: str, maxsize: int = None, policy: str = None) -> Subscription:
+        subscription = Subscription(
+            self,
+            topic,
+            maxsize or settings.LIVE_QUEUE_SIZE,
+            policy or settings.LIVE_DROP_POLICY
+        )
+        self._topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription: Subscription):
+        subscribers = self._topics.get(subscription.topic)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._topics[subscription.topic]
+
+    def deliver(self, topic: str, event: dict):
+        """Hand an event to local subscribers only"""
+        for subscription in list(self._topics.get(topic, ())):
+            subscription.offer(event)
+
+    def publish(self, topic: str, event: dict):
+        self.deliver(topic, event)
+        if self.relay is not None:
+            self.relay(topic, event)
+
+    def subscriber_count(self, topic: str = None) -> int:
+        if topic is not None:
+            return len(self._topics.get(topic, ()))
+        return sum(len(subscribers) for subscribers in self._topics.values())
+
+
+broker = Broker()
+
+dropped_events = registry.counter(
+    "live_events_dropped_total", "Live events dropped for slow consumers", ("policy",)
+)
+
+
+@registry.add_collector
+def _broker_metrics():
+    subscribers = Gauge("live_subscribers", "Open SSE/WebSocket subscriptions")
+    subscribers.set(value=broker.subscriber_count())
+    return [subscribers]
+
+
+def artwork_topic(artwork_id: int) -> str:
+    return f"artwork:{artwork_id}"
+
+
+def publish_artwork_event(artwork_id: int, event_type: str, **data):
+    broker.publish(artwork_topic(artwork_id), {"type": event_type, "artwork_id": artwork_id, **data})
@@ -0,0 +1,378 @@
+"""Item-to-item recommendations from co-likes and co-unlocks.
+
+A batch job builds a sparse user x artwork matrix from likes and unlocks
+(an unlock counts for UNLOCK_WEIGHT of a like), scores artwork pairs by
+cosine similarity damped by how many users they share, and stores the top
+RECOMMENDATIONS_TOP_K neighbours of each artwork in artwork_similarities.
+Requests only read that table:
+
+    GET /artworks/{id}/similar          the artwork's neighbours
+    GET /users/me/recommendations       neighbours of what the user liked or
+                                        unlocked, summed, minus what they have
+
+Refreshes are incremental: likes and unlocks newer than the stored
+watermarks, and like/unlock tombstones since the last refresh, mark their
+users dirty, and the artworks those users touch are dirty. A pair's score
+changes only when one side is dirty, so the refresh recomputes the rows of
+dirty artworks, of artworks sharing a user with one, and of artworks whose
+stored neighbours include one; every other row is still exact. A full
+rebuild runs every RECOMMENDATIONS_REBUILD_HOURS regardless. A lease on the
+state row keeps concurrent workers from refreshing at the same time.
+
+    python -m app.recommendations rebuild
+    python -m app.recommendations refresh
+"""
+import argparse
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import delete, func, insert, select, union, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from . import models, schemas
+from .config import settings
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+LIKE_WEIGHT = 1.0
+UNLOCK_WEIGHT = 0.5
+# Pairs backed by few shared users are scaled by shared / (shared + SHRINKAGE)
+SHRINKAGE = 2.0
+# Artworks whose similarity rows are computed per sparse product
+BLOCK_SIZE = 512
+LEASE_SECONDS = 600
+
+refresh_seconds = registry.histogram(
+    "recommendations_refresh_seconds", "Duration of similarity refreshes", ("kind",),
+    buckets=(0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0)
+)
+refreshed_artworks = registry.counter(
+    "recommendations_artworks_refreshed_total", "Artworks whose neighbours were recomputed", ("kind",)
+)
+
+
+# Building
+
+def interactions(conn) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(user ids, artwork ids, weights) for every like and unlock"""
+    users, artworks, weights = [], [], []
+    for model, weight in ((models.Like, LIKE_WEIGHT), (models.UnlockedArtwork, UNLOCK_WEIGHT)):
+        # Older rows may lack either side; they say nothing about similarity
+        rows = conn.execute(
+            select(model.user_id, model.artwork_id)
+            .where(model.user_id.is_not(None), model.artwork_id.is_not(None))
+        ).all()
+        users.extend(row[0] for row in rows)
+        artworks.extend(row[1] for row in rows)
+        weights.extend([weight] * len(rows))
+    return (np.asarray(users, dtype=np.int64), np.asarray(artworks, dtype=np.int64),
+            np.asarray(weights, dtype=np.float32))
+
+
+class SimilarityModel:
+    """Column-normalised interaction matrix for computing neighbours"""
+
+    def __init__(self, users: np.ndarray, artworks: np.ndarray, weights: np.ndarray):
+        user_ids, user_index = np.unique(users, return_inverse=True)
+        self.artwork_ids, artwork_index = np.unique(artworks, return_inverse=True)
+        shape = (len(user_ids), len(self.artwork_ids))
+        # Duplicate (user, artwork) entries, a like and an unlock, are summed
+        matrix = sparse.csr_matrix((weights, (user_index, artwork_index)), shape=shape, dtype=np.float32)
+        matrix.sum_duplicates()
+
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+        norms[norms == 0] = 1
+        self.normalized = (matrix @ sparse.diags(1 / norms)).tocsc()
+        self.normalized_t = self.normalized.T.tocsr()
+        binary = matrix.copy()
+        binary.data[:] = 1
+        self.binary = binary.tocsc()
+        self.binary_t = self.binary.T.tocsr()
+
+    def index_of(self, artwork_ids: Sequence[int]) -> np.ndarray:
+        """Column positions of the given artworks; ones without interactions are skipped"""
+        positions = np.searchsorted(self.artwork_ids, artwork_ids)
+        inside = positions < len(self.artwork_ids)
+        positions = positions[inside]
+        return positions[self.artwork_ids[positions] == artwork_ids[inside]]
+
+    def co_interacted(self, columns: np.ndarray) -> np.ndarray:
+        """Ids of artworks sharing at least one user with any of the columns"""
+        if len(columns) == 0:
+            return self.artwork_ids[:0]
+        shared = (self.binary_t @ self.binary[:, columns]).tocsr()
+        return self.artwork_ids[np.flatnonzero(np.diff(shared.indptr))]
+
+    def neighbours(self, columns: np.ndarray, k: int) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+        """Yield (artwork id, neighbour ids, scores) for each column, best first"""
+        for start in range(0, len(columns), BLOCK_SIZE):
+            block = columns[start:start + BLOCK_SIZE]
+            cosine = self.normalized_t[block] @ self.normalized
+            damping = (self.binary_t[block] @ self.binary).tocsr()
+            damping.data = damping.data / (damping.data + SHRINKAGE)
+            similarity = sparse.csr_matrix(cosine.multiply(damping))
+            for row, column in enumerate(block):
+                lo, hi = similarity.indptr[row], similarity.indptr[row + 1]
+                others = similarity.indices[lo:hi]
+                scores = similarity.data[lo:hi]
+                keep = others != column
+                others, scores = others[keep], scores[keep]
+                if len(scores) > k:
+                    top = np.argpartition(-scores, k)[:k]
+                    others, scores = others[top], scores[top]
+                order = np.argsort(-scores, kind="stable")
+                yield int(self.artwork_ids[column]), self.artwork_ids[others[order]], scores[order]
+
+
+def _write_rows(conn, model: SimilarityModel, columns: np.ndarray, k: int) -> int:
+    rows = []
+    for artwork_id, neighbours, scores in model.neighbours(columns, k):
+        rows.extend(
+            {"artwork_id": artwork_id, "similar_id": int(similar_id), "score": float(score)}
+            for similar_id, score in zip(neighbours, scores)
+        )
+        if len(rows) >= 10000:
+            conn.execute(insert(models.ArtworkSimilarity), rows)
+            rows = []
+    if rows:
+        conn.execute(insert(models.ArtworkSimilarity), rows)
+    return len(columns)
+
+
+def _state(conn) -> models.RecommendationState:
+    state = conn.execute(select(models.RecommendationState).where(models.RecommendationState.id == 1)).first()
+    if state is None:
+        conn.execute(insert(models.RecommendationState).values(id=1, like_watermark=0, unlock_watermark=0,
+                                                                lease_until=0))
+        state = conn.execute(select(models.RecommendationState).where(models.RecommendationState.id == 1)).first()
+    return state
+
+
+def _watermarks(conn) -> dict:
+    return {
+        "like_watermark": conn.scalar(select(func.max(models.Like.id))) or 0,
+        "unlock_watermark": conn.scalar(select(func.max(models.UnlockedArtwork.id))) or 0,
+    }
+
+
+def rebuild(conn, k: int = None) -> int:
+    """Recompute every artwork's neighbours; returns the number of artworks"""
+    k = k or settings.RECOMMENDATIONS_TOP_K
+    started = time.perf_counter()
+    _state(conn)
+    # Taken before reading, so tombstones written meanwhile are seen next time
+    cut = datetime.utcnow()
+    watermarks = _watermarks(conn)
+    model = SimilarityModel(*interactions(conn))
+
+    conn.execute(delete(models.ArtworkSimilarity))
+    count = _write_rows(conn, model, np.arange(len(model.artwork_ids)), k)
+    conn.execute(update(models.RecommendationState).where(models.RecommendationState.id == 1).values(
+        **watermarks, refreshed_at=cut, rebuilt_at=cut
+    ))
+    refresh_seconds.observe(time.perf_counter() - started, "rebuild")
+    refreshed_artworks.inc("rebuild", amount=count)
+    logger.info("Rebuilt similarities", extra={"artworks": count, "duration": time.perf_counter() - started})
+    return count
+
+
+def refresh(conn, k: int = None) -> int:
+    """Recompute the neighbours of artworks touched since the last refresh"""
+    k = k or settings.RECOMMENDATIONS_TOP_K
+    state = _state(conn)
+    if state.rebuilt_at is None or datetime.utcnow() - state.rebuilt_at > timedelta(
+            hours=settings.RECOMMENDATIONS_REBUILD_HOURS):
+        return rebuild(conn, k)
+
+    started = time.perf_counter()
+    cut = datetime.utcnow()
+    watermarks = _watermarks(conn)
+    dirty_users = union(
+        select(models.Like.user_id).where(models.Like.id > state.like_watermark),
+        select(models.UnlockedArtwork.user_id).where(models.UnlockedArtwork.id > state.unlock_watermark),
+        select(models.SyncTombstone.user_id).where(
+            models.SyncTombstone.entity_type.in_(("like", "unlock")),
+            models.SyncTombstone.deleted_at > state.refreshed_at
+        ),
+    ).subquery()
+    dirty_artworks = set(conn.scalars(
+        union(
+            select(models.Like.artwork_id).where(models.Like.user_id.in_(select(dirty_users.c[0]))),
+            select(models.UnlockedArtwork.artwork_id).where(
+                models.UnlockedArtwork.user_id.in_(select(dirty_users.c[0]))
+            ),
+            # Artworks that lost their last interaction still need their rows cleared
+            select(models.SyncTombstone.artwork_id).where(
+                models.SyncTombstone.entity_type.in_(("like", "unlock")),
+                models.SyncTombstone.deleted_at > state.refreshed_at
+            ),
+        )
+    ).all())
+    dirty_artworks.discard(None)
+
+    count = 0
+    if dirty_artworks:
+        model = SimilarityModel(*interactions(conn))
+        dirty = sorted(dirty_artworks)
+        # Rows scoring a dirty artwork: current co-interactions, and stored
+        # neighbours that may no longer share anyone with it
+        stale = set(model.co_interacted(model.index_of(np.asarray(dirty, dtype=np.int64))).tolist())
+        for start in range(0, len(dirty), 500):
+            stale.update(conn.scalars(
+                select(models.ArtworkSimilarity.artwork_id)
+                .where(models.ArtworkSimilarity.similar_id.in_(dirty[start:start + 500]))
+            ).all())
+        dirty = sorted(stale | dirty_artworks)
+        for start in range(0, len(dirty), 500):
+            conn.execute(delete(models.ArtworkSimilarity).where(
+                models.ArtworkSimilarity.artwork_id.in_(dirty[start:start + 500])
+            ))
+        count = _write_rows(conn, model, model.index_of(np.asarray(dirty, dtype=np.int64)), k)
+
+    conn.execute(update(models.RecommendationState).where(models.RecommendationState.id == 1).values(
+        **watermarks, refreshed_at=cut
+    ))
+    refresh_seconds.observe(time.perf_counter() - started, "incremental")
+    refreshed_artworks.inc("incremental", amount=count)
+    if count:
+        logger.info("Refreshed similarities", extra={"artworks": count, "duration": time.perf_counter() - started})
+    return count
+
+
+def acquire_lease(conn) -> bool:
+    _state(conn)
+    now = time.time()
+    result = conn.execute(
+        update(models.RecommendationState)
+        .where(models.RecommendationState.id == 1, models.RecommendationState.lease_until < now)
+        .values(lease_until=now + LEASE_SECONDS)
+    )
+    return result.rowcount == 1
+
+
+def release_lease(conn):
+    conn.execute(update(models.RecommendationState).where(models.RecommendationState.id == 1).values(lease_until=0))
+
+
+def refresh_with_lease(engine, full: bool = False) -> Optional[int]:
+    """Refresh unless another worker already is; None when skipped"""
+    with engine.begin() as conn:
+        if not acquire_lease(conn):
+            return None
+    try:
+        with engine.begin() as conn:
+            return rebuild(conn) if full else refresh(conn)
+    finally:
+        with engine.begin() as conn:
+            release_lease(conn)
+
+
+async def run_periodic_refresh():
+    from .manage import sync_engine
+
+    # The matrix work is CPU-bound; keep it off the event loop
+    engine = sync_engine()
+    try:
+        while True:
+            try:
+                await asyncio.to_thread(refresh_with_lease, engine)
+            except Exception:
+                logger.exception("Recommendation refresh failed")
+            await asyncio.sleep(settings.RECOMMENDATIONS_REFRESH_INTERVAL)
+    finally:
+        engine.dispose()
+
+
+# Serving
+
+async def similar_artworks(db: AsyncSession, artwork_id: int, limit: int) -> List[schemas.ScoredArtwork]:
+    result = await db.execute(
+        select(models.Artwork, models.ArtworkSimilarity.score)
+        .join(models.ArtworkSimilarity, models.ArtworkSimilarity.similar_id == models.Artwork.id)
+        .where(models.ArtworkSimilarity.artwork_id == artwork_id, models.Artwork.status == "active")
+        .options(selectinload(models.Artwork.categories))
+        .order_by(models.ArtworkSimilarity.score.desc())
+        .limit(limit)
+    )
+    return [schemas.ScoredArtwork.from_artwork(artwork, score) for artwork, score in result.all()]
+
+
+async def recommendations_for_user(db: AsyncSession, user_id: int, limit: int) -> List[schemas.ScoredArtwork]:
+    """Neighbours of the user's likes and unlocks, scored by summed similarity.
+
+    Users with no history get the most liked artworks, with a score of 0.
+    """
+    # No NULLs: a single one would make every NOT IN (seen) unknown
+    history = union(
+        select(models.Like.artwork_id).where(models.Like.user_id == user_id, models.Like.artwork_id.is_not(None)),
+        select(models.UnlockedArtwork.artwork_id).where(
+            models.UnlockedArtwork.user_id == user_id, models.UnlockedArtwork.artwork_id.is_not(None)
+        ),
+    ).subquery()
+    seen = select(history.c[0])
+    scores = (
+        select(models.ArtworkSimilarity.similar_id, func.sum(models.ArtworkSimilarity.score).label("score"))
+        .where(models.ArtworkSimilarity.artwork_id.in_(seen), models.ArtworkSimilarity.similar_id.not_in(seen))
+        .group_by(models.ArtworkSimilarity.similar_id)
+        .subquery()
+    )
+    result = await db.execute(
+        select(models.Artwork, scores.c.score)
+        .join(scores, scores.c.similar_id == models.Artwork.id)
+        .where(models.Artwork.status == "active", models.Artwork.artist_id != user_id)
+        .options(selectinload(models.Artwork.categories))
+        .order_by(scores.c.score.desc(), models.Artwork.id)
+        .limit(limit)
+    )
+    rows = result.all()
+    if rows:
+        return [schemas.ScoredArtwork.from_artwork(artwork, score) for artwork, score in rows]
+
+    like_counts = (
+        select(models.Like.artwork_id, func.count(models.Like.id).label("likes"))
+        .group_by(models.Like.artwork_id)
+        .subquery()
+    )
+    result = await db.execute(
+        select(models.Artwork)
+        .join(like_counts, like_counts.c.artwork_id == models.Artwork.id)
+        .where(models.Artwork.status == "active", models.Artwork.artist_id != user_id,
+               models.Artwork.id.not_in(seen))
+        .options(selectinload(models.Artwork.categories))
+        .order_by(like_counts.c.likes.desc(), models.Artwork.id)
+        .limit(limit)
+    )
+    return [schemas.ScoredArtwork.from_artwork(artwork, 0.0) for artwork in result.scalars().all()]
+
+
+def main():
+    from .manage import sync_engine
+    from .database import SQLALCHEMY_DATABASE_URL
+
+    parser = argparse.ArgumentParser(prog="python -m app.recommendations",
+                                     description="Recompute artwork similarities")
+    parser.add_argument("command", choices=["rebuild", "refresh"])
+    parser.add_argument("--database-url", default=SQLALCHEMY_DATABASE_URL)
+    args = parser.parse_args()
+
+    engine = sync_engine(args.database_url)
+    started = time.perf_counter()
+    try:
+        count = refresh_with_lease(engine, full=args.command == "rebuild")
+    finally:
+        engine.dispose()
+    if count is None:
+        print("Another process is refreshing; try again later")
+    else:
+        print(f"{count} artworks in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+"""Async queries for each aggregate.
+
+Repositories wrap an AsyncSession; handlers still own the transaction and
+commit. Statements are built once at import and reused with bound parameters,
+so SQLAlchemy compiles each of them once per process. Every statement names
+its loader strategy: relationships a response needs are fetched with
+selectinload, in one extra statement for the whole result, and every other
+relationship is raiseload, so an accidental lazy load fails loudly instead of
+issuing a query per row (or raising MissingGreenlet under asyncio).
+"""
+from .artworks import ArtworkRepository
+from .categories import CategoryRepository
+from .moderation import ModerationRepository
+from .social import CommentRepository, LikeRepository
+from .stats import StatsRepository
+from .users import UserRepository
+
+__all__ = [
+    'ArtworkRepository',
+    'CategoryRepository',
+    'CommentRepository', 'LikeRepository',
+    'ModerationRepository',
+    'StatsRepository',
+    'UserRepository'
+]
@@ -0,0 +1,93 @@
+from typing import Iterable, Optional, Sequence
+
+from sqlalchemy import Integer, bindparam, exists, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import raiseload, selectinload
+
+from ..models import Artwork, Category, Discovery, Like, artwork_categories
+
+# Artwork responses list category names
+WITH_CATEGORIES = (selectinload(Artwork.categories), raiseload("*"))
+
+# Plain lookup for writes; deletes need the default loaders to clear relationships
+_by_id = select(Artwork).where(Artwork.id == bindparam("artwork_id"))
+_by_id_with_categories = _by_id.options(*WITH_CATEGORIES)
+_featured = (
+    select(Artwork)
+    .where(Artwork.is_featured.is_(True))
+    .order_by(Artwork.id)
+    .options(*WITH_CATEGORIES)
+)
+_by_artist = (
+    select(Artwork)
+    .where(Artwork.artist_id == bindparam("user_id"))
+    .order_by(Artwork.id)
+    .options(*WITH_CATEGORIES)
+)
+_by_category = (
+    select(Artwork)
+    .join(Artwork.categories)
+    .where(Category.id == bindparam("category_id"))
+    .order_by(Artwork.id)
+    .options(*WITH_CATEGORIES)
+)
+_liked_by = (
+    select(Artwork)
+    .join(Like, Like.artwork_id == Artwork.id)
+    .where(Like.user_id == bindparam("user_id"))
+    .order_by(Like.id.desc())
+    .options(*WITH_CATEGORIES)
+)
+_discovered_by = (
+    select(Artwork)
+    .join(Discovery, Discovery.artwork_id == Artwork.id)
+    .where(Discovery.user_id == bindparam("user_id"))
+    .order_by(Discovery.id.desc())
+    .options(*WITH_CATEGORIES)
+)
+# Links the artwork to those of the categories that exist and are not linked yet
+_add_categories = insert(artwork_categories).from_select(
+    ["artwork_id", "category_id"],
+    select(bindparam("artwork_id", type_=Integer), Category.id)
+    .where(
+        Category.id.in_(bindparam("category_ids", expanding=True)),
+        ~exists().where(
+            artwork_categories.c.artwork_id == bindparam("artwork_id", type_=Integer),
+            artwork_categories.c.category_id == Category.id
+        )
+    )
+)
+
+
+class ArtworkRepository:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get(self, artwork_id: int, categories: bool = False) -> Optional[Artwork]:
+        """The artwork, with its categories loaded if asked for"""
+        statement = _by_id_with_categories if categories else _by_id
+        return await self.db.scalar(statement, {"artwork_id": artwork_id})
+
+    async def add_categories(self, artwork_id: int, category_ids: Iterable[int]) -> int:
+        """Link categories in one statement, without loading either side; how many were new"""
+        result = await self.db.execute(
+            _add_categories, {"artwork_id": artwork_id, "category_ids": list(category_ids)}
+        )
+        return result.rowcount
+
+    async def featured(self, skip: int = 0, limit: int = 10) -> Sequence[Artwork]:
+        return (await self.db.scalars(_featured.offset(skip).limit(limit))).all()
+
+    async def by_artist(self, user_id: int) -> Sequence[Artwork]:
+        return (await self.db.scalars(_by_artist, {"user_id": user_id})).all()
+
+    async def by_category(self, category_id: int) -> Sequence[Artwork]:
+        return (await self.db.scalars(_by_category, {"category_id": category_id})).all()
+
+    async def liked_by(self, user_id: int) -> Sequence[Artwork]:
+        """Most recently liked first"""
+        return (await self.db.scalars(_liked_by, {"user_id": user_id})).all()
+
+    async def discovered_by(self, user_id: int) -> Sequence[Artwork]:
+        """Most recently discovered first"""
+        return (await self.db.scalars(_discovered_by, {"user_id": user_id})).all()
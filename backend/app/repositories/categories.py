@@ -0,0 +1,17 @@
+from typing import Sequence
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import raiseload
+
+from ..models import Category
+
+_page = select(Category).order_by(Category.id).options(raiseload("*"))
+
+
+class CategoryRepository:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def page(self, skip: int = 0, limit: int = 100) -> Sequence[Category]:
+        return (await self.db.scalars(_page.offset(skip).limit(limit))).all()
@@ -0,0 +1,54 @@
+from datetime import datetime
+from typing import Optional, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import raiseload
+
+from ..models import ModerationLog
+
+_newest_first = (
+    select(ModerationLog)
+    .order_by(ModerationLog.created_at.desc())
+    .options(raiseload("*"))
+)
+
+
+class ModerationRepository:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def page(self, skip: int = 0, limit: int = 100) -> Sequence[ModerationLog]:
+        return (await self.db.scalars(_newest_first.offset(skip).limit(limit))).all()
+
+    async def search(
+        self,
+        target_type: Optional[str] = None,
+        action: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> Sequence[ModerationLog]:
+        """Newest first; each filter combination is its own cached statement"""
+        statement = _newest_first
+        if target_type:
+            statement = statement.where(ModerationLog.target_type == target_type)
+        if action:
+            statement = statement.where(ModerationLog.action == action)
+        if start_date:
+            statement = statement.where(ModerationLog.created_at >= start_date)
+        if end_date:
+            statement = statement.where(ModerationLog.created_at <= end_date)
+        return (await self.db.scalars(statement)).all()
+
+    def add(self, admin_id: int, action: str, target_type: str, target_id: int,
+            reason: Optional[str]) -> ModerationLog:
+        """Record an action; written with the caller's commit"""
+        log = ModerationLog(
+            admin_id=admin_id,
+            action=action,
+            target_type=target_type,
+            target_id=target_id,
+            reason=reason
+        )
+        self.db.add(log)
+        return log
@@ -0,0 +1,36 @@
+from typing import Optional
+
+from sqlalchemy import bindparam, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import raiseload
+
+from ..models import Comment, Like
+
+_like = (
+    select(Like)
+    .where(Like.user_id == bindparam("user_id"), Like.artwork_id == bindparam("artwork_id"))
+    .options(raiseload("*"))
+)
+_comment_by_id = select(Comment).where(Comment.id == bindparam("comment_id")).options(raiseload("*"))
+
+
+class LikeRepository:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def remove(self, user_id: int, artwork_id: int) -> bool:
+        """Delete the like, if there is one, with the caller's commit"""
+        # Through the session rather than a bulk DELETE, so the sync flush hook records a tombstone
+        like = await self.db.scalar(_like, {"user_id": user_id, "artwork_id": artwork_id})
+        if like is None:
+            return False
+        await self.db.delete(like)
+        return True
+
+
+class CommentRepository:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get(self, comment_id: int) -> Optional[Comment]:
+        return await self.db.scalar(_comment_by_id, {"comment_id": comment_id})
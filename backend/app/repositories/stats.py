@@ -0,0 +1,31 @@
+from sqlalchemy import Row, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import Artwork, Comment, Discovery, Like, User
+
+
+def _count(model, *criteria):
+    return select(func.count()).select_from(model).where(*criteria).scalar_subquery()
+
+
+# Every count as a scalar subquery of one statement: a single round trip
+_detailed = select(
+    _count(User).label("users"),
+    _count(User, User.status == "active").label("active_users"),
+    _count(User, User.status == "banned").label("banned_users"),
+    _count(User, User.role == "artist").label("artists"),
+    _count(Artwork).label("artworks"),
+    _count(Artwork, Artwork.status == "hidden").label("hidden_artworks"),
+    _count(Comment).label("comments"),
+    _count(Comment, Comment.status == "hidden").label("hidden_comments"),
+    _count(Like).label("likes"),
+    _count(Discovery).label("discoveries"),
+)
+
+
+class StatsRepository:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def detailed(self) -> Row:
+        return (await self.db.execute(_detailed)).one()
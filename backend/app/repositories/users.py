@@ -0,0 +1,21 @@
+from typing import Optional, Sequence
+
+from sqlalchemy import bindparam, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import raiseload
+
+from ..models import User
+
+_page = select(User).order_by(User.id).options(raiseload("*"))
+_by_username = select(User).where(User.username == bindparam("username")).options(raiseload("*"))
+
+
+class UserRepository:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def page(self, skip: int = 0, limit: int = 100) -> Sequence[User]:
+        return (await self.db.scalars(_page.offset(skip).limit(limit))).all()
+
+    async def by_username(self, username: str) -> Optional[User]:
+        return await self.db.scalar(_by_username, {"username": username})
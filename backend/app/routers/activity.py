@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from .. import activity, models, schemas
+from ..database import get_db, get_read_db
+from ..auth import get_current_user
+
+router = APIRouter(
+    prefix="/activity",
+    tags=["activity"]
+)
+
+@router.get("/", response_model=schemas.ActivityFeed)
+async def get_activity_feed(
+    cursor: Optional[int] = None,
+    limit: int = Query(default=20, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    events, next_cursor = await activity.get_feed(db, current_user.id, cursor, limit)
+    return {
+        "items": events,
+        "next_cursor": next_cursor,
+        "unread_count": await activity.get_unread_count(db, current_user.id)
+    }
+
+@router.get("/unread-count")
+async def get_unread_count(
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    return {"count": await activity.get_unread_count(db, current_user.id)}
+
+@router.post("/read")
+async def mark_activity_read(
+    up_to: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    await activity.mark_read(db, current_user.id, up_to)
+    return {"message": "Activity marked as read"}
@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Form
-from sqlalchemy.orm import Session
+import logging
+from fastapi import APIRouter, Depends, HTTPException, status, Form, Query
+from fastapi.responses import FileResponse, PlainTextResponse
 from typing import List, Optional
-from .. import models, schemas
-from ..database import get_db
+from .. import duplicates, jobs, models, schemas
+from ..database import get_db, get_read_db
 from ..auth import get_current_user
 from datetime import datetime, timedelta
 from fastapi.security import OAuth2PasswordRequestForm
@@ -10,6 +11,16 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, text
 from ..auth.auth import verify_password, create_access_token
 from sqlalchemy.orm import joinedload
+from .. import backup as backups
+from ..realtime import publish_artwork_event
+from ..repositories import ArtworkRepository, CommentRepository, ModerationRepository, StatsRepository
+from ..slow_queries import slow_query_log
+from .. import profiling
+import asyncio
+import os
+import time
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/admin",
@@ -29,7 +40,7 @@ async def get_current_admin(
 # User Management
 @router.get("/users")
 async def get_admin_users(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     admin: models.User = Depends(get_current_admin)
 ):
     try:
@@ -58,7 +69,7 @@ async def get_admin_users(
             for user in users
         ]
     except Exception as e:
-        print(f"Error fetching users: {str(e)}")
+        logger.exception("Error fetching users")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
@@ -84,6 +95,7 @@ async def ban_user(
         log = models.ModerationLog(
             admin_id=admin.id,
             action="ban_user",
+            target_type="user",
             target_id=user.id,
             reason=ban_data.get("reason")
         )
@@ -114,6 +126,7 @@ async def unban_user(
         log = models.ModerationLog(
             admin_id=admin.id,
             action="unban_user",
+            target_type="user",
             target_id=user.id
         )
         db.add(log)
@@ -148,15 +161,15 @@ async def delete_user(
 async def feature_artwork(
     artwork_id: int,
     featured: bool,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     admin: models.User = Depends(get_current_admin)
 ):
-    artwork = db.query(models.Artwork).filter(models.Artwork.id == artwork_id).first()
+    artwork = await ArtworkRepository(db).get(artwork_id)
     if not artwork:
         raise HTTPException(status_code=404, detail="Artwork not found")
     
     artwork.is_featured = featured
-    db.commit()
+    await db.commit()
     return {"message": f"Artwork featured status updated to {featured}"}
 
 @router.put("/artworks/{artwork_id}/moderate")
@@ -164,10 +177,10 @@ async def moderate_artwork(
     artwork_id: int,
     action: str,  # "hide", "restore", or "delete"
     reason: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     admin: models.User = Depends(get_current_admin)
 ):
-    artwork = db.query(models.Artwork).filter(models.Artwork.id == artwork_id).first()
+    artwork = await ArtworkRepository(db).get(artwork_id)
     if not artwork:
         raise HTTPException(status_code=404, detail="Artwork not found")
     
@@ -180,12 +193,16 @@ async def moderate_artwork(
         artwork.moderation_reason = None
         message = "Artwork restored"
     elif action == "delete":
-        db.delete(artwork)
+        await db.delete(artwork)
         message = "Artwork deleted"
     else:
         raise HTTPException(status_code=400, detail="Invalid action")
     
-    db.commit()
+    await db.commit()
+    if action == "delete":
+        duplicates.removed(artwork_id)
+    if action in ("hide", "delete"):
+        publish_artwork_event(artwork_id, "artwork_hidden")
     return {"message": message}
 
 # Comment Moderation
@@ -194,31 +211,31 @@ async def moderate_comment(
     comment_id: int,
     action: str,  # "hide" or "delete"
     reason: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     admin: models.User = Depends(get_current_admin)
 ):
-    comment = db.query(models.Comment).filter(models.Comment.id == comment_id).first()
+    comment = await CommentRepository(db).get(comment_id)
     if not comment:
         raise HTTPException(status_code=404, detail="Comment not found")
     
     if action == "hide":
         comment.status = "hidden"
         comment.moderation_reason = reason
-        db.commit()
         message = "Comment hidden"
     elif action == "delete":
-        db.delete(comment)
-        db.commit()
+        await db.delete(comment)
         message = "Comment deleted"
     else:
         raise HTTPException(status_code=400, detail="Invalid action")
     
+    await db.commit()
+    publish_artwork_event(comment.artwork_id, "comment_hidden", comment_id=comment_id)
     return {"message": message}
 
 # Analytics
 @router.get("/stats")
 async def get_admin_stats(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     admin: models.User = Depends(get_current_admin)
 ):
     try:
@@ -258,7 +275,7 @@ async def get_admin_stats(
         )
         category_results = category_data.all()
 
-        print("Debug - Stats:", {
+        logger.debug("Admin stats", extra={
             "total_users": total_users,
             "active_artists": active_artists,
             "total_artworks": total_artworks,
@@ -276,7 +293,7 @@ async def get_admin_stats(
             "category_data": [r.count for r in category_results]
         }
     except Exception as e:
-        print(f"Error in get_admin_stats: {str(e)}")
+        logger.exception("Error in get_admin_stats")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
@@ -285,25 +302,26 @@ async def get_admin_stats(
 # Enhanced Analytics
 @router.get("/stats/detailed")
 async def get_detailed_stats(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     admin: models.User = Depends(get_current_admin)
 ):
+    counts = await StatsRepository(db).detailed()
     return {
         "users": {
-            "total": db.query(models.User).count(),
-            "active": db.query(models.User).filter(models.User.status == "active").count(),
-            "banned": db.query(models.User).filter(models.User.status == "banned").count(),
-            "artists": db.query(models.User).filter(models.User.role == "artist").count()
+            "total": counts.users,
+            "active": counts.active_users,
+            "banned": counts.banned_users,
+            "artists": counts.artists
         },
         "content": {
-            "total_artworks": db.query(models.Artwork).count(),
-            "hidden_artworks": db.query(models.Artwork).filter(models.Artwork.status == "hidden").count(),
-            "total_comments": db.query(models.Comment).count(),
-            "hidden_comments": db.query(models.Comment).filter(models.Comment.status == "hidden").count()
+            "total_artworks": counts.artworks,
+            "hidden_artworks": counts.hidden_artworks,
+            "total_comments": counts.comments,
+            "hidden_comments": counts.hidden_comments
         },
         "engagement": {
-            "total_likes": db.query(models.Like).count(),
-            "total_discoveries": db.query(models.Discovery).count()
+            "total_likes": counts.likes,
+            "total_discoveries": counts.discoveries
         }
     }
 
@@ -312,55 +330,32 @@ async def get_detailed_stats(
 async def get_moderation_logs(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     admin: models.User = Depends(get_current_admin)
 ):
-    logs = db.query(models.ModerationLog)\
-        .order_by(models.ModerationLog.created_at.desc())\
-        .offset(skip)\
-        .limit(limit)\
-        .all()
-    return logs
+    return await ModerationRepository(db).page(skip, limit)
 
-@router.get("/moderation-logs/search")
+@router.get("/moderation-logs/search", response_model=List[schemas.ModerationLog])
 async def search_moderation_logs(
     target_type: Optional[str] = None,
     action: Optional[str] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     admin: models.User = Depends(get_current_admin)
 ):
-    query = db.query(models.ModerationLog)
-    
-    if target_type:
-        query = query.filter(models.ModerationLog.target_type == target_type)
-    if action:
-        query = query.filter(models.ModerationLog.action == action)
-    if start_date:
-        query = query.filter(models.ModerationLog.created_at >= start_date)
-    if end_date:
-        query = query.filter(models.ModerationLog.created_at <= end_date)
-    
-    return query.order_by(models.ModerationLog.created_at.desc()).all()
+    return await ModerationRepository(db).search(target_type, action, start_date, end_date)
 
 async def log_moderation(
-    db: Session,
+    db: AsyncSession,
     admin_id: int,
     action: str,
     target_type: str,
     target_id: int,
     reason: str
 ):
-    log = models.ModerationLog(
-        admin_id=admin_id,
-        action=action,
-        target_type=target_type,
-        target_id=target_id,
-        reason=reason
-    )
-    db.add(log)
-    db.commit()
+    log = ModerationRepository(db).add(admin_id, action, target_type, target_id, reason)
+    await db.commit()
     return log
 
 @router.post("/login")
@@ -406,7 +401,7 @@ async def admin_login(
         }
         
     except Exception as e:
-        print(f"Admin login error: {str(e)}")
+        logger.exception("Admin login error")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
@@ -414,7 +409,7 @@ async def admin_login(
 
 @router.get("/artworks")
 async def get_admin_artworks(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     admin: models.User = Depends(get_current_admin)
 ):
     try:
@@ -434,6 +429,9 @@ async def get_admin_artworks(
                 "title": artwork.title,
                 "description": artwork.description,
                 "image_url": artwork.image_url,
+                "image_width": artwork.image_width,
+                "image_height": artwork.image_height,
+                "blurhash": artwork.blurhash,
                 "latitude": artwork.latitude,
                 "longitude": artwork.longitude,
                 "artist_id": artwork.artist_id,
@@ -441,20 +439,34 @@ async def get_admin_artworks(
                 "status": artwork.status,
                 "is_featured": artwork.is_featured,
                 "created_at": artwork.created_at,
-                "categories": [{"id": c.id, "name": c.name} for c in artwork.categories]
+                "categories": [{"id": c.id, "name": c.name} for c in artwork.categories],
+                "duplicates": duplicates.similar_ids(artwork.id)
             }
             for artwork in artworks
         ]
     except Exception as e:
-        print(f"Error fetching artworks: {str(e)}")
+        logger.exception("Error fetching artworks")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
 
+@router.get("/artworks/{artwork_id}/duplicates", response_model=List[schemas.DuplicateArtwork])
+async def get_artwork_duplicates(
+    artwork_id: int,
+    max_distance: Optional[int] = Query(None, ge=0, le=15, description="Differing bits of 64"),
+    db: AsyncSession = Depends(get_read_db),
+    admin: models.User = Depends(get_current_admin)
+):
+    """Artworks whose image is likely the same as this one's, closest first"""
+    artwork = await db.get(models.Artwork, artwork_id)
+    if not artwork:
+        raise HTTPException(status_code=404, detail="Artwork not found")
+    return await duplicates.find(db, artwork.image_hash, exclude=artwork_id, max_distance=max_distance)
+
 @router.get("/categories")
 async def get_admin_categories(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     admin: models.User = Depends(get_current_admin)
 ):
     try:
@@ -479,7 +491,7 @@ async def get_admin_categories(
             for category in categories
         ]
     except Exception as e:
-        print(f"Error fetching categories: {str(e)}")
+        logger.exception("Error fetching categories")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
@@ -509,7 +521,7 @@ async def create_admin_category(
         }
     except Exception as e:
         await db.rollback()
-        print(f"Error creating category: {str(e)}")
+        logger.exception("Error creating category")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
@@ -518,7 +530,7 @@ async def create_admin_category(
 @router.get("/categories/{category_id}")
 async def get_category(
     category_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     admin: models.User = Depends(get_current_admin)
 ):
     try:
@@ -546,12 +558,13 @@ async def admin_delete_artwork(
         # Delete the artwork
         await db.delete(artwork)
         await db.commit()
+        duplicates.removed(artwork_id)
         
         return {"message": "Artwork deleted successfully"}
 
     except Exception as e:
         await db.rollback()
-        print(f"Error deleting artwork: {str(e)}")
+        logger.exception("Error deleting artwork")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
@@ -606,4 +619,176 @@ async def delete_category(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
-        ) 
\ No newline at end of file
+        )
+
+# Backups
+@router.get("/backups", response_model=List[schemas.Backup])
+async def get_backups(
+    db: AsyncSession = Depends(get_read_db),
+    admin: models.User = Depends(get_current_admin)
+):
+    result = await db.execute(
+        select(models.Backup).order_by(models.Backup.created_at.desc())
+    )
+    return result.scalars().all()
+
+@router.post("/backups", response_model=schemas.Backup, status_code=status.HTTP_202_ACCEPTED)
+async def create_backup(
+    db: AsyncSession = Depends(get_db),
+    admin: models.User = Depends(get_current_admin)
+):
+    try:
+        return await backups.start_backup(db)
+    except Exception as e:
+        await db.rollback()
+        logger.exception("Error starting backup")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+@router.get("/backups/{backup_id}/download")
+async def download_backup(
+    backup_id: int,
+    db: AsyncSession = Depends(get_read_db),
+    admin: models.User = Depends(get_current_admin)
+):
+    backup = await db.get(models.Backup, backup_id)
+    if not backup or backup.status != "completed":
+        raise HTTPException(status_code=404, detail="Backup not found")
+
+    path = backups.backup_path(backup.filename)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Backup file is missing")
+    return FileResponse(path, media_type="application/gzip", filename=backup.filename)
+
+@router.post("/backups/{backup_id}/restore", response_model=schemas.Backup)
+async def restore_backup(
+    backup_id: int,
+    db: AsyncSession = Depends(get_db),
+    admin: models.User = Depends(get_current_admin)
+):
+    backup = await db.get(models.Backup, backup_id)
+    if not backup:
+        raise HTTPException(status_code=404, detail="Backup not found")
+
+    try:
+        return await backups.restore_backup(db, backup)
+    except backups.BackupError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception("Error restoring backup")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+@router.delete("/backups/{backup_id}")
+async def delete_backup(
+    backup_id: int,
+    db: AsyncSession = Depends(get_db),
+    admin: models.User = Depends(get_current_admin)
+):
+    backup = await db.get(models.Backup, backup_id)
+    if not backup:
+        raise HTTPException(status_code=404, detail="Backup not found")
+    if backup.status == "running":
+        raise HTTPException(status_code=409, detail="Backup is still running")
+
+    path = backups.backup_path(backup.filename)
+    if os.path.exists(path):
+        os.remove(path)
+    await db.delete(backup)
+    await db.commit()
+    return {"message": "Backup deleted successfully"}
+
+# Background jobs
+@router.get("/jobs", response_model=List[schemas.Job])
+async def get_jobs(
+    job_status: Optional[str] = Query(None, alias="status", pattern=f"^({jobs.QUEUED}|{jobs.RUNNING}|{jobs.DONE}|{jobs.FAILED})$"),
+    kind: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_read_db),
+    admin: models.User = Depends(get_current_admin)
+):
+    """Most recently created jobs first"""
+    query = select(models.Job)
+    if job_status:
+        query = query.where(models.Job.status == job_status)
+    if kind:
+        query = query.where(models.Job.kind == kind)
+    result = await db.execute(query.order_by(models.Job.id.desc()).limit(limit))
+    return result.scalars().all()
+
+@router.post("/jobs/{job_id}/retry", response_model=schemas.Job)
+async def retry_job(
+    job_id: int,
+    db: AsyncSession = Depends(get_db),
+    admin: models.User = Depends(get_current_admin)
+):
+    """Run a failed job again, with a fresh set of attempts"""
+    job = await db.get(models.Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status != jobs.FAILED:
+        raise HTTPException(status_code=400, detail="Only failed jobs can be retried")
+    job.status = jobs.QUEUED
+    job.attempts = 0
+    job.run_at = time.time()
+    job.finished_at = None
+    await db.commit()
+    return job
+
+# Slow queries
+@router.get("/slow-queries")
+async def get_slow_queries(
+    limit: int = 20,
+    sort: str = "total",
+    admin: models.User = Depends(get_current_admin)
+):
+    if sort not in ("total", "max", "count", "mean"):
+        raise HTTPException(status_code=400, detail="sort must be one of total, max, count, mean")
+    return {
+        "shapes": len(slow_query_log),
+        "queries": [entry.as_dict() for entry in slow_query_log.top(limit, sort)]
+    }
+
+@router.delete("/slow-queries")
+async def clear_slow_queries(
+    admin: models.User = Depends(get_current_admin)
+):
+    slow_query_log.clear()
+    return {"message": "Slow query log cleared"}
+
+# Profiles
+@router.get("/profiles")
+async def get_profiles(
+    admin: models.User = Depends(get_current_admin)
+):
+    return await asyncio.to_thread(profiling.list_profiles)
+
+@router.get("/profiles/{profile_id}/download")
+async def download_profile(
+    profile_id: str,
+    format: str = "json",
+    admin: models.User = Depends(get_current_admin)
+):
+    try:
+        path = profiling.profile_path(profile_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+    if format == "json":
+        return FileResponse(path, media_type="application/json", filename=f"{profile_id}.json")
+    if format == "folded":
+        # Collapsed stacks for flamegraph.pl or speedscope
+        profile = await asyncio.to_thread(profiling.load_profile, profile_id)
+        if profile is None:
+            raise HTTPException(status_code=404, detail="Profile not found")
+        return PlainTextResponse(
+            profile["stacks"],
+            headers={"Content-Disposition": f'attachment; filename="{profile_id}.folded"'}
+        )
+    raise HTTPException(status_code=400, detail="format must be json or folded")
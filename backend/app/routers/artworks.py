@@ -1,19 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query, BackgroundTasks, Form
-from sqlalchemy.orm import Session
+import logging
+import time
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query, Form, Response
 from typing import List, Optional
-from .. import models, schemas
-from ..database import get_db
+from .. import activity, duplicates, images, jobs, models, nearby, recommendations, schemas, trending, walk
+from ..database import get_db, get_read_db
 from ..auth.auth import get_current_user
-from ..utils import save_image, calculate_distance, PaginationParams, search_filter, save_uploaded_file
-from PIL import Image
+from ..utils import save_image, PaginationParams, search_filter, save_uploaded_file
+from ..geo import bounding_box
+from ..repositories import ArtworkRepository
+from ..config import settings
 import io
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, case, and_
+from sqlalchemy import select, func, case, and_, exists, insert, literal
 from ..schemas.pagination import Page
 from sqlalchemy.orm import selectinload, joinedload
 from ..schemas.artwork import Artwork, ArtworkCreate, ArtworkResponse
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(
     prefix="/artworks",
     tags=["artworks"]
@@ -33,7 +38,7 @@ PREDEFINED_CATEGORIES = [
 
 # First, endpoint to get categories for the dropdown
 @router.get("/categories")
-async def get_categories(db: AsyncSession = Depends(get_db)):
+async def get_categories(db: AsyncSession = Depends(get_read_db)):
     try:
         result = await db.execute(
             select(models.Category)
@@ -42,7 +47,7 @@ async def get_categories(db: AsyncSession = Depends(get_db)):
         categories = result.scalars().all()
         return [category.name for category in categories]
     except Exception as e:
-        print(f"Error getting categories: {str(e)}")
+        logger.exception("Error getting categories")
         raise HTTPException(status_code=500, detail=str(e))
 
 # Define this BEFORE any routes that use it
@@ -52,7 +57,7 @@ async def get_current_user_or_none(
     return current_user
 
 # CRUD Operations
-@router.post("/", response_model=schemas.ArtworkResponse)
+@router.post("/", response_model=schemas.ArtworkUploadResponse)
 async def create_artwork(
     title: str = Form(...),
     description: str = Form(...),
@@ -66,6 +71,7 @@ async def create_artwork(
     try:
         # Save image first
         image_url = await save_uploaded_file(image)
+        image_info = await images.analyse_upload(image_url)
         
         # Create new artwork
         new_artwork = models.Artwork(
@@ -75,7 +81,8 @@ async def create_artwork(
             latitude=latitude,
             longitude=longitude,
             artist_id=current_user.id,
-            status="active"
+            status="active",
+            **image_info._asdict()
         )
         
         # Get category by name
@@ -90,9 +97,13 @@ async def create_artwork(
         db.add(new_artwork)
         if category:
             new_artwork.categories.append(category)
+        if images.oversized(image_info):
+            await db.flush()
+            await jobs.enqueue(db, "optimize_image", {"artwork_id": new_artwork.id})
         
         # Commit changes
         await db.commit()
+        duplicates.added(new_artwork.id, new_artwork.image_hash)
         
         # Create response
         response = {
@@ -100,13 +111,18 @@ async def create_artwork(
             "title": new_artwork.title,
             "description": new_artwork.description,
             "image_url": new_artwork.image_url,
+            "image_width": new_artwork.image_width,
+            "image_height": new_artwork.image_height,
+            "blurhash": new_artwork.blurhash,
             "latitude": new_artwork.latitude,
             "longitude": new_artwork.longitude,
             "artist_id": new_artwork.artist_id,
             "status": new_artwork.status,
             "is_featured": False,
             "created_at": new_artwork.created_at,
-            "categories": [category.name for category in new_artwork.categories]
+            "categories": [category.name for category in new_artwork.categories],
+            # Likely re-uploads of an existing artwork, for the client to confirm
+            "duplicates": await duplicates.find(db, new_artwork.image_hash, exclude=new_artwork.id)
         }
         
         # Explicitly close the session
@@ -115,7 +131,7 @@ async def create_artwork(
         return response
 
     except Exception as e:
-        print(f"Error creating artwork: {str(e)}")
+        logger.exception("Error creating artwork")
         await db.rollback()
         await db.close()
         raise HTTPException(
@@ -129,10 +145,10 @@ async def update_artwork(
     title: str = None,
     description: str = None,
     image: UploadFile = File(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    artwork = db.query(models.Artwork).filter(models.Artwork.id == artwork_id).first()
+    artwork = await ArtworkRepository(db).get(artwork_id, categories=True)
     if not artwork:
         raise HTTPException(status_code=404, detail="Artwork not found")
     if artwork.artist_id != current_user.id:
@@ -144,22 +160,15 @@ async def update_artwork(
         artwork.description = description
     if image:
         artwork.image_url = await save_image(image)
+        image_info = await images.analyse_upload(artwork.image_url)
+        for field, value in image_info._asdict().items():
+            setattr(artwork, field, value)
+        if images.oversized(image_info):
+            await jobs.enqueue(db, "optimize_image", {"artwork_id": artwork.id})
     
-    db.commit()
-    db.refresh(artwork)
-    return schemas.ArtworkResponse(
-        id=artwork.id,
-        title=artwork.title,
-        description=artwork.description,
-        image_url=artwork.image_url,
-        latitude=artwork.latitude,
-        longitude=artwork.longitude,
-        artist_id=artwork.artist_id,
-        status=artwork.status,
-        is_featured=artwork.is_featured,
-        created_at=artwork.created_at,
-        categories=[c.name for c in artwork.categories]
-    )
+    await db.commit()
+    duplicates.added(artwork.id, artwork.image_hash)
+    return schemas.ArtworkResponse.from_artwork(artwork)
 
 @router.delete("/{artwork_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_artwork(
@@ -189,12 +198,13 @@ async def delete_artwork(
         # Delete the artwork
         await db.delete(artwork)
         await db.commit()
+        duplicates.removed(artwork_id)
 
         return {"message": "Artwork deleted successfully"}
 
     except Exception as e:
         await db.rollback()
-        print(f"Error deleting artwork: {str(e)}")
+        logger.exception("Error deleting artwork")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
@@ -205,18 +215,19 @@ async def delete_artwork(
 async def add_categories(
     artwork_id: int,
     category_ids: List[int],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    artwork = db.query(models.Artwork).filter(models.Artwork.id == artwork_id).first()
+    artworks = ArtworkRepository(db)
+    artwork = await artworks.get(artwork_id)
     if not artwork:
         raise HTTPException(status_code=404, detail="Artwork not found")
     if artwork.artist_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    categories = db.query(models.Category).filter(models.Category.id.in_(category_ids)).all()
-    artwork.categories.extend(categories)
-    db.commit()
+    if await artworks.add_categories(artwork_id, category_ids):
+        artwork.updated_at = datetime.utcnow()  # Category changes count as edits for sync
+        await db.commit()
     return {"message": "Categories added successfully"}
 
 # Featured Artworks
@@ -224,100 +235,133 @@ async def add_categories(
 async def get_featured_artworks(
     skip: int = 0,
     limit: int = 10,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
+):
+    artworks = await ArtworkRepository(db).featured(skip, limit)
+    return [schemas.ArtworkResponse.from_artwork(artwork) for artwork in artworks]
+
+# Trending Artworks (declared before /{artwork_id})
+@router.get("/trending", response_model=List[schemas.ScoredArtwork])
+async def get_trending_artworks(
+    latitude: Optional[float] = Query(None, ge=-90, le=90),
+    longitude: Optional[float] = Query(None, ge=-180, le=180),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    artworks = db.query(models.Artwork).filter(
-        models.Artwork.is_featured == True
-    ).offset(skip).limit(limit).all()
-    return [schemas.ArtworkResponse(
-        id=artwork.id,
-        title=artwork.title,
-        description=artwork.description,
-        image_url=artwork.image_url,
-        latitude=artwork.latitude,
-        longitude=artwork.longitude,
-        artist_id=artwork.artist_id,
-        status=artwork.status,
-        is_featured=artwork.is_featured,
-        created_at=artwork.created_at,
-        categories=[c.name for c in artwork.categories]
-    ) for artwork in artworks]
+    """Most engaged-with artworks right now, near the given point or globally"""
+    ranked = trending.trending.ranked(trending.region_of(latitude, longitude))
+    # Over-fetch a little so hidden artworks do not shorten the page
+    candidates = ranked[:limit + 10]
+    if not candidates:
+        return []
+    result = await db.execute(
+        select(models.Artwork)
+        .where(models.Artwork.id.in_([artwork_id for artwork_id, _ in candidates]),
+               models.Artwork.status == "active")
+        .options(selectinload(models.Artwork.categories))
+    )
+    artworks = {artwork.id: artwork for artwork in result.scalars().all()}
+    now = time.time()
+    return [
+        schemas.ScoredArtwork.from_artwork(artworks[artwork_id], trending.current_score(log_score, now))
+        for artwork_id, log_score in candidates
+        if artwork_id in artworks
+    ][:limit]
 
 # Nearby Artworks
+def nearby_artwork_dict(artwork: models.Artwork, artist_name: str, is_unlocked: bool, distance: float) -> dict:
+    return {
+        "id": artwork.id,
+        "title": artwork.title,
+        "description": artwork.description,
+        "image_url": artwork.image_url,
+        "image_width": artwork.image_width,
+        "image_height": artwork.image_height,
+        "blurhash": artwork.blurhash,
+        "latitude": artwork.latitude,
+        "longitude": artwork.longitude,
+        "artist_id": artwork.artist_id,
+        "artist_name": artist_name,
+        "status": artwork.status,
+        "is_featured": artwork.is_featured,
+        "created_at": artwork.created_at,
+        "categories": [c.name for c in artwork.categories],
+        "distance": distance,  # Kilometers
+        "is_unlocked": is_unlocked
+    }
+
 @router.get("/nearby")
 async def get_nearby_artworks(
-    latitude: float,
-    longitude: float,
-    radius: float = 5.0,
-    db: AsyncSession = Depends(get_db),
+    response: Response,
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    radius: float = Query(5.0, gt=0, le=settings.NEARBY_MAX_RADIUS_KM,
+                          description="Starting radius in km; grows until `limit` artworks are found"),
+    limit: int = Query(50, ge=1, le=200),
+    order: str = Query(nearby.DISTANCE, pattern=f"^({nearby.DISTANCE}|{nearby.BLENDED})$"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    db: AsyncSession = Depends(get_read_db),
     current_user: Optional[models.User] = Depends(get_current_user_or_none)
 ):
+    """The nearest artworks, or a distance/popularity/unlocked blend, one page at a time"""
     try:
-        print(f"Received request for artworks near lat:{latitude}, lon:{longitude}")
-        
-        # Get all artworks with artist information and unlocked status
-        query = (
-            select(
-                models.Artwork,
-                models.User.username.label('artist_name'),
-                case(
-                    (models.UnlockedArtwork.artwork_id != None, True),
-                    else_=False
-                ).label('is_unlocked')
-            )
+        after = nearby.Cursor.decode(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    try:
+        logger.debug("Nearby artworks requested", extra={"latitude": latitude, "longitude": longitude})
+        page, next_cursor, searched = await nearby.search(
+            db, latitude, longitude, radius, limit, order,
+            user_id=current_user.id if current_user else None,
+            cursor=after
+        )
+        response.headers["X-Search-Radius"] = repr(searched)
+        if next_cursor is not None:
+            response.headers["X-Next-Cursor"] = next_cursor.encode()
+        if not page:
+            return []
+
+        result = await db.execute(
+            select(models.Artwork, models.User.username)
             .join(models.User, models.Artwork.artist_id == models.User.id)
-            .outerjoin(
-                models.UnlockedArtwork,
-                and_(
-                    models.UnlockedArtwork.artwork_id == models.Artwork.id,
-                    models.UnlockedArtwork.user_id == current_user.id if current_user else False
-                )
-            )
-            .filter(models.Artwork.status == "active")
+            .where(models.Artwork.id.in_([candidate.id for _, candidate in page]))
             .options(selectinload(models.Artwork.categories))
         )
-        
-        result = await db.execute(query)
-        all_artworks = result.all()
-        
-        nearby_artworks = []
-        for artwork_row in all_artworks:
-            artwork = artwork_row[0]
-            artist_name = artwork_row[1]
-            is_unlocked = artwork_row[2]
-            
-            distance = calculate_distance(
-                latitude, longitude,
-                artwork.latitude, artwork.longitude
-            )
-            
-            if distance <= radius:
-                artwork_dict = {
-                    "id": artwork.id,
-                    "title": artwork.title,
-                    "description": artwork.description,
-                    "image_url": artwork.image_url,
-                    "latitude": artwork.latitude,
-                    "longitude": artwork.longitude,
-                    "artist_id": artwork.artist_id,
-                    "artist_name": artist_name,
-                    "status": artwork.status,
-                    "is_featured": artwork.is_featured,
-                    "created_at": artwork.created_at,
-                    "categories": [c.name for c in artwork.categories],
-                    "distance": distance / 1000,  # Convert to kilometers
-                    "is_unlocked": is_unlocked
-                }
-                nearby_artworks.append(artwork_dict)
-        
-        return nearby_artworks
+        artworks = {artwork.id: (artwork, artist_name) for artwork, artist_name in result.all()}
+        return [
+            nearby_artwork_dict(*artworks[candidate.id], bool(candidate.is_unlocked), candidate.distance)
+            for _, candidate in page
+            if candidate.id in artworks
+        ]
+    except Exception as e:
+        logger.exception("Error in get_nearby_artworks")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/walk")
+async def plan_art_walk(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    distance_km: Optional[float] = Query(None, gt=0, le=settings.WALK_MAX_KM, description="Walking budget"),
+    minutes: Optional[float] = Query(None, gt=0, description="Walking budget as time; overrides distance_km"),
+    loop: bool = Query(False, description="Return to the start"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """A walking route visiting as many nearby artworks as the budget allows"""
+    if minutes is not None:
+        budget_km = min(minutes / 60 * settings.WALK_SPEED_KMH, settings.WALK_MAX_KM)
+    else:
+        budget_km = distance_km or settings.WALK_DEFAULT_KM
+    try:
+        route, cached = await walk.walk(db, latitude, longitude, budget_km, loop)
+        return {**route, "cached": cached}
     except Exception as e:
-        print(f"Error in get_nearby_artworks: {e}")
+        logger.exception("Error in plan_art_walk")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/", response_model=List[ArtworkResponse])
 async def get_artworks(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user)
 ):
     stmt = select(models.Artwork).options(selectinload(models.Artwork.categories))
@@ -330,6 +374,9 @@ async def get_artworks(
             title=artwork.title,
             description=artwork.description,
             image_url=artwork.image_url,
+            image_width=artwork.image_width,
+            image_height=artwork.image_height,
+            blurhash=artwork.blurhash,
             latitude=artwork.latitude,
             longitude=artwork.longitude,
             artist_id=artwork.artist_id,
@@ -344,38 +391,24 @@ async def get_artworks(
 @router.get("/{artwork_id}", response_model=schemas.ArtworkResponse)
 async def get_artwork(
     artwork_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    result = await db.execute(select(models.Artwork).filter(models.Artwork.id == artwork_id))
-    artwork = result.scalar_one_or_none()
+    artwork = await ArtworkRepository(db).get(artwork_id, categories=True)
     
     if artwork is None:
         raise HTTPException(status_code=404, detail="Artwork not found")
         
-    return schemas.ArtworkResponse(
-        id=artwork.id,
-        title=artwork.title,
-        description=artwork.description,
-        image_url=artwork.image_url,
-        latitude=artwork.latitude,
-        longitude=artwork.longitude,
-        artist_id=artwork.artist_id,
-        status=artwork.status,
-        is_featured=artwork.is_featured,
-        created_at=artwork.created_at,
-        categories=[c.name for c in artwork.categories]
-    )
+    return schemas.ArtworkResponse.from_artwork(artwork)
 
-async def process_image(image_path: str):
-    """Process image in background"""
-    with Image.open(image_path) as img:
-        # Resize if too large
-        if img.size[0] > 1920 or img.size[1] > 1080:
-            img.thumbnail((1920, 1080))
-        
-        # Optimize and save
-        img.save(image_path, optimize=True, quality=85)
+@router.get("/{artwork_id}/similar", response_model=List[schemas.ScoredArtwork])
+async def get_similar_artworks(
+    artwork_id: int,
+    limit: int = Query(10, ge=1, le=50),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """People who liked or unlocked this artwork also liked these"""
+    return await recommendations.similar_artworks(db, artwork_id, limit)
 
 @router.post("/unlock", status_code=status.HTTP_200_OK)
 async def unlock_artwork(
@@ -412,6 +445,8 @@ async def unlock_artwork(
             artwork_id=artwork_data.artwork_id
         )
         db.add(new_unlock)
+        await activity.fan_out(db, current_user, "unlock", artwork_data.artwork_id)
+        await trending.record(db, "unlock", artwork_data.artwork_id)
         await db.commit()
         
         return {
@@ -423,7 +458,64 @@ async def unlock_artwork(
         raise he
     except Exception as e:
         await db.rollback()
-        print(f"Error unlocking artwork: {e}")
+        logger.exception("Error unlocking artwork")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+@router.post("/unlock/sweep", response_model=schemas.UnlockSweepResponse)
+async def unlock_artworks_in_range(
+    position: schemas.UnlockSweepRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Unlock every active artwork within the unlock radius in one statement"""
+    try:
+        radius = settings.UNLOCK_RADIUS_KM
+        min_lat, max_lat, min_lon, max_lon = bounding_box(
+            position.latitude, position.longitude, radius
+        )
+
+        already_unlocked = exists().where(
+            models.UnlockedArtwork.user_id == current_user.id,
+            models.UnlockedArtwork.artwork_id == models.Artwork.id
+        )
+        in_range = (
+            select(
+                literal(current_user.id),
+                models.Artwork.id,
+                literal(datetime.utcnow())
+            )
+            .where(
+                models.Artwork.status == "active",
+                models.Artwork.latitude.between(min_lat, max_lat),
+                func.haversine_km(
+                    position.latitude, position.longitude,
+                    models.Artwork.latitude, models.Artwork.longitude
+                ) <= radius,
+                ~already_unlocked
+            )
+        )
+        if min_lon is not None:
+            in_range = in_range.where(models.Artwork.longitude.between(min_lon, max_lon))
+
+        result = await db.execute(
+            insert(models.UnlockedArtwork)
+            .from_select(["user_id", "artwork_id", "unlocked_at"], in_range)
+            .returning(models.UnlockedArtwork.artwork_id)
+        )
+        unlocked_ids = sorted(result.scalars().all())
+
+        if unlocked_ids:
+            await activity.fan_out(db, current_user, "unlock", *unlocked_ids)
+            await trending.record(db, "unlock", *unlocked_ids)
+        await db.commit()
+
+        return {"unlocked": unlocked_ids, "count": len(unlocked_ids)}
+    except Exception as e:
+        await db.rollback()
+        logger.exception("Error sweeping unlocks")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
@@ -431,7 +523,7 @@ async def unlock_artwork(
 
 @router.get("/user/unlocked", response_model=List[ArtworkResponse])
 async def get_unlocked_artworks(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user)
 ):
     try:
@@ -456,6 +548,9 @@ async def get_unlocked_artworks(
                 "title": artwork.title,
                 "description": artwork.description,
                 "image_url": artwork.image_url,
+                "image_width": artwork.image_width,
+                "image_height": artwork.image_height,
+                "blurhash": artwork.blurhash,
                 "latitude": artwork.latitude,
                 "longitude": artwork.longitude,
                 "artist_id": artwork.artist_id,
@@ -470,7 +565,7 @@ async def get_unlocked_artworks(
             for artwork in artworks
         ]
     except Exception as e:
-        print(f"Error in get_unlocked_artworks: {e}")
+        logger.exception("Error in get_unlocked_artworks")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
@@ -1,3 +1,4 @@
+import logging
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -6,6 +7,8 @@ from .. import models
 from ..database import get_db
 from ..auth.auth import verify_password, create_access_token
 
+logger = logging.getLogger(__name__)
+
 # Create router with prefix to match the token URL
 router = APIRouter(prefix="/auth", tags=["auth"])  # Add prefix here
 
@@ -14,7 +17,7 @@ async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: AsyncSession = Depends(get_db)
 ):
-    print(f"Login attempt for: {form_data.username}")  # Debug print
+    logger.debug("Login attempt", extra={"username": form_data.username})
     try:
         # Find user by email
         query = select(models.User).where(models.User.email == form_data.username)
@@ -22,7 +25,7 @@ async def login(
         user = result.scalar_one_or_none()
 
         if not user or not verify_password(form_data.password, user.password):
-            print("User not found or password mismatch")  # Debug print
+            logger.info("Login failed", extra={"username": form_data.username})
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect email or password",
@@ -33,6 +36,8 @@ async def login(
             "access_token": access_token,
             "token_type": "bearer"
         }
-    except Exception as e:
-        print(f"Login error: {str(e)}")  # Debug print
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Login error")
         raise 
\ No newline at end of file
@@ -1,12 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 from typing import List
 from .. import models, schemas
-from ..database import get_db
+from ..database import get_db, get_read_db
 from ..auth import get_current_user
-from ..models import Category, Artwork, User
+from ..models import User
+from ..repositories import ArtworkRepository, CategoryRepository
 
 router = APIRouter(
     prefix="/categories",
@@ -16,7 +15,7 @@ router = APIRouter(
 @router.post("/", response_model=schemas.Category)
 async def create_category(
     category: schemas.CategoryCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
     if current_user.role != "artist":
@@ -24,28 +23,22 @@ async def create_category(
     
     db_category = models.Category(**category.dict())
     db.add(db_category)
-    db.commit()
-    db.refresh(db_category)
+    await db.commit()
     return db_category
 
 @router.get("/", response_model=List[schemas.Category])
 async def get_categories(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    categories = db.query(models.Category).offset(skip).limit(limit).all()
-    return categories
+    return await CategoryRepository(db).page(skip, limit)
 
 @router.get("/{category_id}/artworks", response_model=List[schemas.ArtworkResponse])
 async def get_artworks_by_category(
     category_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
-    result = await db.execute(
-        select(Artwork)
-        .join(Artwork.categories)
-        .filter(Category.id == category_id)
-    )
-    return result.scalars().all() 
\ No newline at end of file
+    artworks = await ArtworkRepository(db).by_category(category_id)
+    return [schemas.ArtworkResponse.from_artwork(artwork) for artwork in artworks] 
\ No newline at end of file
@@ -2,10 +2,11 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from typing import List
-from .. import schemas
-from ..database import get_db
+from .. import activity, schemas, trending
+from ..database import get_db, get_read_db
 from ..models import Discovery, Artwork, User
 from ..auth import get_current_user
+from ..repositories import ArtworkRepository
 
 router = APIRouter(
     prefix="/discoveries",
@@ -27,18 +28,16 @@ async def create_discovery(
     # Create discovery
     discovery = Discovery(user_id=current_user.id, artwork_id=artwork_id)
     db.add(discovery)
+    await activity.fan_out(db, current_user, "discovery", artwork_id)
+    await trending.record(db, "discovery", artwork_id)
     await db.commit()
     await db.refresh(discovery)
     return discovery
 
 @router.get("/my", response_model=List[schemas.ArtworkResponse])
 async def get_my_discoveries(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
-    result = await db.execute(
-        select(Artwork)
-        .join(Discovery)
-        .filter(Discovery.user_id == current_user.id)
-    )
-    return result.scalars().all() 
\ No newline at end of file
+    artworks = await ArtworkRepository(db).discovered_by(current_user.id)
+    return [schemas.ArtworkResponse.from_artwork(artwork) for artwork in artworks] 
\ No newline at end of file
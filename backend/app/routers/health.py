@@ -0,0 +1,23 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from ..startup import state
+
+router = APIRouter(
+    prefix="/health",
+    tags=["health"]
+)
+
+@router.get("/live")
+async def liveness():
+    return {"status": "ok"}
+
+@router.get("/ready")
+async def readiness():
+    """503 until migrations and warm-up have finished"""
+    body = {
+        "status": "ready" if state.ready else "starting",
+        "time_to_ready": state.time_to_ready,
+        "steps": state.steps,
+        "warmup_errors": state.errors
+    }
+    return JSONResponse(body, status_code=200 if state.ready else 503)
@@ -0,0 +1,68 @@
+import asyncio
+import json
+from fastapi import APIRouter, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from ..config import settings
+from ..realtime import broker, artwork_topic
+
+router = APIRouter(
+    prefix="/artworks",
+    tags=["live"]
+)
+
+@router.get("/{artwork_id}/events")
+async def stream_artwork_events(artwork_id: int, request: Request):
+    """Server-Sent Events stream of comments, like deltas and moderation changes"""
+    subscription = broker.subscribe(artwork_topic(artwork_id))
+
+    async def event_stream():
+        with subscription:
+            yield "retry: 3000\n\n"
+            while not subscription.closed:
+                event = await subscription.get(timeout=settings.LIVE_HEARTBEAT_SECONDS)
+                if event is None:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/{artwork_id}/ws")
+async def artwork_events_websocket(websocket: WebSocket, artwork_id: int):
+    await websocket.accept()
+    with broker.subscribe(artwork_topic(artwork_id)) as subscription:
+        # Watch for the client going away while we wait on the queue
+        receiver = asyncio.create_task(websocket.receive())
+        try:
+            while not subscription.closed:
+                getter = asyncio.create_task(
+                    subscription.get(timeout=settings.LIVE_HEARTBEAT_SECONDS)
+                )
+                done, _ = await asyncio.wait(
+                    {receiver, getter}, return_when=asyncio.FIRST_COMPLETED
+                )
+                if getter in done:
+                    event = getter.result()
+                    if event is None:
+                        await websocket.send_json({"type": "ping"})
+                    else:
+                        await websocket.send_text(json.dumps(event, default=str))
+                else:
+                    getter.cancel()
+
+                if receiver in done:
+                    if receiver.result()["type"] == "websocket.disconnect":
+                        return
+                    receiver = asyncio.create_task(websocket.receive())
+            # Dropped by the disconnect policy
+            await websocket.close(code=1013)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            receiver.cancel()
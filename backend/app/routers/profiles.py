@@ -1,13 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
-from sqlalchemy.orm import Session
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 from typing import List, Optional
 from .. import models, schemas
-from ..database import get_db
+from ..database import get_db, get_read_db
 from ..auth import get_current_user
 from ..utils import save_image
-from ..models import Profile, User, Artwork
+from ..models import User
+from ..repositories import ArtworkRepository, UserRepository
 
 router = APIRouter(
     prefix="/profiles",
@@ -27,11 +26,12 @@ async def update_profile(
     website: Optional[str] = Form(None),
     location: Optional[str] = Form(None),
     profile_picture: Optional[UploadFile] = File(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
+    # current_user was loaded by this request's session, so committing it saves the changes
     if profile_picture:
-        profile_picture_url = await save_image(profile_picture, "profiles")
+        profile_picture_url = await save_image(profile_picture)
         current_user.profile_picture = profile_picture_url
     
     if bio is not None:
@@ -41,16 +41,15 @@ async def update_profile(
     if location is not None:
         current_user.location = location
     
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
     return current_user
 
 @router.get("/{username}", response_model=schemas.UserProfile)
 async def get_user_profile(
     username: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    user = db.query(models.User).filter(models.User.username == username).first()
+    user = await UserRepository(db).by_username(username)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user 
@@ -58,10 +57,8 @@ async def get_user_profile(
 @router.get("/{user_id}/artworks", response_model=List[schemas.ArtworkResponse])
 async def get_user_artworks(
     user_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
-    result = await db.execute(
-        select(Artwork).filter(Artwork.artist_id == user_id)
-    )
-    return result.scalars().all() 
\ No newline at end of file
+    artworks = await ArtworkRepository(db).by_artist(user_id)
+    return [schemas.ArtworkResponse.from_artwork(artwork) for artwork in artworks] 
\ No newline at end of file
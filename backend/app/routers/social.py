@@ -1,12 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 from typing import List
-from .. import models, schemas
-from ..database import get_db
+from .. import activity, models, schemas, trending
+from ..database import get_db, get_read_db
 from ..auth import get_current_user
 from ..models import Like, Comment, Artwork, User
+from ..realtime import publish_artwork_event
+from ..repositories import ArtworkRepository, LikeRepository
 
 router = APIRouter(tags=["social"])
 
@@ -30,7 +31,10 @@ async def like_artwork(
             user_id=current_user.id
         )
         db.add(new_like)
+        await activity.fan_out(db, current_user, "like", artwork_id)
+        await trending.record(db, "like", artwork_id)
         await db.commit()
+        publish_artwork_event(artwork_id, "like", delta=1)
         return {"message": "Artwork liked successfully"}
     
     return {"message": "Already liked"}
@@ -38,19 +42,14 @@ async def like_artwork(
 @router.delete("/artworks/{artwork_id}/like")
 async def unlike_artwork(
     artwork_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    like = db.query(models.Like).filter(
-        models.Like.user_id == current_user.id,
-        models.Like.artwork_id == artwork_id
-    ).first()
-    
-    if not like:
+    if not await LikeRepository(db).remove(current_user.id, artwork_id):
         raise HTTPException(status_code=404, detail="Like not found")
     
-    db.delete(like)
-    db.commit()
+    await db.commit()
+    publish_artwork_event(artwork_id, "like", delta=-1)
     return {"message": "Artwork unliked"}
 
 # Comments
@@ -67,11 +66,13 @@ async def create_comment(
         artwork_id=artwork_id
     )
     db.add(db_comment)
+    await activity.fan_out(db, current_user, "comment", artwork_id)
+    await trending.record(db, "comment", artwork_id)
     await db.commit()
     await db.refresh(db_comment)
     
     # Include username in response
-    return {
+    response = {
         "id": db_comment.id,
         "text": db_comment.text,
         "user_id": db_comment.user_id,
@@ -79,11 +80,13 @@ async def create_comment(
         "created_at": db_comment.created_at,
         "username": current_user.username  # Add username here
     }
+    publish_artwork_event(artwork_id, "comment", comment=response)
+    return response
 
 @router.get("/artworks/{artwork_id}/comments")
 async def get_artwork_comments(
     artwork_id: int,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     query = (
         select(models.Comment, models.User.username)
@@ -107,20 +110,16 @@ async def get_artwork_comments(
 
 @router.get("/likes", response_model=List[schemas.ArtworkResponse])
 async def get_liked_artworks(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
-    result = await db.execute(
-        select(Artwork)
-        .join(Like)
-        .filter(Like.user_id == current_user.id)
-    )
-    return result.scalars().all()
+    artworks = await ArtworkRepository(db).liked_by(current_user.id)
+    return [schemas.ArtworkResponse.from_artwork(artwork) for artwork in artworks]
 
 @router.get("/artworks/{artwork_id}/likes/count")
 async def get_artwork_like_count(
     artwork_id: int,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     query = select(func.count(models.Like.id)).where(
         models.Like.artwork_id == artwork_id
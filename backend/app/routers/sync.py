@@ -0,0 +1,113 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
+from sqlalchemy.orm import selectinload
+from typing import Optional
+from .. import models, sync
+from ..database import get_read_db
+from ..auth import get_current_user
+
+router = APIRouter(
+    prefix="/sync",
+    tags=["sync"]
+)
+
+def _merge_changes(added, removed):
+    """Collapse add/remove events per artwork, keeping the latest state"""
+    latest = {}
+    for artwork_id, changed_at in added:
+        latest[artwork_id] = max(latest.get(artwork_id, (changed_at, True)), (changed_at, True))
+    for artwork_id, changed_at in removed:
+        if artwork_id not in latest or changed_at >= latest[artwork_id][0]:
+            latest[artwork_id] = (changed_at, False)
+    return {
+        "added": sorted(a for a, (_, present) in latest.items() if present),
+        "removed": sorted(a for a, (_, present) in latest.items() if not present)
+    }
+
+async def _user_changes(db, model, timestamp, entity_type, user_id, start):
+    query = select(model.artwork_id, timestamp).where(
+        model.user_id == user_id,
+        model.artwork_id.isnot(None)
+    )
+    if start is not None:
+        query = query.where(timestamp > start)
+    added = (await db.execute(query)).all()
+
+    removed = []
+    if start is not None:
+        result = await db.execute(
+            select(models.SyncTombstone.artwork_id, models.SyncTombstone.deleted_at)
+            .where(
+                models.SyncTombstone.entity_type == entity_type,
+                models.SyncTombstone.user_id == user_id,
+                models.SyncTombstone.deleted_at > start
+            )
+        )
+        removed = result.all()
+    return _merge_changes(added, removed)
+
+@router.get("")
+async def get_changes(
+    since: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    try:
+        start = sync.window_start(sync.decode_token(since))
+    except sync.InvalidSyncToken as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    cut = sync.next_cut()
+
+    # Artworks created, edited, hidden or restored since the token
+    changed_at = func.coalesce(models.Artwork.updated_at, models.Artwork.created_at)
+    query = select(models.Artwork).options(selectinload(models.Artwork.categories))
+    if start is not None:
+        query = query.where(changed_at > start)
+    else:
+        query = query.where(models.Artwork.status == "active")
+    result = await db.execute(query)
+    artworks = result.scalars().all()
+
+    deleted_ids = {artwork.id for artwork in artworks if artwork.status != "active"}
+    if start is not None:
+        result = await db.execute(
+            select(models.SyncTombstone.artwork_id).where(
+                models.SyncTombstone.entity_type == "artwork",
+                models.SyncTombstone.deleted_at > start
+            )
+        )
+        deleted_ids.update(result.scalars().all())
+
+    return {
+        "token": sync.encode_token(cut),
+        "full": start is None,
+        "artworks": [
+            {
+                "id": artwork.id,
+                "title": artwork.title,
+                "description": artwork.description,
+                "image_url": artwork.image_url,
+                "image_width": artwork.image_width,
+                "image_height": artwork.image_height,
+                "blurhash": artwork.blurhash,
+                "latitude": artwork.latitude,
+                "longitude": artwork.longitude,
+                "artist_id": artwork.artist_id,
+                "status": artwork.status,
+                "is_featured": artwork.is_featured,
+                "created_at": artwork.created_at,
+                "updated_at": artwork.updated_at,
+                "categories": [c.name for c in artwork.categories]
+            }
+            for artwork in artworks
+            if artwork.status == "active"
+        ],
+        "deleted_artworks": sorted(deleted_ids),
+        "likes": await _user_changes(
+            db, models.Like, models.Like.created_at, "like", current_user.id, start
+        ),
+        "unlocks": await _user_changes(
+            db, models.UnlockedArtwork, models.UnlockedArtwork.unlocked_at, "unlock", current_user.id, start
+        )
+    }
@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from typing import List
-from .. import models, schemas
-from ..database import get_db
+from .. import models, recommendations, schemas
+from ..repositories import UserRepository
+from ..database import get_db, get_read_db
 from ..auth.auth import get_current_user, get_password_hash
 
 router = APIRouter(
@@ -41,21 +42,29 @@ async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_d
     return db_user
 
 @router.get("/", response_model=List[schemas.User])
-def read_users(
+async def read_users(
     skip: int = 0, 
     limit: int = 100, 
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    users = db.query(models.User).offset(skip).limit(limit).all()
-    return users
+    return await UserRepository(db).page(skip, limit)
 
 @router.get("/me", response_model=schemas.User)
 async def read_users_me(current_user: models.User = Depends(get_current_user)):
     return current_user
 
+@router.get("/me/recommendations", response_model=List[schemas.ScoredArtwork])
+async def get_my_recommendations(
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Artworks similar to the ones you liked or unlocked"""
+    return await recommendations.recommendations_for_user(db, current_user.id, limit)
+
 @router.get("/{user_id}", response_model=schemas.User)
-async def read_user(user_id: int, db: AsyncSession = Depends(get_db)):
+async def read_user(user_id: int, db: AsyncSession = Depends(get_read_db)):
     query = select(models.User).where(models.User.id == user_id)
     result = await db.execute(query)
     user = result.scalar_one_or_none()
@@ -3,8 +3,13 @@ from .artwork import (
     ArtworkCreate,
     ArtworkUpdate,
     ArtworkResponse,
+    ScoredArtwork,
+    DuplicateArtwork,
+    ArtworkUploadResponse,
     UnlockedArtworkCreate,
     UnlockedArtwork,
+    UnlockSweepRequest,
+    UnlockSweepResponse,
 )
 from .user import User, UserCreate, UserUpdate, UserInDB, UserProfile
 from .token import Token, TokenData
@@ -14,15 +19,23 @@ from .category import Category, CategoryCreate
 from .social import Like, Comment, CommentCreate
 from .discovery import Discovery, DiscoveryCreate
 from .moderation import ModerationLog, ModerationLogCreate
+from .backup import Backup
+from .job import Job
+from .activity import ActivityEvent, ActivityFeed
 
 __all__ = [
     'User', 'UserCreate', 'UserUpdate', 'UserInDB', 'UserProfile',
     'Token', 'TokenData',
-    'Artwork', 'ArtworkCreate', 'ArtworkBase', 'ArtworkResponse', 'ArtworkUpdate',
+    'Artwork', 'ArtworkCreate', 'ArtworkBase', 'ArtworkResponse', 'ArtworkUpdate', 'ScoredArtwork',
+    'DuplicateArtwork', 'ArtworkUploadResponse',
+    'UnlockedArtworkCreate', 'UnlockedArtwork', 'UnlockSweepRequest', 'UnlockSweepResponse',
     'Page',
     'Profile', 'ProfileCreate', 'ProfileUpdate',
     'Category', 'CategoryCreate',
     'Like', 'Comment', 'CommentCreate',
     'Discovery', 'DiscoveryCreate',
-    'ModerationLog', 'ModerationLogCreate'
+    'ModerationLog', 'ModerationLogCreate',
+    'Backup',
+    'Job',
+    'ActivityEvent', 'ActivityFeed'
 ] 
\ No newline at end of file
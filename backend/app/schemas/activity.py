@@ -0,0 +1,20 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import List, Optional
+
+class ActivityEvent(BaseModel):
+    id: int
+    actor_id: int
+    actor_name: Optional[str] = None
+    verb: str
+    artwork_id: int
+    artwork_title: Optional[str] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class ActivityFeed(BaseModel):
+    items: List[ActivityEvent]
+    next_cursor: Optional[int] = None
+    unread_count: int = 0
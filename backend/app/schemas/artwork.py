@@ -1,5 +1,5 @@
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 
 class ArtworkBase(BaseModel):
@@ -27,6 +27,10 @@ class Artwork(ArtworkBase):
     id: int
     artist_id: int
     created_at: datetime
+    # Lay out and paint a placeholder before the image arrives
+    image_width: Optional[int] = None
+    image_height: Optional[int] = None
+    blurhash: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -34,9 +38,59 @@ class Artwork(ArtworkBase):
 class ArtworkResponse(Artwork):
     categories: List[str] = []
 
+    @classmethod
+    def from_artwork(cls, artwork) -> "ArtworkResponse":
+        """From an Artwork loaded with its categories"""
+        return cls(
+            id=artwork.id,
+            title=artwork.title,
+            description=artwork.description,
+            image_url=artwork.image_url,
+            image_width=artwork.image_width,
+            image_height=artwork.image_height,
+            blurhash=artwork.blurhash,
+            latitude=artwork.latitude,
+            longitude=artwork.longitude,
+            artist_id=artwork.artist_id,
+            status=artwork.status,
+            is_featured=artwork.is_featured,
+            created_at=artwork.created_at,
+            categories=[c.name for c in artwork.categories]
+        )
+
+class ScoredArtwork(ArtworkResponse):
+    score: float
+
+    @classmethod
+    def from_artwork(cls, artwork, score: float) -> "ScoredArtwork":
+        return cls(**ArtworkResponse.from_artwork(artwork).model_dump(), score=score)
+
+class DuplicateArtwork(BaseModel):
+    id: int
+    title: str
+    image_url: Optional[str] = None
+    image_width: Optional[int] = None
+    image_height: Optional[int] = None
+    blurhash: Optional[str] = None
+    artist_id: int
+    artist_name: str
+    status: str
+    distance: int  # Differing bits between the image hashes
+
+class ArtworkUploadResponse(ArtworkResponse):
+    duplicates: List[DuplicateArtwork] = []
+
 class UnlockedArtworkCreate(BaseModel):
     artwork_id: int
 
+class UnlockSweepRequest(BaseModel):
+    latitude: float = Field(ge=-90, le=90)
+    longitude: float = Field(ge=-180, le=180)
+
+class UnlockSweepResponse(BaseModel):
+    unlocked: List[int]
+    count: int
+
 class UnlockedArtwork(BaseModel):
     id: int
     user_id: int
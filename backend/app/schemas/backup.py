@@ -0,0 +1,18 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+
+class Backup(BaseModel):
+    id: int
+    filename: str
+    type: str
+    status: str
+    size: int = 0
+    duration: Optional[float] = None
+    error: Optional[str] = None
+    created_at: datetime
+    completed_at: Optional[datetime] = None
+    restored_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,20 @@
+from pydantic import BaseModel
+from typing import Optional
+
+class Job(BaseModel):
+    id: int
+    kind: str
+    payload: str
+    priority: int
+    status: str
+    attempts: int
+    max_attempts: int
+    run_at: float
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    locked_by: Optional[str] = None
+    last_error: Optional[str] = None
+
+    class Config:
+        from_attributes = True
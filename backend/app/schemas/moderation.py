@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 from typing import Optional
 
@@ -13,7 +13,8 @@ class ModerationLogCreate(ModerationLogBase):
 
 class ModerationLog(ModerationLogBase):
     id: int
-    moderator_id: int
+    target_type: Optional[str] = None  # Not recorded for bans before it was set
+    moderator_id: int = Field(validation_alias="admin_id")  # ModerationLog.admin_id
     created_at: datetime
 
     class Config:
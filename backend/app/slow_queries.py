@@ -0,0 +1,167 @@
+"""Slow query log.
+
+Statements slower than SLOW_QUERY_THRESHOLD_MS are aggregated by normalized
+shape (literals and IN-list lengths removed), so the admin grouped joins and
+the nearby scans show up as single entries with a count, total and worst
+time. Each shape keeps its most recent samples with their parameters and the
+route that issued them. The first time a shape is seen its plan is captured
+with EXPLAIN QUERY PLAN (EXPLAIN on PostgreSQL), which describes the plan
+without running the statement.
+"""
+import re
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+
+from .config import settings
+from .metrics import current_request, registry, route_template
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_POSITIONAL = re.compile(r"%\([^)]*\)s|%s|\$\d+|:\w+")
+_WHITESPACE = re.compile(r"\s+")
+
+_EXPLAIN_PREFIX = {"sqlite": "EXPLAIN QUERY PLAN ", "postgresql": "EXPLAIN "}
+_EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+slow_statements = registry.counter(
+    "db_slow_statements_total", "Statements slower than the slow query threshold"
+)
+
+
+def normalize(statement: str) -> str:
+    """Reduce a statement to its shape so executions with different values group together"""
+    shape = _STRING.sub("?", statement)
+    shape = _POSITIONAL.sub("?", shape)
+    shape = _NUMBER.sub("?", shape)
+    shape = _IN_LIST.sub("(?...)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+def _short_params(parameters, limit: int = 500) -> str:
+    text = repr(parameters)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+class SlowQuery:
+    def __init__(self, shape: str, statement: str):
+        self.shape = shape
+        self.statement = statement
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.last_seen = None
+        self.plan: Optional[List[str]] = None
+        self.samples = deque(maxlen=settings.SLOW_QUERY_SAMPLES)
+
+    def record(self, elapsed: float, parameters, route: Optional[str]):
+        self.count += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+        self.last_seen = datetime.utcnow()
+        self.samples.append({
+            "duration_ms": round(elapsed * 1000, 2),
+            "parameters": _short_params(parameters),
+            "route": route,
+            "at": self.last_seen
+        })
+
+    def as_dict(self) -> dict:
+        return {
+            "shape": self.shape,
+            "statement": self.statement,
+            "count": self.count,
+            "total_ms": round(self.total_time * 1000, 2),
+            "mean_ms": round(self.total_time * 1000 / self.count, 2),
+            "max_ms": round(self.max_time * 1000, 2),
+            "last_seen": self.last_seen,
+            "plan": self.plan,
+            "samples": list(self.samples)
+        }
+
+
+class SlowQueryLog:
+    def __init__(self, max_shapes: int):
+        self.max_shapes = max_shapes
+        self._entries: Dict[str, SlowQuery] = {}
+
+    def get(self, shape: str) -> Optional[SlowQuery]:
+        return self._entries.get(shape)
+
+    def add(self, shape: str, statement: str) -> SlowQuery:
+        if len(self._entries) >= self.max_shapes:
+            # Evict the cheapest shape so the expensive ones stay visible
+            cheapest = min(self._entries.values(), key=lambda entry: entry.total_time)
+            del self._entries[cheapest.shape]
+        entry = self._entries[shape] = SlowQuery(shape, statement)
+        return entry
+
+    def top(self, limit: int = 20, sort: str = "total") -> List[SlowQuery]:
+        key = {
+            "total": lambda entry: entry.total_time,
+            "max": lambda entry: entry.max_time,
+            "count": lambda entry: entry.count,
+            "mean": lambda entry: entry.total_time / entry.count,
+        }[sort]
+        return sorted(self._entries.values(), key=key, reverse=True)[:limit]
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+slow_query_log = SlowQueryLog(settings.SLOW_QUERY_MAX_SHAPES)
+
+
+def _explain(conn, statement: str, parameters) -> Optional[List[str]]:
+    prefix = _EXPLAIN_PREFIX.get(conn.dialect.name)
+    if prefix is None or not statement.lstrip().upper().startswith(_EXPLAINABLE):
+        return None
+    # Use the raw DBAPI cursor so the plan lookup is neither logged nor
+    # counted against the request's statements
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return [" ".join(str(column) for column in row) for row in cursor.fetchall()]
+    except Exception as e:
+        return [f"EXPLAIN failed: {e}"]
+    finally:
+        cursor.close()
+
+
+def install_slow_query_log(sync_engine, log: SlowQueryLog = slow_query_log):
+    """Record statements over SLOW_QUERY_THRESHOLD_MS executed on a (sync) engine"""
+    threshold = settings.SLOW_QUERY_THRESHOLD_MS / 1000
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["slow_query_start"].pop()
+        if elapsed < threshold:
+            return
+
+        slow_statements.inc()
+        shape = normalize(statement)
+        entry = log.get(shape)
+        if entry is None:
+            entry = log.add(shape, statement)
+            if settings.SLOW_QUERY_EXPLAIN and not executemany:
+                entry.plan = _explain(conn, statement, parameters)
+
+        stats = current_request.get()
+        route = route_template(stats.scope) if stats is not None and stats.scope else None
+        entry.record(elapsed, parameters, route)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        if context.connection is not None and context.connection.info.get("slow_query_start"):
+            context.connection.info["slow_query_start"].pop()
@@ -0,0 +1,183 @@
+"""Application startup and readiness.
+
+Startup creates the working directories, then brings the schema up to date,
+which is a single version check once the database is current. It then starts
+the warm-ups in the background and returns, so the process is live at once.
+Warm-ups run concurrently, each on its own pooled connection: they open
+connections, pull hot indexes into SQLite's page cache and fill whatever
+in-process caches other modules register. /health/ready returns 503 until
+they finish. Time to ready is measured from import and published as metrics.
+
+Subsystems with state worth preloading register with @warmup. Warm-ups run
+again when the invalidation bus resets after a restore, so they must replace
+what they loaded rather than add to it.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from .config import settings
+from .database import engine, monitor_replica_lag, read_engine
+from .invalidation import bus
+from .jobs import monitor_queue
+from .metrics import Gauge, registry
+from .migrations import run_migrations
+from .recommendations import run_periodic_refresh
+
+logger = logging.getLogger(__name__)
+
+PROCESS_STARTED = time.perf_counter()
+
+# Relative to the working directory, as the app serves and writes them
+DIRECTORIES = ["static", "static/images", "uploads"]
+
+WARMUPS: List[Tuple[str, Callable[[], Awaitable]]] = []
+
+
+class StartupState:
+    def __init__(self):
+        self.ready = False
+        self.time_to_ready: Optional[float] = None
+        self.steps: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+
+
+state = StartupState()
+
+
+def warmup(name: str):
+    """Register an async callable run concurrently after migrations"""
+    def register(func: Callable[[], Awaitable]):
+        WARMUPS.append((name, func))
+        return func
+    return register
+
+
+@registry.add_collector
+def _startup_metrics():
+    ready = Gauge("app_ready", "1 once startup and warm-up have finished")
+    ready.set(value=1 if state.ready else 0)
+    metrics = [ready]
+    if state.time_to_ready is not None:
+        time_to_ready = Gauge("app_time_to_ready_seconds", "Seconds from import until ready")
+        time_to_ready.set(value=state.time_to_ready)
+        metrics.append(time_to_ready)
+    steps = Gauge("app_startup_step_seconds", "Duration of each startup step", ("step",))
+    for step, seconds in state.steps.items():
+        steps.set(step, value=seconds)
+    metrics.append(steps)
+    return metrics
+
+
+async def _timed(name: str, func: Callable[[], Awaitable]):
+    started = time.perf_counter()
+    try:
+        await func()
+    except Exception as e:
+        # A failed warm-up only costs latency on the first requests
+        state.errors[name] = str(e)
+        logger.exception("Warm-up failed", extra={"step": name})
+    finally:
+        state.steps[name] = time.perf_counter() - started
+
+
+@warmup("connections")
+async def _warm_connections():
+    # Open the pool's connections up front; each connect also registers the
+    # SQL functions used by the nearby queries
+    async def touch(pool_engine):
+        async with pool_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    engines = [engine] if read_engine is engine else [engine, read_engine]
+    await asyncio.gather(*(
+        touch(pool_engine)
+        for pool_engine in engines
+        for _ in range(pool_engine.pool.size() if hasattr(pool_engine.pool, "size") else 1)
+    ))
+
+
+@warmup("indexes")
+async def _warm_indexes():
+    if engine.dialect.name != "sqlite":
+        return
+    # Index-only scans over the indexes behind nearby search, likes and the
+    # activity feed pull their pages into the cache
+    statements = [
+        "SELECT COUNT(*) FROM artworks INDEXED BY ix_artworks_latitude_longitude WHERE latitude > -91",
+        "SELECT COUNT(*) FROM likes WHERE artwork_id > 0",
+        "SELECT COUNT(*) FROM users WHERE email > ''",
+        "SELECT COUNT(*) FROM activity_events INDEXED BY ix_activity_events_recipient_id_id WHERE recipient_id > 0",
+    ]
+
+    # SQLite page caches are per connection; reads run on the read pool
+    async def scan(statement):
+        async with read_engine.connect() as conn:
+            await conn.execute(text(statement))
+    await asyncio.gather(*(scan(statement) for statement in statements))
+
+
+async def _rewarm():
+    """Run the warm-ups again once a restore has replaced the database"""
+    await asyncio.gather(*(_timed(name, func) for name, func in WARMUPS))
+
+
+bus.on_reset(_rewarm)
+
+
+async def _warm_up():
+    await asyncio.gather(*(_timed(name, func) for name, func in WARMUPS))
+    state.time_to_ready = time.perf_counter() - PROCESS_STARTED
+    state.ready = True
+    logger.info("Ready", extra={
+        "time_to_ready": round(state.time_to_ready, 3),
+        "steps": {step: round(seconds, 3) for step, seconds in state.steps.items()}
+    })
+
+
+_warmup_task: Optional[asyncio.Task] = None
+_lag_task: Optional[asyncio.Task] = None
+_recommendations_task: Optional[asyncio.Task] = None
+_jobs_task: Optional[asyncio.Task] = None
+
+
+async def startup():
+    global _warmup_task, _lag_task, _recommendations_task, _jobs_task
+    started = time.perf_counter()
+    for directory in DIRECTORIES:
+        os.makedirs(os.path.join(os.getcwd(), directory), exist_ok=True)
+    state.steps["directories"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    applied = await run_migrations(engine)
+    state.steps["migrations"] = time.perf_counter() - started
+    logger.info("Schema up to date", extra={"migrations_applied": applied})
+
+    if settings.INVALIDATION_ENABLED:
+        await bus.start()
+    if read_engine is not engine:
+        _lag_task = asyncio.create_task(monitor_replica_lag())
+    if settings.RECOMMENDATIONS_ENABLED:
+        _recommendations_task = asyncio.create_task(run_periodic_refresh())
+    _jobs_task = asyncio.create_task(monitor_queue())
+
+    if settings.STARTUP_WARMUP:
+        _warmup_task = asyncio.create_task(_warm_up())
+    else:
+        state.time_to_ready = time.perf_counter() - PROCESS_STARTED
+        state.ready = True
+
+
+async def shutdown():
+    if _warmup_task is not None and not _warmup_task.done():
+        _warmup_task.cancel()
+    for task in (_lag_task, _recommendations_task, _jobs_task):
+        if task is not None:
+            task.cancel()
+    await bus.stop()
+    await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
@@ -0,0 +1,72 @@
+"""Delta sync support for offline-capable clients.
+
+A sync token is an opaque wrapper around the server time the previous sync
+was cut at. Changed rows are found through Artwork.updated_at and the like and
+unlock timestamps; deletions are recorded as tombstones by a flush hook, so
+every ORM delete path is covered without touching the handlers. Job workers
+purge tombstones older than SYNC_TOMBSTONE_RETENTION_DAYS (see app/jobs.py);
+older tokens get a full sync.
+"""
+import base64
+import binascii
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, event
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import settings
+
+
+class InvalidSyncToken(ValueError):
+    pass
+
+
+def encode_token(cut: datetime) -> str:
+    return base64.urlsafe_b64encode(cut.isoformat().encode()).decode().rstrip("=")
+
+
+def decode_token(token: Optional[str]) -> Optional[datetime]:
+    if not token:
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        return datetime.fromisoformat(base64.urlsafe_b64decode(padded).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidSyncToken("Invalid sync token")
+
+
+def next_cut() -> datetime:
+    return datetime.utcnow()
+
+
+def window_start(since: Optional[datetime]) -> Optional[datetime]:
+    """Lower bound for changes, or None when the client needs a full sync"""
+    if since is None:
+        return None
+    if since < datetime.utcnow() - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS):
+        # Tombstones older than this may have been purged
+        return None
+    return since - timedelta(seconds=settings.SYNC_OVERLAP_SECONDS)
+
+
+def purge_tombstones(conn) -> int:
+    """Delete tombstones past retention; returns how many"""
+    cutoff = datetime.utcnow() - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+    return conn.execute(delete(models.SyncTombstone).where(models.SyncTombstone.deleted_at < cutoff)).rowcount
+
+
+@event.listens_for(Session, "before_flush")
+def _record_tombstones(session, flush_context, instances):
+    for obj in list(session.deleted):
+        if isinstance(obj, models.Artwork):
+            session.add(models.SyncTombstone(entity_type="artwork", artwork_id=obj.id))
+        elif isinstance(obj, models.Like):
+            session.add(models.SyncTombstone(
+                entity_type="like", artwork_id=obj.artwork_id, user_id=obj.user_id
+            ))
+        elif isinstance(obj, models.UnlockedArtwork):
+            session.add(models.SyncTombstone(
+                entity_type="unlock", artwork_id=obj.artwork_id, user_id=obj.user_id
+            ))
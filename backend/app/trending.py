@@ -0,0 +1,217 @@
+"""Trending artworks from exponentially decayed engagement.
+
+Each like, comment, discovery or unlock adds its weight to the artwork's
+score, decayed with a half-life of TRENDING_HALF_LIFE_HOURS. Scores use
+forward decay: an event at time t adds weight * 2 ** ((t - EPOCH) / half_life),
+so older scores never have to be updated and scores recorded at different
+times still compare correctly. They are stored as logarithms, so the growing
+exponent never overflows, and adding an event is a single upsert.
+
+Every worker keeps the top TRENDING_TOP_K artworks globally and per region
+(a TRENDING_REGION_DEGREES grid cell) in memory. The lists are loaded at
+warm-up, updated when an engagement commits and kept in step across workers
+by the invalidation bus, so /artworks/trending reads no scores at all.
+Unlikes and deletions do not subtract; their weight simply decays away.
+"""
+import math
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import settings
+from .database import engine
+from .geo import logaddexp
+from .invalidation import bus
+from .startup import warmup
+
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+
+WEIGHTS = {"like": 1.0, "comment": 2.0, "discovery": 3.0, "unlock": 2.0}
+
+GLOBAL = "global"
+TRENDING_CHANNEL = "trending"
+
+_PENDING_KEY = "trending_scores"
+
+
+def region_of(latitude: Optional[float], longitude: Optional[float]) -> Optional[str]:
+    if latitude is None or longitude is None:
+        return None
+    size = settings.TRENDING_REGION_DEGREES
+    return f"{math.floor(latitude / size)}:{math.floor(longitude / size)}"
+
+
+def _decay_exponent(timestamp: float) -> float:
+    return (timestamp - EPOCH) / (settings.TRENDING_HALF_LIFE_HOURS * 3600) * math.log(2)
+
+
+def current_score(log_score: float, now: float = None) -> float:
+    """The decayed score as of now"""
+    return math.exp(log_score - _decay_exponent(now if now is not None else time.time()))
+
+
+class TopK:
+    """The highest scoring artworks, with the ranking cached between changes"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.scores: Dict[int, float] = {}
+        self._ranked: Optional[List[Tuple[int, float]]] = None
+        self._floor = float("-inf")
+
+    def offer(self, artwork_id: int, log_score: float):
+        if artwork_id not in self.scores and len(self.scores) >= self.capacity and log_score <= self._floor:
+            return
+        self.scores[artwork_id] = log_score
+        if len(self.scores) > self.capacity:
+            del self.scores[min(self.scores, key=self.scores.get)]
+        if len(self.scores) >= self.capacity:
+            self._floor = min(self.scores.values())
+        self._ranked = None
+
+    def ranked(self) -> List[Tuple[int, float]]:
+        if self._ranked is None:
+            self._ranked = sorted(self.scores.items(), key=lambda item: (-item[1], item[0]))
+        return self._ranked
+
+    def __len__(self):
+        return len(self.scores)
+
+
+class Trending:
+    def __init__(self):
+        self.regions: Dict[str, TopK] = {}
+
+    def offer(self, artwork_id: int, region: Optional[str], log_score: float):
+        for key in (GLOBAL, region):
+            if key is None:
+                continue
+            top = self.regions.get(key)
+            if top is None:
+                top = self.regions[key] = TopK(settings.TRENDING_TOP_K)
+            top.offer(artwork_id, log_score)
+
+    def ranked(self, region: Optional[str] = None) -> List[Tuple[int, float]]:
+        top = self.regions.get(region or GLOBAL)
+        return top.ranked() if top is not None else []
+
+
+trending = Trending()
+
+
+def _logaddexp(dialect_name: str, a, b):
+    if dialect_name == "sqlite":
+        return func.logaddexp(a, b)  # Registered in geo.register_sqlite_functions
+    return func.greatest(a, b) + func.ln(1 + func.exp(-func.abs(a - b)))
+
+
+def _insert(dialect_name: str):
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(models.ArtworkTrending)
+
+
+async def record(db: AsyncSession, verb: str, *artwork_ids: int):
+    """Add an engagement to the artworks' scores as part of the caller's transaction"""
+    weight = WEIGHTS.get(verb)
+    if not weight or not artwork_ids:
+        return
+    increment = math.log(weight) + _decay_exponent(time.time())
+    locations = await db.execute(
+        select(models.Artwork.id, models.Artwork.latitude, models.Artwork.longitude)
+        .where(models.Artwork.id.in_(artwork_ids))
+    )
+    rows = [
+        {"artwork_id": artwork_id, "region": region_of(latitude, longitude), "log_score": increment}
+        for artwork_id, latitude, longitude in locations.all()
+    ]
+    if not rows:
+        return
+
+    dialect_name = db.bind.dialect.name
+    table = models.ArtworkTrending.__table__
+    statement = _insert(dialect_name).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.artwork_id],
+        set_={
+            "log_score": _logaddexp(dialect_name, table.c.log_score, statement.excluded.log_score),
+            "region": statement.excluded.region,
+        }
+    ).returning(table.c.artwork_id, table.c.region, table.c.log_score)
+    result = await db.execute(statement)
+    # The in-memory lists change once the transaction commits
+    db.sync_session.info.setdefault(_PENDING_KEY, []).extend(tuple(row) for row in result.all())
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_scores(session):
+    for artwork_id, region, log_score in session.info.pop(_PENDING_KEY, ()):
+        trending.offer(artwork_id, region, log_score)
+        bus.publish(TRENDING_CHANNEL, [artwork_id, region, log_score])
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+bus.subscribe(TRENDING_CHANNEL, lambda payload: trending.offer(*payload))
+
+
+def backfill(conn, half_lives: int = 10):
+    """Score existing engagement; older than half_lives half-lives is negligible"""
+    cutoff = datetime.utcnow() - timedelta(hours=settings.TRENDING_HALF_LIFE_HOURS * half_lives)
+    sources = [
+        ("like", models.Like.artwork_id, models.Like.created_at),
+        ("comment", models.Comment.artwork_id, models.Comment.created_at),
+        ("discovery", models.Discovery.artwork_id, models.Discovery.discovered_at),
+        ("unlock", models.UnlockedArtwork.artwork_id, models.UnlockedArtwork.unlocked_at),
+    ]
+    scores: Dict[int, float] = {}
+    for verb, artwork_id_column, time_column in sources:
+        weight = math.log(WEIGHTS[verb])
+        for artwork_id, at in conn.execute(select(artwork_id_column, time_column).where(time_column >= cutoff)):
+            value = weight + _decay_exponent(at.replace(tzinfo=timezone.utc).timestamp())
+            scores[artwork_id] = logaddexp(scores.get(artwork_id), value)
+    if not scores:
+        return
+
+    locations = conn.execute(select(models.Artwork.id, models.Artwork.latitude, models.Artwork.longitude))
+    conn.execute(insert(models.ArtworkTrending), [
+        {"artwork_id": artwork_id, "region": region_of(latitude, longitude), "log_score": scores[artwork_id]}
+        for artwork_id, latitude, longitude in locations
+        if artwork_id in scores
+    ])
+
+
+@warmup("trending")
+async def load():
+    """Fill the global and per-region lists from the stored scores, replacing what they held"""
+    ranked = (
+        select(
+            models.ArtworkTrending.artwork_id,
+            models.ArtworkTrending.region,
+            models.ArtworkTrending.log_score,
+            func.row_number().over(
+                partition_by=models.ArtworkTrending.region,
+                order_by=models.ArtworkTrending.log_score.desc()
+            ).label("position")
+        )
+        .subquery()
+    )
+    async with engine.connect() as conn:
+        regional = await conn.execute(
+            select(ranked.c.artwork_id, ranked.c.region, ranked.c.log_score)
+            .where(ranked.c.position <= settings.TRENDING_TOP_K)
+        )
+        loaded = Trending()
+        for artwork_id, region, log_score in regional.all():
+            loaded.offer(artwork_id, region, log_score)
+    trending.regions = loaded.regions
@@ -1,3 +1,4 @@
+import logging
 from passlib.context import CryptContext
 import bcrypt
 import os
@@ -13,11 +14,12 @@ from . import models
 from PIL import Image
 import io
 
+logger = logging.getLogger(__name__)
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-# Create upload directory if it doesn't exist
+# Created at startup (app/startup.py)
 UPLOAD_DIR = "static/images"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 def get_password_hash(password: str):
     return pwd_context.hash(password)
@@ -94,10 +96,10 @@ async def save_uploaded_file(upload_file: UploadFile) -> str:
         with open(file_path, "wb") as f:
             f.write(content)
             
-        print(f"File saved successfully at: {file_path}")  # Debug print
+        logger.debug("File saved", extra={"path": file_path})
         return f"/uploads/{filename}"
     except Exception as e:
-        print(f"Error saving file: {str(e)}")
+        logger.exception("Error saving file")
         return None 
 
 # Remove the log_activity function if it exists 
\ No newline at end of file
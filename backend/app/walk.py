@@ -0,0 +1,218 @@
+"""Art-walk planning: visit as many artworks as a walking budget allows.
+
+This is an orienteering problem. Candidates come from the nearby index
+within reach of the start: the WALK_MAX_CANDIDATES nearest, out to the
+budget, or half of it for a loop. Distances use a local flat projection
+scaled by WALK_DETOUR_FACTOR for streets, and every stop adds
+WALK_STOP_MINUTES of walking time. The route is built by cheapest
+insertion: repeatedly add the artwork whose best insertion costs least
+while the route fits the budget. 2-opt then shortens the route, which
+frees budget for more insertions. Both phases stop at the
+WALK_CPU_BUDGET_MS deadline and return the best route so far.
+
+An open walk ends wherever it ends. A zero-cost virtual end node turns it
+into a path with both endpoints fixed, so the same insertion and 2-opt code
+handles both shapes.
+
+Routes depend only on the start cell and the parameters. They are planned
+from the centre of a WALK_CELL_DEGREES cell and cached per cell, so everyone
+starting nearby shares one plan.
+"""
+import asyncio
+import math
+import time
+from typing import List, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from . import models, nearby
+from .cache import TTLCache
+from .config import settings
+
+KM_PER_DEGREE_LAT = 110.574
+KM_PER_DEGREE_LON = 111.320
+
+routes = TTLCache("walk_routes", ttl=settings.WALK_CACHE_TTL, maxsize=5000)
+
+
+def cell_center(latitude: float, longitude: float) -> Tuple[float, float]:
+    size = settings.WALK_CELL_DEGREES
+    return ((math.floor(latitude / size) + 0.5) * size, (math.floor(longitude / size) + 0.5) * size)
+
+
+def distance_matrix(points: np.ndarray) -> np.ndarray:
+    """Walking km between (latitude, longitude) rows, flat-earth around the first point"""
+    scale = np.array([KM_PER_DEGREE_LAT, KM_PER_DEGREE_LON * math.cos(math.radians(points[0, 0]))])
+    xy = (points - points[0]) * scale
+    return np.sqrt(((xy[:, None, :] - xy[None, :, :]) ** 2).sum(axis=2)) * settings.WALK_DETOUR_FACTOR
+
+
+class Planner:
+    """Orienteering on a cost matrix: node 0 is the start, node n - 1 the end"""
+
+    def __init__(self, cost: np.ndarray, budget: float, deadline: float):
+        self.cost = cost
+        self.budget = budget
+        self.deadline = deadline
+        self.route = [0, len(cost) - 1]
+        self.length = cost[0, -1]
+        self.unvisited = np.ones(len(cost), dtype=bool)
+        self.unvisited[[0, -1]] = False
+
+    def out_of_time(self) -> bool:
+        return time.perf_counter() > self.deadline
+
+    def insert(self) -> bool:
+        """Add the cheapest insertable node; False when none fits"""
+        candidates = np.flatnonzero(self.unvisited)
+        if len(candidates) == 0:
+            return False
+        route = np.asarray(self.route)
+        before, after = route[:-1], route[1:]
+        # added[i, j]: extra cost of putting candidate j between route[i] and route[i + 1]
+        added = (self.cost[before][:, candidates] + self.cost[candidates][:, after].T
+                 - self.cost[before, after][:, None])
+        position = np.argmin(added, axis=0)
+        extra = added[position, np.arange(len(candidates))]
+        best = int(np.argmin(extra))
+        if self.length + extra[best] > self.budget:
+            return False
+        node = int(candidates[best])
+        self.route.insert(int(position[best]) + 1, node)
+        self.length += float(extra[best])
+        self.unvisited[node] = False
+        return True
+
+    def two_opt(self) -> bool:
+        """Apply improving segment reversals; True if the route got shorter"""
+        improved = False
+        route = np.asarray(self.route)
+        while not self.out_of_time():
+            best_delta, best_move = -1e-9, None
+            for i in range(1, len(route) - 2):
+                a, b = route[i - 1], route[i]
+                c, d = route[i + 1:-1], route[i + 2:]
+                # Reversing route[i..j] replaces edges (a, b) and (c, d) with (a, c) and (b, d)
+                delta = self.cost[a, c] + self.cost[b, d] - self.cost[a, b] - self.cost[c, d]
+                j = int(np.argmin(delta))
+                if delta[j] < best_delta:
+                    best_delta, best_move = float(delta[j]), (i, i + 1 + j)
+            if best_move is None:
+                break
+            i, j = best_move
+            route[i:j + 1] = route[i:j + 1][::-1]
+            self.length += best_delta
+            improved = True
+        self.route = route.tolist()
+        return improved
+
+    def solve(self) -> List[int]:
+        while not self.out_of_time():
+            while not self.out_of_time() and self.insert():
+                pass
+            if self.out_of_time() or not self.two_opt():
+                break
+        return self.route
+
+
+def plan(start: Tuple[float, float], candidates: List[Tuple[int, float, float]], budget_km: float,
+         loop: bool) -> Tuple[List[int], List[float]]:
+    """Return (artwork ids in visiting order, km walked to each) for candidates (id, latitude, longitude)
+
+    For a loop the last leg, back to the start, is appended to the legs.
+    """
+    if not candidates:
+        return [], []
+    points = np.array([start] + [(latitude, longitude) for _, latitude, longitude in candidates])
+    walking = distance_matrix(points)
+
+    count = len(points)
+    cost = np.zeros((count + 1, count + 1))
+    cost[:count, :count] = walking
+    # Dwell time at each artwork, as distance, is paid on arrival
+    cost[:, 1:count] += settings.WALK_STOP_MINUTES / 60 * settings.WALK_SPEED_KMH
+    np.fill_diagonal(cost, 0)
+    # The end node is the start again for a loop, and free to reach for an open walk
+    cost[:, count] = np.append(walking[:, 0], 0) if loop else 0
+    cost[count, :count] = walking[0] if loop else 0
+
+    deadline = time.perf_counter() + settings.WALK_CPU_BUDGET_MS / 1000
+    route = Planner(cost, budget_km, deadline).solve()[1:-1]
+    legs = [float(walking[previous, node]) for previous, node in zip([0] + route, route)]
+    if loop and route:
+        legs.append(float(walking[route[-1], 0]))
+    return [candidates[node - 1][0] for node in route], legs
+
+
+def _stop(artwork: models.Artwork, artist_name: str, leg: float, walked: float) -> dict:
+    return {
+        "id": artwork.id,
+        "title": artwork.title,
+        "description": artwork.description,
+        "image_url": artwork.image_url,
+        "image_width": artwork.image_width,
+        "image_height": artwork.image_height,
+        "blurhash": artwork.blurhash,
+        "latitude": artwork.latitude,
+        "longitude": artwork.longitude,
+        "artist_id": artwork.artist_id,
+        "artist_name": artist_name,
+        "categories": [c.name for c in artwork.categories],
+        "leg_km": round(leg, 3),
+        "cumulative_km": round(walked, 3),
+    }
+
+
+async def walk(db: AsyncSession, latitude: float, longitude: float, budget_km: float,
+               loop: bool) -> Tuple[dict, bool]:
+    """Return (route, whether it came from the cache)"""
+    start = cell_center(latitude, longitude)
+    budget_km = round(budget_km, 1)
+    key = (start, budget_km, loop)
+    route = routes.get(key)
+    if route is not None:
+        return route, True
+
+    # Straight-line reach; anything further cannot be walked to within the budget
+    reach = (budget_km / 2 if loop else budget_km) / settings.WALK_DETOUR_FACTOR
+    candidates = await nearby.nearest(db, *start, reach, settings.WALK_MAX_CANDIDATES)
+    # The planner is CPU-bound; keep the event loop free while it runs
+    artwork_ids, legs = await asyncio.to_thread(plan, start, candidates, budget_km, loop)
+
+    stops = []
+    if artwork_ids:
+        # Artworks of deleted artists keep a NULL artist_id
+        result = await db.execute(
+            select(models.Artwork, models.User.username)
+            .outerjoin(models.User, models.Artwork.artist_id == models.User.id)
+            .where(models.Artwork.id.in_(artwork_ids), models.Artwork.status == "active")
+            .options(selectinload(models.Artwork.categories))
+        )
+        artworks = {artwork.id: (artwork, artist_name or "Unknown") for artwork, artist_name in result.all()}
+        walked = carried = 0.0
+        for artwork_id, leg in zip(artwork_ids, legs):
+            walked += leg
+            carried += leg
+            loaded = artworks.get(artwork_id)
+            if loaded is None:
+                # Deleted or hidden since it was picked; its leg is walked on to the next stop
+                continue
+            stops.append(_stop(*loaded, carried, walked))
+            carried = 0.0
+
+    distance = sum(legs)
+    route = {
+        "start": {"latitude": start[0], "longitude": start[1]},
+        "loop": loop,
+        "budget_km": budget_km,
+        "distance_km": round(distance, 3),
+        "duration_minutes": round(
+            distance / settings.WALK_SPEED_KMH * 60 + len(stops) * settings.WALK_STOP_MINUTES, 1
+        ),
+        "stops": stops,
+    }
+    routes.set(key, route)
+    return route, False
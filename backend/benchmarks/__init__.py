@@ -0,0 +1,8 @@
+"""Load and performance benchmarks.
+
+Run from the backend directory:
+
+    python -m benchmarks.datagen --scale small --database /tmp/bench/sql_app.db
+    python -m benchmarks.load --scale small --mix browse
+    python -m benchmarks.micro
+"""
@@ -0,0 +1,227 @@
+"""Deterministic synthetic dataset for load tests.
+
+Artworks are scattered around a fixed set of cities with a Gaussian spread,
+weighted so a few cities hold most of the content. Users have a home city and
+like and unlock mostly artworks from it, with a Zipf-like preference for the
+popular ones. The same seed and scale always produce the same rows, and ids
+are assigned sequentially from 1, so the load driver can pick valid ids and
+coordinates without reading the database.
+
+    python -m benchmarks.datagen --scale small --database /tmp/bench/sql_app.db
+
+The app opens ./sql_app.db, so serve it from the directory holding the file.
+"""
+import argparse
+import math
+import os
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Tuple
+
+PASSWORD = "benchmark"
+EPOCH = datetime(2024, 1, 1)
+
+# (name, latitude, longitude, weight, spread in km)
+CITIES = [
+    ("Kochi", 9.9312, 76.2673, 30, 6.0),
+    ("Bengaluru", 12.9716, 77.5946, 25, 12.0),
+    ("Mumbai", 19.0760, 72.8777, 20, 10.0),
+    ("Berlin", 52.5200, 13.4050, 10, 8.0),
+    ("London", 51.5072, -0.1276, 8, 10.0),
+    ("New York", 40.7128, -74.0060, 5, 9.0),
+    ("Sao Paulo", -23.5505, -46.6333, 2, 12.0),
+]
+
+CATEGORIES = [
+    "Mural",
+    "Graffiti",
+    "Sculpture",
+    "Installation",
+    "Street Art",
+    "Digital Art",
+    "Mixed Media",
+    "Traditional",
+]
+
+
+@dataclass(frozen=True)
+class Scale:
+    users: int
+    artists: int
+    artworks: int
+    likes: int
+    unlocks: int
+    comments: int
+
+
+SCALES: Dict[str, Scale] = {
+    "tiny": Scale(users=200, artists=20, artworks=1000, likes=5000, unlocks=5000, comments=1000),
+    "small": Scale(users=5000, artists=500, artworks=10000, likes=250000, unlocks=250000, comments=20000),
+    "large": Scale(users=50000, artists=5000, artworks=100000, likes=2500000, unlocks=2500000, comments=200000),
+}
+
+
+def email(user_id: int) -> str:
+    return f"user{user_id}@bench.artevia"
+
+
+def _city_index(rng: random.Random) -> int:
+    return rng.choices(range(len(CITIES)), weights=[city[3] for city in CITIES])[0]
+
+
+def _jitter(rng: random.Random, latitude: float, longitude: float, spread_km: float) -> Tuple[float, float]:
+    dlat = rng.gauss(0, spread_km) / 111.32
+    dlon = rng.gauss(0, spread_km) / (111.32 * max(0.01, math.cos(math.radians(latitude))))
+    return round(latitude + dlat, 6), round(longitude + dlon, 6)
+
+
+def random_point(rng: random.Random) -> Tuple[float, float]:
+    """A location drawn from the same distribution as the artworks"""
+    _, latitude, longitude, _, spread = CITIES[_city_index(rng)]
+    return _jitter(rng, latitude, longitude, spread)
+
+
+class Dataset:
+    """Rows for each table, generated lazily in dependency order"""
+
+    def __init__(self, scale: Scale, seed: int = 42, password_hash: str = None):
+        self.scale = scale
+        self.seed = seed
+        self.password_hash = password_hash
+        # Artwork ids per city, filled while generating artworks
+        self.city_artworks: List[List[int]] = [[] for _ in CITIES]
+
+    def categories(self) -> Iterator[dict]:
+        for name in CATEGORIES:
+            yield {"name": name, "description": f"{name} artworks"}
+
+    def users(self) -> Iterator[dict]:
+        if self.password_hash is None:
+            from app.manage import hash_password
+            # One hash for every user; bcrypt is deliberately slow
+            self.password_hash = hash_password(PASSWORD)
+        rng = random.Random(f"{self.seed}:users")
+        for user_id in range(1, self.scale.users + 1):
+            yield {
+                "id": user_id,
+                "email": email(user_id),
+                "username": f"user{user_id}",
+                "password": self.password_hash,
+                "role": "admin" if user_id == 1 else "artist" if user_id <= self.scale.artists + 1 else "user",
+                "is_active": True,
+                "status": "active",
+                "created_at": EPOCH + timedelta(minutes=rng.randrange(60 * 24 * 365)),
+            }
+
+    def artworks(self) -> Iterator[dict]:
+        rng = random.Random(f"{self.seed}:artworks")
+        for artwork_id in range(1, self.scale.artworks + 1):
+            city = _city_index(rng)
+            _, latitude, longitude, _, spread = CITIES[city]
+            latitude, longitude = _jitter(rng, latitude, longitude, spread)
+            self.city_artworks[city].append(artwork_id)
+            created_at = EPOCH + timedelta(minutes=rng.randrange(60 * 24 * 365))
+            yield {
+                "id": artwork_id,
+                "title": f"Artwork {artwork_id}",
+                "description": f"Synthetic artwork in {CITIES[city][0]}",
+                "image_url": "/static/images/benchmark.jpg",
+                "latitude": latitude,
+                "longitude": longitude,
+                "status": "active",
+                "is_featured": rng.random() < 0.01,
+                "created_at": created_at,
+                "updated_at": created_at,
+                "artist_id": rng.randint(2, self.scale.artists + 1),
+            }
+
+    def artwork_categories(self) -> Iterator[dict]:
+        rng = random.Random(f"{self.seed}:artwork_categories")
+        for artwork_id in range(1, self.scale.artworks + 1):
+            yield {"artwork_id": artwork_id, "category_id": rng.randint(1, len(CATEGORIES))}
+
+    def _pairs(self, label: str, total: int) -> Iterator[Tuple[int, int, datetime]]:
+        """Distinct (user, artwork) pairs, mostly from the user's home city"""
+        if not any(self.city_artworks):
+            # Replay artwork generation to learn which city each artwork is in
+            for _ in self.artworks():
+                pass
+        rng = random.Random(f"{self.seed}:{label}")
+        per_user = total // self.scale.users
+        extra = total - per_user * self.scale.users
+        for user_id in range(1, self.scale.users + 1):
+            count = per_user + (1 if user_id <= extra else 0)
+            home = random.Random(f"{self.seed}:home:{user_id}").randrange(len(CITIES))
+            seen = set()
+            for _ in range(count * 3):
+                if len(seen) >= count:
+                    break
+                pool = self.city_artworks[home] if rng.random() < 0.85 else self.city_artworks[_city_index(rng)]
+                if not pool:
+                    continue
+                # Zipf-like: low indices (the first artworks in a city) are the popular ones
+                artwork_id = pool[min(len(pool) - 1, int(len(pool) * rng.random() ** 3))]
+                if artwork_id in seen:
+                    continue
+                seen.add(artwork_id)
+                yield user_id, artwork_id, EPOCH + timedelta(minutes=rng.randrange(60 * 24 * 365))
+
+    def likes(self) -> Iterator[dict]:
+        for user_id, artwork_id, created_at in self._pairs("likes", self.scale.likes):
+            yield {"user_id": user_id, "artwork_id": artwork_id, "created_at": created_at}
+
+    def unlocks(self) -> Iterator[dict]:
+        for user_id, artwork_id, unlocked_at in self._pairs("unlocks", self.scale.unlocks):
+            yield {"user_id": user_id, "artwork_id": artwork_id, "unlocked_at": unlocked_at}
+
+    def comments(self) -> Iterator[dict]:
+        rng = random.Random(f"{self.seed}:comments")
+        for _ in range(self.scale.comments):
+            yield {
+                "text": rng.choice(["Love this!", "Stunning colours", "Found it on my walk", "Wow"]),
+                "user_id": rng.randint(1, self.scale.users),
+                "artwork_id": rng.randint(1, self.scale.artworks),
+                "created_at": EPOCH + timedelta(minutes=rng.randrange(60 * 24 * 365)),
+                "status": "active",
+            }
+
+    def tables(self) -> Iterator[Tuple[str, Iterator[dict]]]:
+        """(table name, rows) in foreign key order"""
+        yield "categories", self.categories()
+        yield "users", self.users()
+        yield "artworks", self.artworks()
+        yield "artwork_categories", self.artwork_categories()
+        yield "likes", self.likes()
+        yield "unlocked_artworks", self.unlocks()
+        yield "comments", self.comments()
+
+
+def load(database: str, dataset: Dataset):
+    """Recreate the schema in a SQLite file and bulk load the dataset"""
+    from app.manage import bulk_load, reset_schema, sync_engine
+
+    os.makedirs(os.path.dirname(os.path.abspath(database)), exist_ok=True)
+    engine = sync_engine(f"sqlite:///{database}")
+    try:
+        reset_schema(engine)
+        bulk_load(engine, dataset.tables())
+    finally:
+        engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate and load a synthetic benchmark dataset")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database", default="bench/sql_app.db", help="SQLite file to (re)create")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    load(args.database, Dataset(SCALES[args.scale], args.seed))
+    print(f"Loaded {args.scale} dataset into {args.database} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
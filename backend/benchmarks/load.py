@@ -0,0 +1,247 @@
+"""Async HTTP load driver.
+
+Virtual users log in once, then loop over a weighted mix of scenarios for a
+fixed duration. Per-scenario latency percentiles, throughput and status codes
+are printed and written to a JSON file tagged with the current commit, so runs
+can be compared:
+
+    python -m benchmarks.datagen --scale small --database /tmp/bench/sql_app.db
+    (cd /tmp/bench && ADMISSION_ENABLED=false uvicorn app.main:app --app-dir "$OLDPWD" --workers 4) &
+    python -m benchmarks.load --scale small --mix browse --users 50 --duration 60
+    python -m benchmarks.load compare results/a.json results/b.json
+
+Admission control would otherwise rate-limit the handful of virtual users
+like any other client, and the run would measure 429s. Any response outside
+2xx/3xx counts as an error, and 429s are also reported on their own.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import httpx
+
+from .datagen import PASSWORD, SCALES, Scale, email, random_point
+
+# Scenario weights per mix
+MIXES: Dict[str, Dict[str, int]] = {
+    "browse": {"nearby": 50, "list": 5, "like": 15, "comment": 10, "unlock": 15, "login": 5},
+    "read": {"nearby": 80, "list": 20},
+    "write": {"like": 40, "comment": 30, "unlock": 30},
+    "login": {"login": 100},
+}
+
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, scale: Scale, rng: random.Random):
+        self.client = client
+        self.scale = scale
+        self.rng = rng
+        self.user_id = rng.randint(2, scale.users)
+        self.headers = {}
+
+    async def login(self) -> httpx.Response:
+        response = await self.client.post(
+            "/auth/token", data={"username": email(self.user_id), "password": PASSWORD}
+        )
+        if response.status_code == 200:
+            self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        return response
+
+    def _artwork_id(self) -> int:
+        return self.rng.randint(1, self.scale.artworks)
+
+    async def nearby(self) -> httpx.Response:
+        latitude, longitude = random_point(self.rng)
+        return await self.client.get(
+            "/artworks/nearby",
+            params={"latitude": latitude, "longitude": longitude, "radius": self.rng.choice([1, 2, 5])},
+            headers=self.headers
+        )
+
+    async def list(self) -> httpx.Response:
+        return await self.client.get("/artworks/", headers=self.headers)
+
+    async def like(self) -> httpx.Response:
+        return await self.client.post(f"/artworks/{self._artwork_id()}/like", headers=self.headers)
+
+    async def comment(self) -> httpx.Response:
+        return await self.client.post(
+            f"/artworks/{self._artwork_id()}/comments", json={"text": "Benchmark comment"}, headers=self.headers
+        )
+
+    async def unlock(self) -> httpx.Response:
+        return await self.client.post(
+            "/artworks/unlock", json={"artwork_id": self._artwork_id()}, headers=self.headers
+        )
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(p / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+
+    def record(self, scenario: str, elapsed: float, status):
+        self.latencies[scenario].append(elapsed)
+        self.statuses[scenario][str(status)] += 1
+
+    def summary(self, duration: float) -> Dict[str, dict]:
+        results = {}
+        for scenario, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            statuses = self.statuses[scenario]
+            errors = sum(count for status, count in statuses.items() if not status.startswith(("2", "3")))
+            results[scenario] = {
+                "requests": len(values),
+                "throughput": round(len(values) / duration, 2),
+                "errors": errors,
+                "rate_limited": statuses.get("429", 0),
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p95_ms": round(percentile(values, 95) * 1000, 2),
+                "p99_ms": round(percentile(values, 99) * 1000, 2),
+                "max_ms": round(values[-1] * 1000, 2),
+                "statuses": dict(statuses),
+            }
+        return results
+
+
+async def _run_user(user: VirtualUser, mix: Dict[str, int], deadline: float, recorder: Recorder):
+    scenarios = list(mix)
+    weights = [mix[name] for name in scenarios]
+    while time.perf_counter() < deadline:
+        scenario = user.rng.choices(scenarios, weights=weights)[0]
+        action: Callable = getattr(user, scenario)
+        started = time.perf_counter()
+        try:
+            response = await action()
+            status = response.status_code
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        recorder.record(scenario, time.perf_counter() - started, status)
+
+
+async def run(base_url: str, scale: Scale, mix: Dict[str, int], users: int, duration: float,
+              seed: int = 0) -> dict:
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        virtual_users = [VirtualUser(client, scale, random.Random(f"{seed}:{i}")) for i in range(users)]
+        # Log everyone in up front so the mix measures steady state
+        logins = await asyncio.gather(*(user.login() for user in virtual_users))
+        failed = Counter(response.status_code for response in logins if response.status_code != 200)
+        if failed:
+            raise SystemExit(
+                f"{sum(failed.values())}/{users} logins failed {dict(failed)}; is the server seeded "
+                "with the same --scale and running with ADMISSION_ENABLED=false?"
+            )
+
+        recorder = Recorder()
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            _run_user(user, mix, started + duration, recorder) for user in virtual_users
+        ))
+        elapsed = time.perf_counter() - started
+
+    total = sum(len(values) for values in recorder.latencies.values())
+    return {
+        "elapsed": round(elapsed, 2),
+        "requests": total,
+        "throughput": round(total / elapsed, 2),
+        "scenarios": recorder.summary(elapsed),
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(result: dict):
+    print(f"{'scenario':10} {'req':>8} {'req/s':>8} {'err':>6} {'429':>6} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for scenario, stats in result["scenarios"].items():
+        print(
+            f"{scenario:10} {stats['requests']:8} {stats['throughput']:8} {stats['errors']:6} "
+            f"{stats['rate_limited']:6} {stats['p50_ms']:8}ms {stats['p95_ms']:8}ms {stats['p99_ms']:8}ms"
+        )
+    print(f"total: {result['requests']} requests, {result['throughput']} req/s")
+    if any(stats["rate_limited"] for stats in result["scenarios"].values()):
+        print("warning: requests were rate limited; run the server with ADMISSION_ENABLED=false")
+
+
+def compare(baseline_path: str, candidate_path: str):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(candidate_path) as f:
+        candidate = json.load(f)
+    print(f"{baseline['commit']} -> {candidate['commit']}")
+    for scenario, stats in candidate["result"]["scenarios"].items():
+        before = baseline["result"]["scenarios"].get(scenario)
+        if before is None:
+            continue
+        changes = []
+        for key in ("p50_ms", "p95_ms", "p99_ms", "throughput"):
+            change = (stats[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+            changes.append(f"{key} {before[key]} -> {stats[key]} ({change:+.1f}%)")
+        print(f"{scenario:10} " + ", ".join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a load test against a running server")
+    parser.add_argument("command", nargs="?", default="run", choices=["run", "compare"])
+    parser.add_argument("files", nargs="*", help="Result files for compare")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small",
+                        help="Dataset the server was seeded with")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="browse")
+    parser.add_argument("--users", type=int, default=20, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmarks/results")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        if len(args.files) != 2:
+            parser.error("compare needs a baseline and a candidate result file")
+        return compare(*args.files)
+
+    result = asyncio.run(run(
+        args.base_url, SCALES[args.scale], MIXES[args.mix], args.users, args.duration, args.seed
+    ))
+    print_report(result)
+
+    commit = git_revision()
+    report = {
+        "commit": commit,
+        "created_at": datetime.utcnow().isoformat(),
+        "config": {
+            "base_url": args.base_url, "scale": args.scale, "mix": args.mix,
+            "users": args.users, "duration": args.duration, "seed": args.seed
+        },
+        "result": result,
+    }
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f"{datetime.utcnow():%Y%m%dT%H%M%S}-{commit}-{args.mix}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""Micro-benchmarks for hot helpers and serializers.
+
+Each benchmark is timed in calibrated batches and reported as the best
+per-operation time over several repeats, which is far steadier than the mean.
+Results are compared with benchmarks/baselines/micro.json and the run fails
+when any benchmark is slower than the baseline by more than --threshold.
+
+    python -m benchmarks.micro               # compare with the baseline
+    python -m benchmarks.micro --save        # record a new baseline
+    python -m benchmarks.micro -k jwt        # only benchmarks matching "jwt"
+
+Baselines are only meaningful on the machine that recorded them; the file
+stores the platform so a mismatch is reported.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "micro.json")
+
+# name -> setup function returning the callable to time
+BENCHMARKS: Dict[str, Callable[[], Callable[[], object]]] = {}
+
+
+def benchmark(name: str):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def _artworks(count: int):
+    from app import models
+
+    categories = [models.Category(id=i, name=name) for i, name in enumerate(["Mural", "Graffiti", "Sculpture"], 1)]
+    created_at = datetime(2024, 1, 1)
+    return [
+        models.Artwork(
+            id=i, title=f"Artwork {i}", description="A mural by the harbour",
+            image_url=f"/uploads/{i}.jpg", image_width=1200, image_height=900,
+            blurhash="LEHV6nWB2yk8pyo0adR*.7kCMdnj", latitude=9.93 + i * 1e-4, longitude=76.26 - i * 1e-4,
+            artist_id=i % 50 + 1, status="active", is_featured=i % 10 == 0,
+            created_at=created_at + timedelta(minutes=i), categories=categories[:i % 3 + 1]
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+@benchmark("calculate_distance x1000")
+def _calculate_distance():
+    from app.utils import calculate_distance
+
+    points = [(9.93 + i * 1e-3, 76.26 - i * 1e-3) for i in range(1000)]
+
+    def run():
+        for latitude, longitude in points:
+            calculate_distance(9.9312, 76.2673, latitude, longitude)
+    return run
+
+
+@benchmark("nearby_artwork_dict x100")
+def _nearby_artwork_dict():
+    from app.routers.artworks import nearby_artwork_dict
+
+    artworks = _artworks(100)
+
+    def run():
+        return [nearby_artwork_dict(artwork, "artist", False, 1.5) for artwork in artworks]
+    return run
+
+
+@benchmark("ArtworkResponse construct x100")
+def _artwork_response_construct():
+    from app.schemas import ArtworkResponse
+
+    artworks = _artworks(100)
+
+    def run():
+        # What GET /artworks/ does per row
+        return [
+            ArtworkResponse(
+                id=artwork.id,
+                title=artwork.title,
+                description=artwork.description,
+                image_url=artwork.image_url,
+                image_width=artwork.image_width,
+                image_height=artwork.image_height,
+                blurhash=artwork.blurhash,
+                latitude=artwork.latitude,
+                longitude=artwork.longitude,
+                artist_id=artwork.artist_id,
+                status=artwork.status,
+                is_featured=artwork.is_featured,
+                created_at=artwork.created_at,
+                categories=[c.name for c in artwork.categories]
+            )
+            for artwork in artworks
+        ]
+    return run
+
+
+@benchmark("ArtworkResponse list validate x100")
+def _artwork_response_validate():
+    from typing import List as ListType
+    from pydantic import TypeAdapter
+    from app.schemas import ArtworkResponse
+
+    adapter = TypeAdapter(ListType[ArtworkResponse])
+    rows = [
+        {
+            "id": artwork.id, "title": artwork.title, "description": artwork.description,
+            "image_url": artwork.image_url, "image_width": artwork.image_width,
+            "image_height": artwork.image_height, "blurhash": artwork.blurhash,
+            "latitude": artwork.latitude, "longitude": artwork.longitude,
+            "artist_id": artwork.artist_id, "status": artwork.status, "is_featured": artwork.is_featured,
+            "created_at": artwork.created_at, "categories": [c.name for c in artwork.categories]
+        }
+        for artwork in _artworks(100)
+    ]
+
+    def run():
+        # The response_model pass FastAPI makes over the handler's return value
+        return adapter.dump_python(adapter.validate_python(rows), mode="json")
+    return run
+
+
+@benchmark("jwt encode")
+def _jwt_encode():
+    from app.auth.auth import create_access_token
+
+    def run():
+        return create_access_token({"sub": "user@example.com", "role": "user"})
+    return run
+
+
+@benchmark("jwt decode")
+def _jwt_decode():
+    from jose import jwt
+    from app.auth.auth import ALGORITHM, SECRET_KEY, create_access_token
+
+    token = create_access_token({"sub": "user@example.com", "role": "user"})
+
+    def run():
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    return run
+
+
+@benchmark("search_filter build")
+def _search_filter():
+    from sqlalchemy import select
+    from app import models
+    from app.utils import search_filter
+
+    def run():
+        return search_filter(select(models.Artwork), models.Artwork, "mural", ["title", "description"])
+    return run
+
+
+@benchmark("search_filter build+compile")
+def _search_filter_compile():
+    from sqlalchemy import select
+    from sqlalchemy.dialects import sqlite
+    from app import models
+    from app.utils import search_filter
+
+    dialect = sqlite.dialect()
+
+    def run():
+        query = search_filter(select(models.Artwork), models.Artwork, "mural", ["title", "description"])
+        return query.compile(dialect=dialect)
+    return run
+
+
+def measure(func: Callable[[], object], repeat: int = 7, target: float = 0.05) -> float:
+    """Best seconds per call over `repeat` batches of about `target` seconds each"""
+    func()  # Warm caches and lazy imports outside the timed batches
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= target / 5:
+            break
+        number *= 4
+    number = max(1, int(number * target / elapsed))
+
+    best = float("inf")
+    # Like timeit, keep collector pauses out of the measurement
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for _ in range(number):
+                func()
+            best = min(best, (time.perf_counter() - started) / number)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return best
+
+
+def machine() -> dict:
+    return {"python": platform.python_version(), "platform": platform.platform(), "processor": platform.machine()}
+
+
+def _format(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:8.2f}{unit}"
+    return f"{seconds / 1e-9:8.0f}ns"
+
+
+def run(names: List[str], repeat: int) -> Dict[str, float]:
+    results = {}
+    for name in names:
+        results[name] = measure(BENCHMARKS[name](), repeat=repeat)
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Run micro-benchmarks against the stored baseline")
+    parser.add_argument("-k", dest="pattern", default="", help="Only run benchmarks containing this text")
+    parser.add_argument("--save", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed slowdown before failing, as a fraction (default 0.25)")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    args = parser.parse_args()
+
+    names = [name for name in BENCHMARKS if args.pattern in name]
+    results = run(names, args.repeat)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            stored = json.load(f)
+        baseline = stored["results"]
+        if stored.get("machine") != machine():
+            print(f"Warning: baseline was recorded on {stored.get('machine')}")
+
+    regressions = []
+    for name, seconds in results.items():
+        line = f"{name:36} {_format(seconds)}"
+        before = baseline.get(name)
+        if before:
+            change = seconds / before - 1
+            line += f"   baseline {_format(before)}  {change:+7.1%}"
+            if change > args.threshold:
+                regressions.append(name)
+                line += "  REGRESSION"
+        print(line)
+
+    if args.save:
+        merged = {**baseline, **results}
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump({"machine": machine(), "created_at": datetime.utcnow().isoformat(), "results": merged},
+                      f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) slower than baseline by more than {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())